@@ -0,0 +1,151 @@
+"""
+Materialized archive counts
+Keeps per-(tag, category, local day) counts of archived documents inside the
+archive index, adjusted document by document as the index sync sees items
+enter or leave the archive, move between days or gain and lose tags. Totals
+and per-day deltas become single-row reads instead of scans.
+
+Rows with tag '' count every archived document regardless of tags; category
+'' and day '' stand for documents without a category or timestamp.
+
+Days are calendar days in the runner's local timezone (TZ), not Beeminder
+goal days: the rows are rebuilt when TZ changes, but they know nothing of a
+goal's timezone or deadline. Backfill, reconcile and stats bucket document
+timestamps with the goal's own day boundaries (beeminder_state.GoalState)
+instead of reading these rows. Set TZ to the goal's timezone (e.g. on a UTC
+CI runner) before reading per-day rows as goal days.
+"""
+
+import time
+from collections import Counter
+
+# Bump to rebuild the aggregates of existing indexes from their documents
+AGGREGATES_VERSION = 1
+
+ALL_TAGS = ''
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archive_counts (
+    tag TEXT NOT NULL,
+    category TEXT NOT NULL,
+    day TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (tag, category, day)
+);
+CREATE TABLE IF NOT EXISTS archive_totals (
+    tag TEXT NOT NULL,
+    category TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (tag, category)
+);
+"""
+
+
+def aggregates_key():
+    """Identifies the aggregate layout and the local timezone the days were computed in"""
+    return f"{AGGREGATES_VERSION}:{time.timezone}:{time.tzname[0]}"
+
+
+def local_day(timestamp):
+    """Local calendar day (YYYY-MM-DD) of a Unix timestamp ('' if missing)"""
+    if timestamp is None:
+        return ''
+    return time.strftime('%Y-%m-%d', time.localtime(timestamp))
+
+
+def document_keys(location, category, updated_at, tags):
+    """Aggregate keys a document contributes to (none unless it is archived)"""
+    if location != 'archive':
+        return []
+    category = category or ''
+    day = local_day(updated_at)
+    return [(tag, category, day) for tag in {ALL_TAGS, *tags}]
+
+
+def apply_change(conn, old_keys, new_keys):
+    """Move one document's contribution from old_keys to new_keys"""
+    deltas = Counter(new_keys)
+    deltas.subtract(old_keys)
+    for (tag, category, day), delta in deltas.items():
+        if not delta:
+            continue
+        conn.execute(
+            "INSERT INTO archive_counts (tag, category, day, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(tag, category, day) DO UPDATE SET count = count + excluded.count",
+            (tag, category, day, delta)
+        )
+        conn.execute(
+            "INSERT INTO archive_totals (tag, category, count) VALUES (?, ?, ?) "
+            "ON CONFLICT(tag, category) DO UPDATE SET count = count + excluded.count",
+            (tag, category, delta)
+        )
+
+
+def rebuild_aggregates(conn):
+    """Recompute every aggregate from the documents in the index"""
+    day = "COALESCE(date(d.updated_at, 'unixepoch', 'localtime'), '')"
+    conn.execute("DELETE FROM archive_counts")
+    conn.execute("DELETE FROM archive_totals")
+    conn.execute(
+        f"INSERT INTO archive_counts (tag, category, day, count) "
+        f"SELECT '', COALESCE(d.category, ''), {day}, COUNT(*) FROM documents d "
+        f"WHERE d.location = 'archive' GROUP BY 2, 3 "
+        f"UNION ALL "
+        f"SELECT t.tag, COALESCE(d.category, ''), {day}, COUNT(*) FROM documents d "
+        f"JOIN document_tags t ON t.doc_id = d.id WHERE d.location = 'archive' GROUP BY 1, 2, 3"
+    )
+    conn.execute(
+        "INSERT INTO archive_totals (tag, category, count) "
+        "SELECT tag, category, SUM(count) FROM archive_counts GROUP BY tag, category"
+    )
+
+
+def _categories(category):
+    if category is None:
+        return None
+    return [category] if isinstance(category, str) else list(category)
+
+
+def aggregate_total(conn, tag=None, category=None):
+    """
+    Archived documents with a tag (None: any) in a category or list of categories (None: any)
+
+    Reads one totals row per category instead of counting documents.
+    """
+    sql = "SELECT COALESCE(SUM(count), 0) FROM archive_totals WHERE tag = ?"
+    args = [tag or ALL_TAGS]
+    categories = _categories(category)
+    if categories is not None:
+        sql += f" AND category IN ({', '.join('?' * len(categories))})"
+        args.extend(categories)
+    return conn.execute(sql, args).fetchone()[0]
+
+
+def aggregate_days(conn, tag=None, category=None, start_day=None, end_day=None):
+    """
+    Archived documents per local day (YYYY-MM-DD in the runner's timezone, inclusive range)
+
+    Returns:
+        Dict of day -> count (days without documents are omitted)
+    """
+    sql = "SELECT day, SUM(count) FROM archive_counts WHERE tag = ? AND day != ''"
+    args = [tag or ALL_TAGS]
+    categories = _categories(category)
+    if categories is not None:
+        sql += f" AND category IN ({', '.join('?' * len(categories))})"
+        args.extend(categories)
+    if start_day:
+        sql += " AND day >= ?"
+        args.append(start_day)
+    if end_day:
+        sql += " AND day <= ?"
+        args.append(end_day)
+    sql += " GROUP BY day HAVING SUM(count) != 0 ORDER BY day"
+    return {day: count for day, count in conn.execute(sql, args)}
+
+
+def aggregate_day(conn, day=None, tag=None, category=None):
+    """Archived documents whose last update falls on a local day (default: today)"""
+    day = day or local_day(time.time())
+    return aggregate_days(conn, tag, category, day, day).get(day, 0)
+
@@ -0,0 +1,355 @@
+"""
+Persistent local index of Readwise Reader documents
+Keeps an on-disk SQLite copy of document metadata (id, updated_at, location,
+category, tags) current with `updatedAfter` delta fetches, so each run only
+pays for what changed since the previous sync. Archive counts per tag,
+category and day are maintained alongside (see aggregates.py).
+"""
+
+import json
+import math
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from aggregates import (
+    SCHEMA as AGGREGATES_SCHEMA, aggregate_total, aggregates_key, apply_change, document_keys, rebuild_aggregates,
+)
+from checkpoint import CHECKPOINT_MAX_AGE_SECONDS
+from documents import TAGS, DocumentRecord, compact_record, parse_timestamp, tag_names
+from metrics import timed
+from readwise_api import READWISE_API_BASE, iter_list_pages_with_cursor
+from tag_index import parse_tag_filter
+
+# Index file shared by both sync scripts
+INDEX_FILE = Path.home() / ".readwise_beeminder_index.sqlite3"
+
+# Re-fetch a little before the watermark so clock skew can't drop updates.
+# Overlapping documents are deduplicated by id.
+WATERMARK_OVERLAP_SECONDS = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    updated_at REAL,
+    location TEXT,
+    category TEXT,
+    title TEXT,
+    source_url TEXT
+);
+CREATE INDEX IF NOT EXISTS documents_location_updated ON documents (location, updated_at);
+CREATE TABLE IF NOT EXISTS document_tags (
+    doc_id TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (doc_id, tag)
+);
+CREATE INDEX IF NOT EXISTS document_tags_tag ON document_tags (tag);
+CREATE TABLE IF NOT EXISTS sync_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def open_index(path=INDEX_FILE):
+    """Open (and create if needed) the document index"""
+    conn = sqlite3.connect(str(path))
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    conn.executescript(AGGREGATES_SCHEMA)
+    if get_meta(conn, 'aggregates') != aggregates_key():
+        # New index, an index from before aggregates, or the local timezone changed
+        rebuild_aggregates(conn)
+        set_meta(conn, 'aggregates', aggregates_key())
+        conn.commit()
+    return conn
+
+
+def get_meta(conn, key):
+    """Read a value from the index metadata table"""
+    row = conn.execute("SELECT value FROM sync_meta WHERE key = ?", (key,)).fetchone()
+    return row['value'] if row else None
+
+
+def set_meta(conn, key, value):
+    """Write a value to the index metadata table"""
+    conn.execute(
+        "INSERT INTO sync_meta (key, value) VALUES (?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, value)
+    )
+
+
+def _stored_record(doc_id, row, tags):
+    """DocumentRecord for a document as currently stored in the index"""
+    updated_at = row['updated_at']
+    return DocumentRecord(doc_id, math.ceil(updated_at) if updated_at is not None else None,
+                          row['location'], row['category'], tuple(TAGS.intern(name) for name in tags))
+
+
+def upsert_documents(conn, documents, on_change=None):
+    """
+    Insert or update documents in the index, deduplicated by id
+
+    The archive count aggregates are adjusted by the difference between each
+    document's stored and new state.
+
+    Args:
+        conn: Index connection from open_index()
+        documents: Readwise document dicts
+        on_change: Optional callback(old, new) with DocumentRecords for each
+            document's stored state (None if it is new to the index) and new state
+
+    Returns:
+        Latest updated_at (Unix timestamp) seen in the batch, or None
+    """
+    latest = None
+    for doc in documents:
+        doc_id = doc.get('id')
+        if not doc_id:
+            continue
+
+        updated_at = parse_timestamp(doc.get('updated_at'))
+        if updated_at is not None and (latest is None or updated_at > latest):
+            latest = updated_at
+
+        old_keys = []
+        old_tags = []
+        old = conn.execute("SELECT location, category, updated_at FROM documents WHERE id = ?",
+                           (doc_id,)).fetchone()
+        if old is not None and (old['location'] == 'archive' or on_change):
+            old_tags = [row[0] for row in conn.execute("SELECT tag FROM document_tags WHERE doc_id = ?", (doc_id,))]
+            old_keys = document_keys(old['location'], old['category'], old['updated_at'], old_tags)
+        tags = tag_names(doc)
+
+        conn.execute(
+            "INSERT INTO documents (id, updated_at, location, category, title, source_url) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET updated_at = excluded.updated_at, "
+            "location = excluded.location, category = excluded.category, "
+            "title = excluded.title, source_url = excluded.source_url",
+            (doc_id, updated_at, doc.get('location'), doc.get('category'),
+             doc.get('title'), doc.get('source_url'))
+        )
+        conn.execute("DELETE FROM document_tags WHERE doc_id = ?", (doc_id,))
+        conn.executemany(
+            "INSERT OR IGNORE INTO document_tags (doc_id, tag) VALUES (?, ?)",
+            [(doc_id, name) for name in tags]
+        )
+        apply_change(conn, old_keys, document_keys(doc.get('location'), doc.get('category'), updated_at, tags))
+        if on_change:
+            on_change(_stored_record(doc_id, old, old_tags) if old is not None else None, compact_record(doc))
+    return latest
+
+
+def sync_index(conn, token, api_base=READWISE_API_BASE, client=None, on_change=None):
+    """
+    Bring the index up to date with Readwise Reader
+
+    The first sync pulls the whole archive. Later syncs only fetch documents
+    updated after the stored watermark (in any location, so documents that
+    leave the archive or change tags are picked up too).
+
+    The next page cursor is saved with each page (in the same transaction as
+    its documents), so an interrupted sync resumes from the last page unless
+    the checkpoint is older than CHECKPOINT_MAX_AGE_SECONDS.
+
+    Args:
+        conn: Index connection from open_index()
+        token: Readwise access token
+        api_base: Readwise API base URL
+        client: HttpClient to use (defaults to the shared pooled client)
+        on_change: Optional per-document callback, see upsert_documents()
+
+    Returns:
+        Number of documents fetched
+    """
+    watermark = get_meta(conn, 'watermark')
+    resume = _load_sync_checkpoint(conn)
+
+    if resume:
+        params = resume['params']
+        latest = resume['latest']
+        cursor = resume['cursor']
+        fetched = resume['fetched']
+        print(f"Resuming archive index sync from checkpoint ({fetched} documents already fetched)...")
+    elif watermark is None:
+        print("Building local archive index (first run)...")
+        params = {'location': 'archive'}
+        latest = None
+        cursor = None
+        fetched = 0
+    else:
+        latest = float(watermark)
+        since = datetime.fromtimestamp(latest - WATERMARK_OVERLAP_SECONDS, tz=timezone.utc)
+        print(f"Syncing archive index (changes since {since.strftime('%Y-%m-%d %H:%M:%S')} UTC)...")
+        params = {'updatedAfter': since.isoformat()}
+        cursor = None
+        fetched = 0
+
+    pages = iter_list_pages_with_cursor(token, params, api_base=api_base, client=client, cursor=cursor)
+    for page, next_cursor in pages:
+        page_latest = upsert_documents(conn, page, on_change)
+        if page_latest is not None and (latest is None or page_latest > latest):
+            latest = page_latest
+        fetched += len(page)
+        if next_cursor:
+            set_meta(conn, 'sync_checkpoint', json.dumps({
+                'params': params, 'cursor': next_cursor, 'latest': latest,
+                'fetched': fetched, 'saved_at': time.time(),
+            }))
+        # Commit each page so an interrupted sync keeps its progress
+        conn.commit()
+
+    conn.execute("DELETE FROM sync_meta WHERE key = 'sync_checkpoint'")
+    if latest is not None:
+        set_meta(conn, 'watermark', repr(latest))
+    conn.commit()
+
+    print(f"✓ Index synced ({fetched} documents fetched)")
+    return fetched
+
+
+def _load_sync_checkpoint(conn):
+    """Return the saved sync checkpoint if there is a fresh one"""
+    value = get_meta(conn, 'sync_checkpoint')
+    if not value:
+        return None
+    checkpoint = json.loads(value)
+    age = time.time() - checkpoint.get('saved_at', 0)
+    if age > CHECKPOINT_MAX_AGE_SECONDS:
+        print(f"Index sync checkpoint is {age / 60:.0f} minutes old - restarting sync")
+        conn.execute("DELETE FROM sync_meta WHERE key = 'sync_checkpoint'")
+        conn.commit()
+        return None
+    return checkpoint
+
+
+def _filter_condition(filter_tag=None, category=None, location='archive'):
+    """WHERE condition (and its arguments) for documents in a location with a tag filter and category"""
+    sql = "1 = 1"
+    args = []
+    if location:
+        sql += " AND d.location = ?"
+        args.append(location)
+    if category:
+        categories = [category] if isinstance(category, str) else list(category)
+        sql += f" AND d.category IN ({', '.join('?' * len(categories))})"
+        args.extend(categories)
+    expression = parse_tag_filter(filter_tag)
+    if expression is not None:
+        # One (NOT) EXISTS per tag, ORed within a clause and ANDed across clauses
+        for clause in expression.clauses:
+            terms = []
+            for name, negated in clause:
+                terms.append(f"{'NOT ' if negated else ''}EXISTS "
+                             "(SELECT 1 FROM document_tags t WHERE t.doc_id = d.id AND t.tag = ?)")
+                args.append(name)
+            sql += f" AND ({' OR '.join(terms)})"
+    return sql, args
+
+
+def _since_condition(sql, args, since_timestamp):
+    if since_timestamp:
+        # Documents without a timestamp are included to be safe
+        sql += " AND (d.updated_at IS NULL OR d.updated_at > ?)"
+        args.append(since_timestamp)
+    return sql, args
+
+
+def _archive_query(columns, filter_tag=None, category=None, since_timestamp=None, location='archive'):
+    """Build the SELECT for documents in a location (default: archive) matching the given filters"""
+    condition, args = _filter_condition(filter_tag, category, location)
+    return _since_condition(f"SELECT {columns} FROM documents d WHERE {condition}", args, since_timestamp)
+
+
+def _rules_query(columns, rules, since_timestamp=None):
+    """Build the SELECT for documents matching any of several goal_map.GoalRule objects (each counted once)"""
+    conditions = []
+    args = []
+    for rule in rules:
+        condition, rule_args = _filter_condition(rule.tag, rule.category, rule.location)
+        conditions.append(f"({condition})")
+        args.extend(rule_args)
+    sql = f"SELECT {columns} FROM documents d WHERE ({' OR '.join(conditions) or '1 = 0'})"
+    return _since_condition(sql, args, since_timestamp)
+
+
+@timed('filter')
+def count_archived(conn, filter_tag=None, category=None, since_timestamp=None, location='archive'):
+    """Count archived documents, optionally with a tag, category (or list of categories) or newer than a timestamp"""
+    expression = parse_tag_filter(filter_tag)
+    if location == 'archive' and not since_timestamp and (expression is None or expression.single_tag):
+        # Plain totals come straight from the maintained aggregates
+        return aggregate_total(conn, expression.single_tag if expression else None, category)
+    sql, args = _archive_query("COUNT(*)", filter_tag, category, since_timestamp, location)
+    return conn.execute(sql, args).fetchone()[0]
+
+
+@timed('filter')
+def count_goal(conn, rules, since_timestamp=None):
+    """Count documents matching any of a goal's rules (goal_map.GoalRule), optionally newer than a timestamp"""
+    if len(rules) == 1:
+        rule = rules[0]
+        return count_archived(conn, filter_tag=rule.tag, category=rule.category, since_timestamp=since_timestamp,
+                              location=rule.location)
+    sql, args = _rules_query("COUNT(*)", rules, since_timestamp)
+    return conn.execute(sql, args).fetchone()[0]
+
+
+@timed('filter')
+def list_archived(conn, filter_tag=None, category=None, since_timestamp=None, limit=None):
+    """
+    List archived documents (most recently updated first)
+
+    Returns:
+        List of dicts shaped like Readwise documents (id, title, source_url, updated_at, tags)
+    """
+    sql, args = _archive_query("d.*", filter_tag, category, since_timestamp)
+    sql += " ORDER BY d.updated_at DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        args.append(limit)
+
+    items = []
+    for row in conn.execute(sql, args).fetchall():
+        tags = [t['tag'] for t in conn.execute(
+            "SELECT tag FROM document_tags WHERE doc_id = ? ORDER BY tag", (row['id'],))]
+        items.append({
+            'id': row['id'],
+            'title': row['title'] or 'Untitled',
+            'source_url': row['source_url'] or 'No URL',
+            'category': row['category'],
+            'location': row['location'],
+            'updated_at': row['updated_at'],
+            'tags': tags,
+        })
+    return items
+
+
+@timed('filter')
+def archived_timestamps(conn, filter_tag=None, category=None, since_timestamp=None, until_timestamp=None,
+                        location='archive'):
+    """Update timestamps of matching archived documents in [since_timestamp, until_timestamp) (oldest first)"""
+    sql, args = _archive_query("d.updated_at", filter_tag, category, None, location)
+    return _timestamps(conn, sql, args, since_timestamp, until_timestamp)
+
+
+@timed('filter')
+def goal_timestamps(conn, rules, since_timestamp=None, until_timestamp=None):
+    """Update timestamps in [since_timestamp, until_timestamp) of documents matching any of a goal's rules"""
+    sql, args = _rules_query("d.updated_at", rules)
+    return _timestamps(conn, sql, args, since_timestamp, until_timestamp)
+
+
+def _timestamps(conn, sql, args, since_timestamp, until_timestamp):
+    sql += " AND d.updated_at IS NOT NULL"
+    if since_timestamp is not None:
+        sql += " AND d.updated_at >= ?"
+        args.append(since_timestamp)
+    if until_timestamp is not None:
+        sql += " AND d.updated_at < ?"
+        args.append(until_timestamp)
+    sql += " ORDER BY d.updated_at"
+    return [row[0] for row in conn.execute(sql, args)]
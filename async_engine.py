@@ -0,0 +1,198 @@
+"""
+Asyncio execution engine
+Async HTTP client and pagination used by the `--async` mode of the simple
+sync: Beeminder lookups run alongside Readwise paging, page N+1 is requested
+while page N is processed, and posts to several goals go out concurrently.
+GETs share the blocking client's response cache (response_cache.py).
+
+Requires aiohttp (pip install aiohttp).
+"""
+
+import asyncio
+import json
+import time
+
+try:
+    import aiohttp
+except ImportError:  # Optional dependency - only needed for --async
+    aiohttp = None
+
+from documents import compact_page
+from http_client import CONNECT_TIMEOUT, READ_TIMEOUT, POOL_MAXSIZE, DEFAULT_HEADERS, readwise_headers
+from list_decoder import decode_list_page
+from metrics import endpoint_name, get_metrics
+from rate_limit import RequestScheduler, default_limits
+from response_cache import cache_key, cacheable_request
+from readwise_api import READWISE_API_BASE, STREAM_DECODE
+
+# Requests in flight at once across the whole run
+MAX_CONCURRENCY = 8
+
+
+class AsyncHttpClient:
+    """aiohttp session with bounded concurrency and the shared pacing/retry policy"""
+
+    def __init__(self, scheduler=None, max_concurrency=MAX_CONCURRENCY, metrics=None, cache=None):
+        if aiohttp is None:
+            raise RuntimeError("Async mode requires aiohttp: pip install aiohttp")
+        self.scheduler = scheduler or RequestScheduler(default_limits())
+        self.metrics = metrics or get_metrics()
+        self.cache = cache
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.session = None
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(
+            headers=DEFAULT_HEADERS,
+            connector=aiohttp.TCPConnector(limit_per_host=POOL_MAXSIZE),
+            timeout=aiohttp.ClientTimeout(sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    async def request(self, method, url, params=None, data=None, headers=None, rate_key=None):
+        """
+        Send a request with pacing, retries and bounded concurrency
+
+        A GET with a cached response is sent conditionally (or not at all while
+        the entry is fresh), and a 304 returns the stored body as a 200.
+
+        Returns:
+            (status, body text)
+        """
+        if params:
+            params = {key: str(value) for key, value in params.items()}
+        endpoint = endpoint_name(url)
+        cache = self.cache if method == 'GET' and cacheable_request(params) else None
+        entry = key = None
+        if cache is not None:
+            key = cache_key(url, params, headers)
+            entry = cache.lookup(key)
+            if entry is not None and entry.is_fresh(cache.ttl):
+                cache.record_fresh(entry)
+                return 200, bytes(entry.body).decode('utf-8')
+            if entry is not None:
+                headers = dict(headers or {}, **entry.conditional_headers())
+
+        async def send():
+            async with self.semaphore:
+                started = time.perf_counter()
+                try:
+                    async with self.session.request(method, url, params=params, data=data,
+                                                    headers=headers) as response:
+                        raw = await response.read()
+                        text = await response.text()
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    self.metrics.record_request(endpoint, method, None, time.perf_counter() - started)
+                    raise
+                self.metrics.record_request(endpoint, method, response.status, time.perf_counter() - started,
+                                            response.content_length or len(raw))
+                return response.status, response.headers, (raw, text)
+
+        status, response_headers, (raw, body) = await self.scheduler.send_async(
+            method, send, rate_key=rate_key,
+            retry_exceptions=(aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+        if cache is None:
+            if method not in ('GET', 'HEAD') and self.cache is not None:
+                self.cache.invalidate(url)
+            return status, body
+        if entry is not None and status == 304:
+            cache.record_revalidated(entry, response_headers)
+            return 200, bytes(entry.body).decode('utf-8')
+        cache.record_miss()
+        if status == 200:
+            cache.store(key, url, response_headers, raw)
+        return status, body
+
+    async def get_json(self, url, params=None, headers=None, rate_key=None):
+        """GET url and decode the JSON body (raises RuntimeError on non-200)"""
+        status, body = await self.request('GET', url, params=params, headers=headers, rate_key=rate_key)
+        if status != 200:
+            raise RuntimeError(f"{status} Error for url: {url}")
+        with self.metrics.phase('json_decode'):
+            return json.loads(body)
+
+    async def get_list_page(self, url, params=None, headers=None, rate_key=None):
+        """
+        GET a /list/ page, decoding results one document at a time (see list_decoder.py)
+
+        Returns:
+            (list of documents, nextPageCursor or None)
+        """
+        if not STREAM_DECODE:
+            data = await self.get_json(url, params=params, headers=headers, rate_key=rate_key)
+            return data.get('results', []), data.get('nextPageCursor')
+        status, body = await self.request('GET', url, params=params, headers=headers, rate_key=rate_key)
+        if status != 200:
+            raise RuntimeError(f"{status} Error for url: {url}")
+        with self.metrics.phase('json_decode'):
+            return decode_list_page(body)
+
+
+async def iter_list_pages_async(client, token, params=None, api_base=READWISE_API_BASE):
+    """
+    Async generator of /list/ pages, fetching the next page while the caller processes the current one
+
+    Yields:
+        List of documents for each page
+    """
+    headers = readwise_headers(token)
+    params = dict(params or {})
+    url = f"{api_base}/list/"
+
+    def fetch(page_params):
+        return asyncio.ensure_future(client.get_list_page(url, params=page_params, headers=headers,
+                                                          rate_key='readwise_list'))
+
+    pending = fetch(dict(params))
+    try:
+        while pending is not None:
+            page, next_page_cursor = await pending
+            pending = None
+            if next_page_cursor:
+                params['pageCursor'] = next_page_cursor
+                pending = fetch(dict(params))
+            yield page
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+async def scan_documents_async(client, token, chains, on_document, api_base=READWISE_API_BASE, on_page=None):
+    """
+    Run one or more /list/ cursor chains concurrently, passing each document once to on_document
+
+    Args:
+        client: AsyncHttpClient
+        token: Readwise access token
+        chains: List of query parameter dicts, one per independent cursor chain
+        on_document: Function called as on_document(record, item) for every document (deduplicated by
+            id) with its documents.DocumentRecord and the raw API dict (for display fields only)
+        api_base: Readwise API base URL
+        on_page: Optional callback called with the number of documents scanned so far
+
+    Returns:
+        Number of documents scanned
+    """
+    metrics = get_metrics()
+    seen_ids = set()
+    scanned = [0]
+
+    async def run_chain(params):
+        async for page in iter_list_pages_async(client, token, params, api_base=api_base):
+            with metrics.phase('filter'):
+                for record, item in zip(compact_page(page), page):
+                    if record.id is not None:
+                        if record.id in seen_ids:
+                            continue
+                        seen_ids.add(record.id)
+                    on_document(record, item)
+            scanned[0] += len(page)
+            if on_page:
+                on_page(scanned[0])
+
+    await asyncio.gather(*(run_chain(params) for params in chains))
+    return scanned[0]
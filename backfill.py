@@ -0,0 +1,124 @@
+"""
+Bulk datapoint backfill
+Rebuilds per-day archive counts from document timestamps and submits them
+through Beeminder's create_all endpoint in batches. Every datapoint carries a
+deterministic requestid per goal-day, so rerunning a backfill updates the
+existing datapoints instead of double-counting.
+"""
+
+import json
+from datetime import date, datetime, time, timedelta, timezone
+
+from http_client import get_client, beeminder_params
+
+# Datapoints per create_all request
+BACKFILL_BATCH_SIZE = 100
+
+REQUEST_ID_PREFIX = "readwise-beeminder"
+
+# Documents are fetched this far either side of the requested dates; the goal's
+# timezone and deadline then decide which day each one belongs to
+RANGE_PADDING_SECONDS = 2 * 24 * 60 * 60
+
+
+def request_id(goal, daystamp):
+    """Deterministic requestid for one goal-day"""
+    return f"{REQUEST_ID_PREFIX}:{goal}:{daystamp}"
+
+
+def parse_date(value):
+    """Parse YYYY-MM-DD into a date (ValueError if malformed)"""
+    return date.fromisoformat(value)
+
+
+def fetch_window(start, end):
+    """Unix timestamp window [since, until) covering start..end in any goal timezone"""
+    since = datetime.combine(start, time.min, timezone.utc).timestamp() - RANGE_PADDING_SECONDS
+    until = datetime.combine(end + timedelta(days=1), time.min, timezone.utc).timestamp() + RANGE_PADDING_SECONDS
+    return since, until
+
+
+def daystamps_between(start, end):
+    """Every YYYYMMDD daystamp from start to end inclusive"""
+    days = []
+    day = start
+    while day <= end:
+        days.append(day.strftime('%Y%m%d'))
+        day += timedelta(days=1)
+    return days
+
+
+def daily_counts(timestamps, daystamp_of, start, end):
+    """
+    Count timestamps per Beeminder day
+
+    Args:
+        timestamps: Iterable of Unix timestamps (None entries are skipped)
+        daystamp_of: Function mapping a timestamp to its YYYYMMDD day (e.g. GoalState.daystamp)
+        start: First date to include
+        end: Last date to include
+
+    Returns:
+        Dict of daystamp -> count for every day in the range (zero days included)
+    """
+    counts = {day: 0 for day in daystamps_between(start, end)}
+    for timestamp in timestamps:
+        if timestamp is None:
+            continue
+        day = daystamp_of(timestamp)
+        if day in counts:
+            counts[day] += 1
+    return counts
+
+
+def backfill_datapoints(goal, counts, description=None):
+    """
+    Build create_all datapoints from per-day counts (days with no items are skipped)
+
+    Returns:
+        List of datapoint dicts (daystamp, value, comment, requestid), oldest first
+    """
+    datapoints = []
+    for day in sorted(counts):
+        count = counts[day]
+        if count == 0:
+            continue
+        comment = f"Backfilled from Readwise Reader ({count} items)"
+        if description:
+            comment += f" [{description}]"
+        datapoints.append({
+            'daystamp': day,
+            'value': count,
+            'comment': comment,
+            'requestid': request_id(goal, day),
+        })
+    return datapoints
+
+
+def submit_datapoints(username, goal, auth_token, api_base, datapoints, batch_size=BACKFILL_BATCH_SIZE,
+                      client=None):
+    """
+    Submit datapoints with create_all, batch_size at a time
+
+    Returns:
+        (number of datapoints accepted, list of (batch index, error message) for failed batches)
+    """
+    client = client or get_client()
+    url = f"{api_base}/users/{username}/goals/{goal}/datapoints/create_all.json"
+    accepted = 0
+    failures = []
+
+    for index in range(0, len(datapoints), batch_size):
+        batch = datapoints[index:index + batch_size]
+        data = beeminder_params(auth_token, {'datapoints': json.dumps(batch)})
+        try:
+            response = client.post(url, data=data)
+        except Exception as e:
+            failures.append((index // batch_size, str(e)))
+            continue
+        if response.status_code == 200:
+            accepted += len(batch)
+        else:
+            failures.append((index // batch_size, f"{response.status_code} - {response.text}"))
+
+    return accepted, failures
@@ -0,0 +1,210 @@
+"""
+Beeminder goal state in a single round trip
+Fetches everything a run needs from Beeminder - last posted total, recent-post
+detection and the goal's day boundaries - with one request, caching the goal
+metadata locally so later runs only download the recent datapoints.
+"""
+
+import json
+import os
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+from http_client import get_client, beeminder_params
+
+GOAL_CACHE_FILE = Path.home() / ".readwise_beeminder_goal_cache.json"
+GOAL_CACHE_TTL_SECONDS = 6 * 60 * 60
+
+# Recent datapoints fetched per run
+RECENT_DATAPOINTS = 10
+
+# Goal fields worth caching (the full goal JSON also carries graph/road data)
+GOAL_METADATA_FIELDS = ('slug', 'title', 'timezone', 'deadline', 'aggday', 'kyoom', 'rate', 'runits', 'safebuf')
+
+TOTAL_COMMENT_RE = re.compile(r'Total:\s*(-?\d+)(?:\s*\(\+?(-?\d+) new\))?')
+
+
+class TotalComment:
+    """Structured form of a 'Total: N (+D new)' datapoint comment"""
+
+    __slots__ = ('total', 'difference')
+
+    def __init__(self, total, difference=None):
+        self.total = total
+        self.difference = difference
+
+    def __repr__(self):
+        return f"TotalComment(total={self.total}, difference={self.difference})"
+
+
+def parse_total_comment(comment):
+    """Parse a 'Total: N (+D new)' comment (None if the comment isn't ours)"""
+    match = TOTAL_COMMENT_RE.search(comment or '')
+    if not match:
+        return None
+    difference = match.group(2)
+    return TotalComment(int(match.group(1)), int(difference) if difference is not None else None)
+
+
+class GoalState:
+    """Goal metadata plus the most recent datapoints (newest first)"""
+
+    def __init__(self, goal, metadata, datapoints, from_cache=False):
+        self.goal = goal
+        self.metadata = metadata
+        self.from_cache = from_cache
+        self.datapoints = sorted(datapoints, key=lambda dp: (dp.get('timestamp') or 0, dp.get('updated_at') or 0),
+                                 reverse=True)
+        self._last_total = None
+        self._parsed = False
+
+    @property
+    def timezone(self):
+        """IANA timezone of the goal (UTC if unknown)"""
+        return self.metadata.get('timezone') or 'UTC'
+
+    @property
+    def deadline(self):
+        """Seconds after local midnight at which the goal's day ends"""
+        return int(self.metadata.get('deadline') or 0)
+
+    def last_total_record(self):
+        """Most recent datapoint comment with a parsed total (TotalComment or None)"""
+        if not self._parsed:
+            for dp in self.datapoints:
+                record = parse_total_comment(dp.get('comment'))
+                if record:
+                    self._last_total = record
+                    break
+            self._parsed = True
+        return self._last_total
+
+    def last_total(self):
+        """Last total we posted (0 if none found)"""
+        record = self.last_total_record()
+        return record.total if record else 0
+
+    def last_timestamp(self):
+        """Timestamp of the most recent datapoint (None if there are none)"""
+        return self.datapoints[0].get('timestamp') if self.datapoints else None
+
+    @property
+    def tzinfo(self):
+        """tzinfo of the goal's timezone (UTC if unknown or zoneinfo is unavailable)"""
+        if ZoneInfo is not None:
+            try:
+                return ZoneInfo(self.timezone)
+            except Exception:
+                pass
+        return timezone.utc
+
+    def daystamp(self, timestamp=None):
+        """Beeminder day (YYYYMMDD) of a Unix timestamp in the goal's timezone and deadline"""
+        if timestamp is None:
+            timestamp = time.time()
+        local = datetime.fromtimestamp(timestamp, self.tzinfo) - timedelta(seconds=self.deadline)
+        return local.strftime('%Y%m%d')
+
+    def day_end(self, day):
+        """Unix timestamp at which a Beeminder day (datetime.date) ends in the goal's timezone and deadline"""
+        midnight = datetime.combine(day + timedelta(days=1), datetime.min.time(), self.tzinfo)
+        return (midnight + timedelta(seconds=self.deadline)).timestamp()
+
+    def posted_today(self, now=None):
+        """True if one of our 'Total:' datapoints falls on the goal's current day"""
+        today = self.daystamp(now)
+        for dp in self.datapoints:
+            if not parse_total_comment(dp.get('comment')):
+                continue
+            daystamp = dp.get('daystamp') or self.daystamp(dp.get('timestamp') or 0)
+            if daystamp == today:
+                return True
+        return False
+
+
+def _load_cache(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"Warning: Could not load goal cache: {e}")
+        return {}
+
+
+def _save_cache(path, cache):
+    try:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Warning: Could not save goal cache: {e}")
+
+
+def cached_metadata(username, goal, cache_path=GOAL_CACHE_FILE, ttl=GOAL_CACHE_TTL_SECONDS):
+    """Cached goal metadata if it is younger than ttl, else None"""
+    entry = _load_cache(cache_path).get(f"{username}/{goal}")
+    if entry and time.time() - entry.get('fetched_at', 0) < ttl:
+        return entry.get('metadata')
+    return None
+
+
+def goal_state_request(username, goal, auth_token, api_base, cache_path=GOAL_CACHE_FILE, refresh=False):
+    """
+    Work out the single request that loads a goal's state
+
+    With fresh cached metadata (and not refresh) only the recent datapoints are
+    fetched; otherwise the goal is fetched together with its recent datapoints.
+
+    Returns:
+        (url, params, cached metadata or None)
+    """
+    metadata = None if refresh else cached_metadata(username, goal, cache_path)
+    if metadata is not None:
+        url = f"{api_base}/users/{username}/goals/{goal}/datapoints.json"
+        params = beeminder_params(auth_token, {'count': RECENT_DATAPOINTS, 'sort': 'id'})
+    else:
+        url = f"{api_base}/users/{username}/goals/{goal}.json"
+        params = beeminder_params(auth_token, {'datapoints': 'true', 'datapoints_count': RECENT_DATAPOINTS})
+    return url, params, metadata
+
+
+def goal_state_from_response(username, goal, payload, metadata, cache_path=GOAL_CACHE_FILE):
+    """Build a GoalState from the response to goal_state_request (refreshing the cache)"""
+    if metadata is not None:
+        return GoalState(goal, metadata, payload or [], from_cache=True)
+
+    payload = payload or {}
+    metadata = {field: payload[field] for field in GOAL_METADATA_FIELDS if field in payload}
+    cache = _load_cache(cache_path)
+    cache[f"{username}/{goal}"] = {'metadata': metadata, 'fetched_at': time.time()}
+    _save_cache(cache_path, cache)
+    return GoalState(goal, metadata, payload.get('datapoints') or [])
+
+
+def fetch_goal_state(username, goal, auth_token, api_base, client=None, cache_path=GOAL_CACHE_FILE, refresh=False):
+    """
+    Load a goal's state with one Beeminder request
+
+    refresh ignores the cached metadata (e.g. when a field is missing from an older cache entry).
+
+    Returns:
+        GoalState
+
+    Raises:
+        requests.exceptions.RequestException: On network errors or a non-200 response
+    """
+    client = client or get_client()
+    url, params, metadata = goal_state_request(username, goal, auth_token, api_base, cache_path, refresh)
+    response = client.get(url, params=params)
+    response.raise_for_status()
+    return goal_state_from_response(username, goal, response.json(), metadata, cache_path)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Archive statistics benchmark
+Writes a synthetic archive index (archive_index.py schema) and times the
+stats command's work on it: loading the columns, selecting a goal's
+documents, day numbers in a DST timezone, the per-day/week/tag histograms
+and the projection. No network is involved.
+
+Usage:
+    python benchmarks/archive_stats.py
+    python benchmarks/archive_stats.py --docs 100000,500000 --span-days 3650
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from archive_index import open_index  # noqa: E402
+from goal_map import GoalRule  # noqa: E402
+from stats import ArchiveRates, day_numbers, load_archive_columns, local_today, project  # noqa: E402
+
+CATEGORIES = ['article', 'email', 'rss', 'pdf', 'epub', 'tweet', 'video']
+TAGS = ['learning', 'papers', 'fiction', 'work', 'later'] + [f'topic-{i}' for i in range(200)]
+
+
+def build_index(path, docs, span_days, seed=1):
+    """Fill an index file with `docs` documents (about 90% archived) over the last span_days days"""
+    rng = random.Random(seed)
+    now = time.time()
+    conn = open_index(path)
+    documents = []
+    tags = []
+    for i in range(docs):
+        doc_id = f'01h{i:023d}'
+        location = 'archive' if rng.random() < 0.9 else 'later'
+        documents.append((doc_id, now - rng.random() * span_days * 86400, location,
+                          rng.choice(CATEGORIES), f'Document {i}', f'https://example.com/{i}'))
+        for tag in rng.sample(TAGS[:5], rng.randint(0, 2)) + rng.sample(TAGS[5:], rng.randint(0, 2)):
+            tags.append((doc_id, tag))
+    conn.executemany("INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?)", documents)
+    conn.executemany("INSERT INTO document_tags VALUES (?, ?)", tags)
+    conn.commit()
+    return conn
+
+
+def run_stats(conn, rules, tz):
+    """The stats command's computation; returns seconds per step"""
+    timings = {}
+    start = time.perf_counter()
+    columns = load_archive_columns(conn)
+    timings['load'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    selected = columns.updated_at[columns.selection(rules)]
+    days = day_numbers(selected, tz)
+    rates = ArchiveRates(days, local_today(tz))
+    rates.pace(7)
+    rates.pace(28)
+    rates.pace(90)
+    project(rates, 1.0)
+    timings['goal'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    dated = columns.dated
+    recent = dated.copy()
+    recent[dated] = day_numbers(columns.updated_at[dated]) > local_today() - 28
+    columns.tag_counts()
+    columns.tag_counts(recent)
+    timings['tags'] = time.perf_counter() - start
+    return len(columns), timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the stats command on a synthetic archive index')
+    parser.add_argument('--docs', type=str, default='10000,100000,300000', help='Comma-separated index sizes')
+    parser.add_argument('--span-days', type=int, default=5 * 365, help='Days the archive is spread over')
+    parser.add_argument('--timezone', type=str, default='America/New_York', help='Goal timezone')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per size (best is reported)')
+    args = parser.parse_args()
+
+    rules = [GoalRule('learning', tag='learning|papers,-fiction', category='article'),
+             GoalRule('learning', tag='learning', category='pdf')]
+    tz = ZoneInfo(args.timezone)
+
+    header = (f"{'documents':>10} {'archived':>9} {'load (ms)':>10} {'goal (ms)':>10} {'tags (ms)':>10} "
+              f"{'total (ms)':>11}")
+    print(header)
+    print('-' * len(header))
+    with tempfile.TemporaryDirectory() as tmp:
+        for docs in (int(size) for size in args.docs.split(',') if size.strip()):
+            conn = build_index(Path(tmp) / f'index-{docs}.sqlite3', docs, args.span_days)
+            best = None
+            for _ in range(args.repeat):
+                archived, timings = run_stats(conn, rules, tz)
+                if best is None or sum(timings.values()) < sum(best.values()):
+                    best = timings
+            conn.close()
+            print(f"{docs:>10} {archived:>9} {best['load'] * 1000:>10.1f} {best['goal'] * 1000:>10.1f} "
+                  f"{best['tags'] * 1000:>10.1f} {sum(best.values()) * 1000:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+/list/ page decoding benchmark
+Compares the buffered path (join the body, response.json()) with the
+streaming decoder in list_decoder.py on generated pages, reporting decode
+time and peak allocation (tracemalloc) per page size. Bodies are fed in the
+same chunks the sync reads off the socket.
+
+Usage:
+    python benchmarks/decode_pages.py
+    python benchmarks/decode_pages.py --page-sizes 100,1000,5000 --summary-bytes 2000 --content-bytes 20000
+"""
+
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from list_decoder import ListPageDecoder  # noqa: E402
+from readwise_api import STREAM_CHUNK_BYTES  # noqa: E402
+
+
+def generate_page(page_size, summary_bytes=500, content_bytes=0):
+    """Encoded /list/ body shaped like Reader's (fields the sync ignores included)"""
+    results = []
+    for i in range(page_size):
+        doc = {
+            'id': f'01h{i:023d}',
+            'url': f'https://read.readwise.io/read/01h{i:023d}',
+            'title': f'Benchmark document {i}',
+            'author': 'Fake Author',
+            'source': 'Reader RSS',
+            'category': 'article',
+            'location': 'archive',
+            'tags': {'learning': {'name': 'learning', 'type': 'manual', 'created': 1700000000000}} if i % 3 else {},
+            'site_name': 'example.com',
+            'word_count': 1200 + i,
+            'created_at': '2026-01-01T10:00:00.000000+00:00',
+            'updated_at': '2026-01-02T10:00:00.000000+00:00',
+            'published_date': '2025-12-31',
+            'summary': ('Lorem ipsum dolor sit amet ' * (summary_bytes // 27 + 1))[:summary_bytes],
+            'image_url': f'https://images.example.com/{i}.jpg',
+            'notes': '',
+            'parent_id': None,
+            'reading_progress': 1.0,
+            'first_opened_at': '2026-01-01T11:00:00.000000+00:00',
+            'last_opened_at': '2026-01-02T09:00:00.000000+00:00',
+            'saved_at': '2026-01-01T10:00:00.000000+00:00',
+            'last_moved_at': '2026-01-02T10:00:00.000000+00:00',
+            'source_url': f'https://example.com/articles/{i}',
+        }
+        if content_bytes:
+            doc['html_content'] = ('<p>' + 'content ' * (content_bytes // 8 + 1))[:content_bytes]
+        results.append(doc)
+    page = {'count': page_size * 10, 'nextPageCursor': '01hnextcursor', 'results': results}
+    return json.dumps(page).encode()
+
+
+def chunked(body, size=STREAM_CHUNK_BYTES):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+def decode_buffered(chunks):
+    data = json.loads(b''.join(chunks))
+    return data.get('results', []), data.get('nextPageCursor')
+
+
+def decode_streaming(chunks):
+    decoder = ListPageDecoder()
+    page = []
+    for chunk in chunks:
+        page += decoder.feed(chunk)
+    page += decoder.close()
+    return page, decoder.next_page_cursor
+
+
+def measure(decode, chunks, repeat):
+    """(best seconds, peak bytes allocated) for decoding one page"""
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        decode(chunks)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    gc.collect()
+    tracemalloc.start()
+    result = decode(chunks)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark buffered vs streaming /list/ page decoding')
+    parser.add_argument('--page-sizes', type=str, default='100,1000,5000', help='Comma-separated documents per page')
+    parser.add_argument('--summary-bytes', type=int, default=500, help='Summary length per document')
+    parser.add_argument('--content-bytes', type=int, default=0,
+                        help='html_content length per document (withHtmlContent=true)')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing runs per case (best is reported)')
+    args = parser.parse_args()
+
+    header = (f"{'page size':>9} {'body (MB)':>10} {'buffered (ms)':>14} {'streaming (ms)':>15} "
+              f"{'buffered peak (MB)':>19} {'streaming peak (MB)':>20}")
+    print(header)
+    print('-' * len(header))
+    for page_size in (int(size) for size in args.page_sizes.split(',') if size.strip()):
+        body = generate_page(page_size, args.summary_bytes, args.content_bytes)
+        chunks = chunked(body)
+        buffered_time, buffered_peak = measure(decode_buffered, chunks, args.repeat)
+        streaming_time, streaming_peak = measure(decode_streaming, chunks, args.repeat)
+        print(f"{page_size:>9} {len(body) / 1e6:>10.2f} {buffered_time * 1000:>14.1f} {streaming_time * 1000:>15.1f} "
+              f"{buffered_peak / 1e6:>19.2f} {streaming_peak / 1e6:>20.2f}")
+
+
+if __name__ == '__main__':
+    main()
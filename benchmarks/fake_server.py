@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Readwise Reader and Beeminder APIs
+Serves a generated archive through /api/v3/list/ and a minimal Beeminder goal
+and datapoint API under /api/v1, with configurable page size, latency and 429
+injection. GET responses carry an ETag and are answered with 304 Not Modified
+when If-None-Match still matches. Request counts and bytes are tracked per endpoint for the
+benchmark runner (GET /_stats, POST /_reset).
+
+Run standalone:
+    python benchmarks/fake_server.py --docs 10000 --port 8765
+"""
+
+import argparse
+import bisect
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CATEGORIES = ('article', 'video', 'pdf', 'epub', 'tweet')
+LOCATIONS = ('archive', 'later', 'new')
+DEFAULT_TAGS = {'learning': 0.4, 'fiction': 0.1, 'papers': 0.05}
+
+
+def parse_tag_distribution(value):
+    """Parse 'learning:0.4,fiction:0.1' into {tag: probability}"""
+    tags = {}
+    for part in value.split(','):
+        if not part.strip():
+            continue
+        name, _, share = part.partition(':')
+        tags[name.strip()] = float(share or 0.5)
+    return tags
+
+
+def _isoformat(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def _parse_iso(value):
+    # An unescaped '+' in the offset arrives as a space
+    return datetime.fromisoformat(value.replace(' ', '+').replace('Z', '+00:00')).timestamp()
+
+
+class FakeArchive:
+    """
+    Generated Readwise archive, newest first
+
+    Documents are serialized once up front; list queries resolve to an
+    offset range in a precomputed (location, category) view, so a page costs
+    the same regardless of archive size.
+    """
+
+    def __init__(self, docs, span_days=365, tags=None, seed=1):
+        rng = random.Random(seed)
+        tags = DEFAULT_TAGS if tags is None else tags
+        now = time.time()
+        step = span_days * 86400 / max(docs, 1)
+
+        self.records = []
+        for i in range(docs):
+            updated_at = now - i * step
+            doc_tags = [tag for tag, share in tags.items() if rng.random() < share]
+            location = 'archive' if rng.random() < 0.7 else rng.choice(LOCATIONS[1:])
+            category = CATEGORIES[i % len(CATEGORIES)]
+            doc = {
+                'id': f'doc{i:07d}',
+                'url': f'https://read.readwise.io/read/doc{i:07d}',
+                'title': f'Benchmark document {i}',
+                'author': 'Fake Author',
+                'source_url': f'https://example.com/articles/{i}',
+                'category': category,
+                'location': location,
+                'tags': {tag: {'name': tag, 'type': 'manual', 'created': 0} for tag in doc_tags},
+                'word_count': rng.randint(200, 5000),
+                'summary': 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 3,
+                'created_at': _isoformat(updated_at - 86400),
+                'updated_at': _isoformat(updated_at),
+                'reading_progress': 1.0 if location == 'archive' else 0.0,
+            }
+            self.records.append((updated_at, location, category, json.dumps(doc).encode()))
+
+        self.views = {}
+        for location in (None,) + LOCATIONS:
+            for category in (None,) + CATEGORIES:
+                view = [r for r in self.records
+                        if (location is None or r[1] == location) and (category is None or r[2] == category)]
+                # Ascending negated timestamps, for bisecting the newest-first order
+                self.views[(location, category)] = ([-r[0] for r in view], [r[3] for r in view])
+
+    def page(self, query, page_size):
+        """Encoded /list/ response for a query dict"""
+        keys, bodies = self.views.get((query.get('location'), query.get('category')), ([], []))
+        end = len(keys)
+        if query.get('updatedAfter'):
+            end = bisect.bisect_left(keys, -_parse_iso(query['updatedAfter']))
+        start = int(query.get('pageCursor') or 0)
+        stop = min(start + page_size, end)
+        next_cursor = f'"{stop}"' if stop < end else 'null'
+        results = b','.join(bodies[start:stop])
+        return (b'{"count":%d,"nextPageCursor":%s,"results":[%s]}'
+                % (end, next_cursor.encode(), results))
+
+
+class Stats:
+    """Thread-safe per-endpoint request and byte counters"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = defaultdict(lambda: {'requests': 0, 'bytes_in': 0, 'bytes_out': 0, 'throttled': 0})
+
+    def record(self, endpoint, bytes_in, bytes_out, throttled=False):
+        with self.lock:
+            entry = self.endpoints[endpoint]
+            entry['requests'] += 1
+            entry['bytes_in'] += bytes_in
+            entry['bytes_out'] += bytes_out
+            entry['throttled'] += int(throttled)
+
+    def snapshot(self):
+        with self.lock:
+            endpoints = {name: dict(entry) for name, entry in self.endpoints.items()}
+        totals = {key: sum(entry[key] for entry in endpoints.values())
+                  for key in ('requests', 'bytes_in', 'bytes_out', 'throttled')}
+        return {'endpoints': endpoints, 'totals': totals}
+
+
+def make_handler(server_state):
+    """Request handler class bound to one FakeServer"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, endpoint, bytes_in=0, headers=None):
+            if not isinstance(body, bytes):
+                body = json.dumps(body).encode()
+            if self.command == 'GET' and status == 200 and endpoint:
+                etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+                headers = dict(headers or {}, ETag=etag)
+                if self.headers.get('If-None-Match') == etag:
+                    status, body = 304, b''
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            if body and server_state.compress and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                body = gzip.compress(body, compresslevel=1)
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+            if endpoint:
+                server_state.stats.record(endpoint, bytes_in, len(body), throttled=status == 429)
+
+        def _delay(self):
+            if server_state.latency:
+                time.sleep(server_state.latency)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            bytes_in = len(self.requestline) + sum(len(k) + len(v) for k, v in self.headers.items())
+
+            if url.path == '/_stats':
+                self._send(200, server_state.stats.snapshot(), None)
+                return
+
+            self._delay()
+            if url.path.endswith('/list/'):
+                if server_state.should_throttle():
+                    self._send(429, b'{"detail":"Request was throttled."}', 'readwise_list', bytes_in,
+                               headers={'Retry-After': str(server_state.retry_after)})
+                    return
+                self._send(200, server_state.archive.page(query, server_state.page_size), 'readwise_list', bytes_in)
+            elif url.path.endswith('/datapoints.json'):
+                goal = url.path.split('/goals/')[1].split('/')[0]
+                datapoints = server_state.datapoints_for(goal)[::-1]
+                if query.get('sort') == 'daystamp':
+                    datapoints.sort(key=lambda dp: dp['daystamp'], reverse=True)
+                if 'page' in query:
+                    per = int(query.get('per', 25))
+                    start = (int(query['page']) - 1) * per
+                    datapoints = datapoints[start:start + per]
+                else:
+                    datapoints = datapoints[:int(query.get('count', 100))]
+                self._send(200, datapoints, 'beeminder_datapoints', bytes_in)
+            elif '/goals/' in url.path:
+                goal = url.path.split('/goals/')[1].split('.json')[0]
+                payload = {'slug': goal, 'title': goal, 'timezone': 'UTC', 'deadline': 0, 'aggday': 'sum',
+                           'kyoom': True, 'rate': 5, 'runits': 'w', 'safebuf': 3,
+                           'graph_url': 'https://example.com/' + 'x' * 2000}
+                if query.get('datapoints') == 'true':
+                    count = int(query.get('datapoints_count', 1000))
+                    payload['datapoints'] = server_state.datapoints_for(goal)[-count:]
+                self._send(200, payload, 'beeminder_goal', bytes_in)
+            else:
+                self._send(404, {'error': 'not found'}, 'other', bytes_in)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            length = int(self.headers.get('Content-Length', 0))
+            body = self.rfile.read(length).decode()
+            bytes_in = len(self.requestline) + length
+
+            if url.path == '/_reset':
+                server_state.reset()
+                self._send(200, {'ok': True}, None)
+                return
+
+            self._delay()
+            form = {key: values[0] for key, values in parse_qs(body).items()}
+            goal = url.path.split('/goals/')[1].split('/')[0] if '/goals/' in url.path else None
+            if goal and url.path.endswith('/create_all.json'):
+                created = [server_state.add_datapoint(goal, dp) for dp in json.loads(form.get('datapoints', '[]'))]
+                self._send(200, created, 'beeminder_create_all', bytes_in)
+            elif goal and url.path.endswith('/datapoints.json'):
+                datapoint = server_state.add_datapoint(goal, {
+                    'value': float(form.get('value', 0)),
+                    'comment': form.get('comment', ''),
+                    'timestamp': int(form.get('timestamp') or time.time()),
+                    'requestid': form.get('requestid'),
+                })
+                self._send(200, datapoint, 'beeminder_post', bytes_in)
+            else:
+                self._send(404, {'error': 'not found'}, 'other', bytes_in)
+
+        def do_DELETE(self):
+            url = urlparse(self.path)
+            bytes_in = len(self.requestline)
+            self._delay()
+            if '/goals/' in url.path and '/datapoints/' in url.path:
+                goal = url.path.split('/goals/')[1].split('/')[0]
+                datapoint_id = url.path.rsplit('/', 1)[1].split('.json')[0]
+                deleted = server_state.delete_datapoint(goal, datapoint_id)
+                if deleted:
+                    self._send(200, deleted, 'beeminder_delete', bytes_in)
+                    return
+            self._send(404, {'error': 'not found'}, 'other', bytes_in)
+
+    return Handler
+
+
+class FakeServer:
+    """
+    Fake Readwise + Beeminder server running on a background thread
+
+    Args:
+        archive: FakeArchive to serve
+        port: Port to bind on 127.0.0.1 (0 picks a free one)
+        page_size: Documents per /list/ page (Readwise uses 100)
+        latency: Seconds added to every API request
+        throttle_rate: Fraction of /list/ requests answered with 429
+        retry_after: Retry-After seconds sent with injected 429s
+        compress: Gzip responses for clients that accept it (as the real APIs do)
+    """
+
+    def __init__(self, archive, port=0, page_size=100, latency=0.0, throttle_rate=0.0, retry_after=1,
+                 compress=True, seed=1):
+        self.archive = archive
+        self.compress = compress
+        self.page_size = page_size
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.stats = Stats()
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.datapoints = defaultdict(list)
+        self.next_datapoint_id = 0
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), make_handler(self))
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def should_throttle(self):
+        with self.lock:
+            return self.throttle_rate > 0 and self.rng.random() < self.throttle_rate
+
+    def datapoints_for(self, goal):
+        with self.lock:
+            return list(self.datapoints[goal])
+
+    def add_datapoint(self, goal, datapoint):
+        """Store a datapoint, updating an existing one with the same requestid"""
+        with self.lock:
+            points = self.datapoints[goal]
+            requestid = datapoint.get('requestid')
+            for existing in points:
+                if requestid and existing.get('requestid') == requestid:
+                    existing.update(datapoint)
+                    return existing
+            stored = dict(datapoint, id=f'dp{self.next_datapoint_id}')
+            self.next_datapoint_id += 1
+            if stored.get('daystamp') and not stored.get('timestamp'):
+                # Noon UTC of the day, as Beeminder does for daystamp-only datapoints
+                stored['timestamp'] = int(datetime.strptime(str(stored['daystamp']), '%Y%m%d')
+                                          .replace(hour=12, tzinfo=timezone.utc).timestamp())
+            stored.setdefault('timestamp', int(time.time()))
+            stored.setdefault('daystamp', datetime.fromtimestamp(stored['timestamp'], timezone.utc).strftime('%Y%m%d'))
+            points.append(stored)
+            return stored
+
+    def delete_datapoint(self, goal, datapoint_id):
+        """Remove a datapoint by id (None if there is none)"""
+        with self.lock:
+            points = self.datapoints[goal]
+            for index, existing in enumerate(points):
+                if existing['id'] == datapoint_id:
+                    return points.pop(index)
+            return None
+
+    def reset(self):
+        """Clear counters and stored datapoints"""
+        self.stats.reset()
+        with self.lock:
+            self.datapoints.clear()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def add_server_arguments(parser):
+    """Archive and server options shared by the standalone server and the runner"""
+    parser.add_argument('--docs', type=int, default=10000, help='Documents in the fake archive (default: 10000)')
+    parser.add_argument('--span-days', type=int, default=365,
+                        help='Days the archive is spread over (default: 365)')
+    parser.add_argument('--page-size', type=int, default=100, help='Documents per /list/ page (default: 100)')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Latency added to every request (default: 0)')
+    parser.add_argument('--throttle-rate', type=float, default=0,
+                        help='Fraction of list requests answered with 429 (default: 0)')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds for injected 429s')
+    parser.add_argument('--tags', type=str, default=','.join(f'{t}:{p}' for t, p in DEFAULT_TAGS.items()),
+                        help='Tag distribution as tag:probability pairs (default: %(default)s)')
+    parser.add_argument('--no-gzip', action='store_true', help='Send uncompressed responses')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+
+
+def server_from_arguments(args, port=0):
+    """Build a FakeServer from parsed add_server_arguments options"""
+    archive = FakeArchive(args.docs, span_days=args.span_days, tags=parse_tag_distribution(args.tags),
+                          seed=args.seed)
+    return FakeServer(archive, port=port, page_size=args.page_size, latency=args.latency_ms / 1000.0,
+                      throttle_rate=args.throttle_rate, retry_after=args.retry_after,
+                      compress=not args.no_gzip, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Readwise/Beeminder API server for benchmarks')
+    add_server_arguments(parser)
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on (default: 8765)')
+    args = parser.parse_args()
+
+    server = server_from_arguments(args, port=args.port)
+    print(f"Serving {args.docs} documents on {server.url}")
+    print(f"  export READWISE_API_BASE={server.url}/api/v3")
+    print(f"  export BEEMINDER_API_BASE={server.url}/api/v1")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
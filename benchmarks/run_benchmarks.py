@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark runner
+Starts the fake Readwise/Beeminder server, runs each sync mode of both scripts
+against it in a fresh HOME, and reports wall time, request count, bytes
+transferred and peak RSS per mode.
+
+Usage:
+    python benchmarks/run_benchmarks.py --docs 50000
+    python benchmarks/run_benchmarks.py --docs 200000 --latency-ms 50 --modes simple-index,simple-no-index
+    python benchmarks/run_benchmarks.py --throttle-rate 0.05 --json results.json
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fake_server import add_server_arguments, server_from_arguments
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Pacing is lifted so runs measure the client, not the documented 20/minute budget
+BENCHMARK_RATE_PER_MINUTE = 1000000
+
+# (name, script, arguments, HOME: 'fresh' or the name of the mode whose HOME is reused)
+MODES = [
+    ('sync-index-cold', 'readwise_beeminder.py', [], 'fresh'),
+    ('sync-index-warm', 'readwise_beeminder.py', ['--hours', '24'], 'sync-index-cold'),
+    ('sync-no-index', 'readwise_beeminder.py', ['--no-index'], 'fresh'),
+    ('sync-full-scan', 'readwise_beeminder.py', ['--no-index', '--full-scan'], 'fresh'),
+    ('sync-categories', 'readwise_beeminder.py', ['--no-index', '--full-scan', '--categories', 'article,video,pdf'],
+     'fresh'),
+    ('simple-index', 'readwise_beeminder_simple.py', [], 'fresh'),
+    ('simple-no-index', 'readwise_beeminder_simple.py', ['--no-index'], 'fresh'),
+    ('simple-async', 'readwise_beeminder_simple.py', ['--no-index', '--async'], 'fresh'),
+]
+
+
+def peak_rss_mb(rusage):
+    """ru_maxrss in megabytes (kilobytes on Linux, bytes on macOS)"""
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return rusage.ru_maxrss / divisor
+
+
+def run_mode(server, script, arguments, home, log_path):
+    """
+    Run one script invocation against the fake server
+
+    Returns:
+        Result dict (wall seconds, exit code, requests, bytes, throttled, peak RSS)
+    """
+    env = dict(os.environ,
+               HOME=str(home),
+               READWISE_TOKEN='benchmark',
+               BEEMINDER_TOKEN='benchmark',
+               READWISE_API_BASE=f"{server.url}/api/v3",
+               BEEMINDER_API_BASE=f"{server.url}/api/v1",
+               READWISE_LIST_RATE_PER_MINUTE=str(BENCHMARK_RATE_PER_MINUTE))
+
+    server.reset()
+    with open(log_path, 'w') as log:
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, str(REPO_ROOT / script)] + arguments,
+                                   cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+        _, status, rusage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - start
+    # wait4 reaps the child itself so its rusage (peak RSS) is reported per mode
+    process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+
+    totals = server.stats.snapshot()['totals']
+    return {
+        'wall_seconds': round(wall, 3),
+        'exit_code': process.returncode,
+        'requests': totals['requests'],
+        'throttled': totals['throttled'],
+        'bytes_received': totals['bytes_out'],
+        'bytes_sent': totals['bytes_in'],
+        'peak_rss_mb': round(peak_rss_mb(rusage), 1),
+    }
+
+
+def print_table(results):
+    """Print results as an aligned table"""
+    header = f"{'mode':<18} {'wall (s)':>9} {'requests':>9} {'429s':>6} {'MB recv':>9} {'KB sent':>9} {'RSS (MB)':>9}"
+    print(header)
+    print('-' * len(header))
+    for name, result in results.items():
+        if result.get('skipped'):
+            print(f"{name:<18} skipped: {result['skipped']}")
+            continue
+        line = (f"{name:<18} {result['wall_seconds']:>9.2f} {result['requests']:>9} {result['throttled']:>6} "
+                f"{result['bytes_received'] / 1e6:>9.2f} {result['bytes_sent'] / 1e3:>9.1f} "
+                f"{result['peak_rss_mb']:>9.1f}")
+        if result['exit_code'] != 0:
+            line += f"  FAILED (exit {result['exit_code']})"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the sync scripts against a local fake API server')
+    add_server_arguments(parser)
+    parser.add_argument('--modes', type=str,
+                        help=f'Comma-separated modes to run (default: all; choices: {", ".join(m[0] for m in MODES)})')
+    parser.add_argument('--json', type=str, metavar='FILE', help='Also write results as JSON to FILE')
+    parser.add_argument('--keep-home', action='store_true', help='Keep the per-mode HOME directories and logs')
+    args = parser.parse_args()
+
+    modes = MODES
+    if args.modes:
+        selected = [m.strip() for m in args.modes.split(',') if m.strip()]
+        unknown = [m for m in selected if m not in {mode[0] for mode in MODES}]
+        if unknown:
+            print(f"Error: Unknown modes: {', '.join(unknown)}")
+            sys.exit(1)
+        modes = [mode for mode in MODES if mode[0] in selected]
+
+    print(f"Generating {args.docs} documents...")
+    server = server_from_arguments(args).start()
+    print(f"Fake API server on {server.url} (page size {args.page_size}, latency {args.latency_ms:g}ms, "
+          f"429 rate {args.throttle_rate:g})\n")
+
+    workdir = Path(tempfile.mkdtemp(prefix='readwise-bench-'))
+    homes = {}
+    results = {}
+    try:
+        for name, script, arguments, home_from in modes:
+            if name == 'simple-async' and importlib.util.find_spec('aiohttp') is None:
+                results[name] = {'skipped': 'aiohttp not installed'}
+                continue
+            if home_from == 'fresh' or home_from not in homes:
+                home = workdir / name
+                home.mkdir()
+            else:
+                home = homes[home_from]
+            homes[name] = home
+
+            print(f"Running {name}...")
+            results[name] = run_mode(server, script, arguments, home, workdir / f"{name}.log")
+            if results[name]['exit_code'] != 0:
+                print(f"  {name} failed, see {workdir / f'{name}.log'}")
+                args.keep_home = True
+    finally:
+        server.stop()
+
+    print()
+    print_table(results)
+
+    if args.json:
+        report = {'config': {key: value for key, value in vars(args).items() if key not in ('json', 'keep_home')},
+                  'results': results}
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Results written to {args.json}")
+
+    if args.keep_home:
+        print(f"\nLogs and HOME directories kept in {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
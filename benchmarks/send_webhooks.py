@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Send generated Readwise Reader webhook events to a local `serve` daemon
+Each generated document is created, tagged and moved to the archive; a share
+of them are then moved back out or lose their tags, exercising the daemon's
+count adjustments. Pair with fake_server.py for the reconciliation syncs and
+Beeminder posts.
+
+Usage:
+    python benchmarks/fake_server.py --docs 1000 --port 8765 &
+    READWISE_API_BASE=http://127.0.0.1:8765/api/v3 BEEMINDER_API_BASE=http://127.0.0.1:8765/api/v1 \\
+        ./readwise_beeminder.py serve --debounce 5 &
+    python benchmarks/send_webhooks.py --count 50
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+
+from fake_server import DEFAULT_TAGS, parse_tag_distribution
+
+
+def webhook_event(doc_id, event_type, location, tags, category='article', secret=None):
+    """A Reader webhook body: the document's fields plus event_type (and secret)"""
+    event = {
+        'id': doc_id,
+        'event_type': event_type,
+        'title': f'Webhook document {doc_id}',
+        'source_url': f'https://example.com/webhook/{doc_id}',
+        'category': category,
+        'location': location,
+        'tags': {tag: {'name': tag, 'type': 'manual', 'created': 0} for tag in tags},
+        'updated_at': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+    }
+    if secret:
+        event['secret'] = secret
+    return event
+
+
+def generate_events(count, tags, unarchive_rate=0.1, untag_rate=0.1, seed=1, secret=None, prefix='webhook'):
+    """
+    Events for count documents, in send order
+
+    Returns:
+        (events, expected) where expected maps tag -> documents archived with it at the end
+    """
+    rng = random.Random(seed)
+    events = []
+    expected = {tag: 0 for tag in tags}
+    for i in range(count):
+        doc_id = f'{prefix}{i:06d}'
+        doc_tags = [tag for tag, share in tags.items() if rng.random() < share]
+        events.append(webhook_event(doc_id, 'reader.any_document.created', 'new', [], secret=secret))
+        events.append(webhook_event(doc_id, 'reader.document.tags_updated', 'new', doc_tags, secret=secret))
+        events.append(webhook_event(doc_id, 'reader.document.moved_to_archive', 'archive', doc_tags, secret=secret))
+        if rng.random() < unarchive_rate:
+            events.append(webhook_event(doc_id, 'reader.document.moved_to_later', 'later', doc_tags, secret=secret))
+            continue
+        if doc_tags and rng.random() < untag_rate:
+            doc_tags = doc_tags[1:]
+            events.append(webhook_event(doc_id, 'reader.document.tags_updated', 'archive', doc_tags, secret=secret))
+        for tag in doc_tags:
+            expected[tag] += 1
+    return events, expected
+
+
+def send(url, event):
+    """POST one event; returns the HTTP status"""
+    request = urllib.request.Request(url, data=json.dumps(event).encode(),
+                                     headers={'Content-Type': 'application/json'}, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Send generated Readwise webhook events to a serve daemon')
+    parser.add_argument('--url', type=str, default='http://127.0.0.1:8787/webhook', help='Webhook URL')
+    parser.add_argument('--count', type=int, default=20, help='Documents to generate (default: 20)')
+    parser.add_argument('--tags', type=parse_tag_distribution,
+                        default=DEFAULT_TAGS, help='Tag distribution, e.g. learning:0.4,fiction:0.1')
+    parser.add_argument('--unarchive-rate', type=float, default=0.1, help='Share moved back out of the archive')
+    parser.add_argument('--untag-rate', type=float, default=0.1, help='Share losing a tag after archiving')
+    parser.add_argument('--secret', type=str, help='Webhook secret to include (READWISE_WEBHOOK_SECRET)')
+    parser.add_argument('--prefix', type=str, default='webhook', help='Document id prefix (vary it between runs)')
+    parser.add_argument('--interval-ms', type=float, default=0, help='Delay between events')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    events, expected = generate_events(args.count, args.tags, args.unarchive_rate, args.untag_rate, args.seed,
+                                       args.secret, args.prefix)
+    failed = 0
+    for event in events:
+        status = send(args.url, event)
+        if status != 202:
+            failed += 1
+        if args.interval_ms:
+            time.sleep(args.interval_ms / 1000)
+
+    print(f"Sent {len(events)} events for {args.count} documents ({failed} rejected)")
+    print("Expected archived documents per tag:")
+    for tag, count in expected.items():
+        print(f"  {tag}: {count}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
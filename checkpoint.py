@@ -0,0 +1,97 @@
+"""
+Resumable pagination checkpoints
+Saves the pagination cursor plus the progress accumulated so far after every
+page, so a run that dies halfway through the archive resumes from the last
+page instead of starting over. Checkpoints live in the state store
+(state_store.py) next to the per-goal sync state.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+
+from state_store import (
+    STATE_DB, clear_checkpoint, clear_checkpoints, load_checkpoint, prune_checkpoints, save_checkpoint,
+)
+
+# Cursors older than this are discarded and the scan restarts from page one
+CHECKPOINT_MAX_AGE_SECONDS = 60 * 60
+
+# Matches of the display sample saved with a checkpoint (saves stay the same size however long the scan runs)
+CHECKPOINT_SAMPLE_SIZE = 20
+
+
+class ScanCheckpoint:
+    """
+    Checkpoint for one scan, identified by a key describing its query (stored in the state store)
+
+    The key should only hold values that stay the same from run to run, so a
+    rerun finds its checkpoint, including the account (see account_key). window is saved alongside for a value that may
+    move (the scan's since timestamp): a checkpoint saved for another window
+    is discarded instead of resumed.
+    """
+
+    def __init__(self, key, window=None, path=STATE_DB, max_age=CHECKPOINT_MAX_AGE_SECONDS):
+        self.key = key
+        self.window = window
+        self.path = path
+        self.max_age = max_age
+
+    def load(self):
+        """
+        Load the saved cursor and progress
+
+        Returns:
+            (cursor, progress dict), or (None, None) if there is no fresh checkpoint
+        """
+        try:
+            # Checkpoints of scans that never finished (or of keys no longer used) go once they're stale;
+            # this scan's own is checked below, so a stale one is reported before it's discarded
+            prune_checkpoints(time.time() - self.max_age, keep=self.key, path=self.path)
+            entry = load_checkpoint(self.key, self.path)
+        except sqlite3.Error as e:
+            print(f"Warning: Could not load checkpoint: {e}")
+            return None, None
+        if not entry:
+            return None, None
+        cursor, progress, saved_at = entry
+        age = time.time() - saved_at
+        if age > self.max_age:
+            print(f"Checkpoint is {age / 60:.0f} minutes old - restarting scan from the first page")
+            self.clear()
+            return None, None
+        if progress.pop('window', None) != self.window:
+            print("Checkpoint is for a different time window - restarting scan from the first page")
+            self.clear()
+            return None, None
+        return cursor, progress
+
+    def save(self, cursor, progress):
+        """Save the cursor of the next page and the progress accumulated so far"""
+        try:
+            save_checkpoint(self.key, cursor, dict(progress, window=self.window), self.path)
+        except Exception as e:
+            print(f"Warning: Could not save checkpoint: {e}")
+
+    def clear(self):
+        """Remove the checkpoint (scan finished or restarted)"""
+        try:
+            clear_checkpoint(self.key, self.path)
+        except Exception as e:
+            print(f"Warning: Could not clear checkpoint: {e}")
+
+
+def scan_key(*parts):
+    """Build a checkpoint key from the values that define a scan"""
+    return json.dumps(parts, sort_keys=True, default=str)
+
+
+def account_key(token):
+    """Short hash of an API token for checkpoint keys, so accounts never resume each other's scans"""
+    return hashlib.sha256((token or '').encode()).hexdigest()[:16]
+
+
+def clear_scans(*parts, path=STATE_DB):
+    """Remove the checkpoints of every scan whose key starts with parts (see scan_key)"""
+    clear_checkpoints(scan_key(*parts)[:-1] + ', ', path)
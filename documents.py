@@ -0,0 +1,134 @@
+"""
+Compact document records
+Readwise /list/ results carry summaries, image URLs, notes and more, but the
+sync only looks at id, updated_at, location, category and tags (plus title and
+source URL for the handful of documents it displays). Pages are projected onto
+DocumentRecord as they arrive so filters work on plain attributes and integer
+tag ids instead of the raw API dicts.
+"""
+
+import math
+import sys
+import threading
+from datetime import datetime
+
+# Keys of a /list/ result the sync reads; streamed pages keep only these (see list_decoder.py)
+LIST_FIELDS = ('id', 'updated_at', 'location', 'category', 'tags', 'title', 'source_url')
+
+
+def parse_timestamp(value):
+    """Parse a Readwise ISO timestamp into a Unix timestamp (None if missing or invalid)"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def tag_names(item):
+    """Return the tag names of a document (tags may be a dict, a list of dicts or strings)"""
+    tags = item.get('tags') or []
+    if isinstance(tags, dict):
+        # Reader returns tags as {key: {name: ...}}
+        return [tag.get('name', key) if isinstance(tag, dict) else key for key, tag in tags.items()]
+    return [tag.get('name', tag) if isinstance(tag, dict) else tag for tag in tags]
+
+
+class TagTable:
+    """Interns tag names as small integer ids (safe to share between the category fetch threads)"""
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+        self.lock = threading.Lock()
+
+    def intern(self, name):
+        """Id for a tag name, assigning the next id on first sight"""
+        tag_id = self.ids.get(name)
+        if tag_id is None:
+            # Known names skip the lock; a new one is assigned under it so two threads can't share an id
+            with self.lock:
+                tag_id = self.ids.get(name)
+                if tag_id is None:
+                    self.names.append(name)
+                    tag_id = self.ids[name] = len(self.names) - 1
+        return tag_id
+
+    def name(self, tag_id):
+        """Tag name for an id"""
+        return self.names[tag_id]
+
+
+# Process-wide tag table shared by every record and predicate
+TAGS = TagTable()
+
+_NO_TAGS = ()
+
+
+class DocumentRecord:
+    """
+    The fields of a Readwise document the sync uses
+
+    updated_at is a whole-second Unix timestamp, rounded up so that
+    `updated_at > cutoff` against the whole-second cutoffs used here gives the
+    same answer as the exact timestamp. title and source_url are only set for
+    records kept for display (None otherwise).
+    """
+
+    __slots__ = ('id', 'updated_at', 'location', 'category', 'tag_ids', 'title', 'source_url')
+
+    def __init__(self, doc_id, updated_at, location, category, tag_ids, title=None, source_url=None):
+        self.id = doc_id
+        self.updated_at = updated_at
+        self.location = location
+        self.category = category
+        self.tag_ids = tag_ids
+        self.title = title
+        self.source_url = source_url
+
+    def tag_names(self, tags=TAGS):
+        """Names of the record's tags"""
+        return [tags.name(tag_id) for tag_id in self.tag_ids]
+
+    def __repr__(self):
+        return f"DocumentRecord(id={self.id!r}, updated_at={self.updated_at}, category={self.category!r})"
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def compact_record(item, details=False, tags=TAGS):
+    """
+    Project a raw API document onto a DocumentRecord
+
+    Args:
+        item: Document dict from /list/
+        details: Also keep title and source_url (for displayed documents)
+        tags: TagTable to intern tag names in
+    """
+    updated_at = parse_timestamp(item.get('updated_at'))
+    names = tag_names(item)
+    record = DocumentRecord(
+        item.get('id'),
+        math.ceil(updated_at) if updated_at is not None else None,
+        _intern(item.get('location')),
+        _intern(item.get('category')),
+        tuple(tags.intern(name) for name in names) if names else _NO_TAGS,
+    )
+    if details:
+        add_details(record, item)
+    return record
+
+
+def compact_page(page, tags=TAGS):
+    """Project a page of raw documents onto DocumentRecords (without display fields)"""
+    return [compact_record(item, tags=tags) for item in page]
+
+
+def add_details(record, item):
+    """Copy the display fields (title, source_url) from the raw document onto its record"""
+    record.title = item.get('title') or 'Untitled'
+    record.source_url = item.get('source_url') or 'No URL'
+    return record
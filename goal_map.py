@@ -0,0 +1,147 @@
+"""
+Tag/category/location -> Beeminder goal mapping
+Lets one pass over Readwise feed any number of Beeminder goals instead of one
+full archive scan per goal.
+
+Config file format (JSON):
+    {
+      "goals": [
+        {"goal": "learning", "tag": "learning"},
+        {"goal": "videos", "category": "video"},
+        {"goal": "papers", "tag": "papers", "category": "pdf"}
+      ]
+    }
+
+Each rule may set `tag` (a tag name or expression such as "learning,-fiction",
+see tag_index.py), `category` and `location` (default: archive); a document
+counts towards a goal when it matches every predicate the rule sets. A goal
+with several rules counts the documents matching any of them, each once.
+"""
+
+import json
+
+from tag_index import TagIndex, parse_tag_filter
+
+
+class GoalRule:
+    """Predicates selecting the documents counted towards one Beeminder goal"""
+
+    def __init__(self, goal, tag=None, category=None, location='archive'):
+        self.goal = goal
+        self.tag = tag
+        self.category = category
+        self.location = location
+        self.expression = parse_tag_filter(tag)
+
+    def matches(self, record):
+        """Check a documents.DocumentRecord against the rule"""
+        if self.location and record.location is not None and record.location != self.location:
+            return False
+        if self.category and record.category != self.category:
+            return False
+        if self.expression is not None and not self.expression.matches(record):
+            return False
+        return True
+
+    def bitmap(self, index):
+        """Bitmap of the documents in a tag_index.TagIndex that match the rule"""
+        bitmap = index.all
+        if self.location:
+            # Documents without a location match, as in matches()
+            bitmap &= index.bitmap(('location', self.location)) | index.bitmap(('location', None))
+        if self.category:
+            bitmap &= index.bitmap(('category', self.category))
+        if self.expression is not None:
+            bitmap &= index.expression_bitmap(self.expression)
+        return bitmap
+
+    def describe(self):
+        """Human-readable summary of the rule's predicates"""
+        parts = []
+        if self.tag:
+            parts.append(f"tag: {self.tag}")
+        if self.category:
+            parts.append(f"category: {self.category}")
+        if self.location and self.location != 'archive':
+            parts.append(f"location: {self.location}")
+        return ', '.join(parts) or 'all archived items'
+
+
+def load_goal_rules(path):
+    """
+    Load goal rules from a JSON config file
+
+    Returns:
+        List of GoalRule
+
+    Raises:
+        ValueError: If the file is malformed or a rule has no goal
+    """
+    with open(path, 'r') as f:
+        config = json.load(f)
+
+    entries = config.get('goals', []) if isinstance(config, dict) else config
+    if not entries:
+        raise ValueError(f"No goals defined in {path}")
+
+    rules = []
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get('goal'):
+            raise ValueError(f"Each goal rule needs a 'goal' slug: {entry!r}")
+        rules.append(GoalRule(
+            entry['goal'],
+            tag=entry.get('tag'),
+            category=entry.get('category'),
+            location=entry.get('location', 'archive'),
+        ))
+    return rules
+
+
+def shared_list_params(rules):
+    """
+    /list/ query parameters every rule agrees on
+
+    When all rules use the same location (or category) it is pushed to the
+    server; otherwise the single pass fetches the union and rules filter locally.
+    """
+    params = {}
+    locations = {rule.location for rule in rules}
+    if len(locations) == 1 and None not in locations:
+        params['location'] = locations.pop()
+    categories = {rule.category for rule in rules}
+    if len(categories) == 1 and None not in categories:
+        params['category'] = categories.pop()
+    return params
+
+
+def rules_by_goal(rules):
+    """Dict of goal slug -> its rules, in the order goals first appear"""
+    goals = {}
+    for rule in rules:
+        goals.setdefault(rule.goal, []).append(rule)
+    return goals
+
+
+def matching_goals(rules, record):
+    """Goal slugs with at least one rule matching a documents.DocumentRecord (each goal once)"""
+    return {rule.goal for rule in rules if rule.matches(record)}
+
+
+def count_by_goal(documents, rules):
+    """
+    Count document records for every goal in a single pass
+
+    The records are indexed once (tag/category/location -> positions) and every
+    rule is answered from the index, so adding goals doesn't add per-document work.
+
+    Returns:
+        Dict of goal slug -> count (a goal's rules are ORed, so each document counts once)
+    """
+    index = TagIndex().add_all(documents)
+    counts = {}
+    for goal, goal_rules in rules_by_goal(rules).items():
+        bitmap = 0
+        for rule in goal_rules:
+            bitmap |= rule.bitmap(index)
+        counts[goal] = index.count(bitmap)
+    return counts
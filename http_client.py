@@ -0,0 +1,221 @@
+"""
+Shared HTTP client for Readwise and Beeminder API calls
+One pooled keep-alive session per process, with compressed responses, default
+timeouts, rate limiting/retries, conditional-request caching of GETs
+(response_cache.py) and the common headers/auth helpers in a single place.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import endpoint_name, get_metrics, write_metrics
+from rate_limit import RequestScheduler, default_limits
+from response_cache import cache_key, cacheable_request, default_cache
+
+# (connect, read) timeouts in seconds - bare requests calls have none
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+
+# Connections kept alive per host (Readwise and Beeminder each get their own pool)
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 10
+
+USER_AGENT = "readwise-beeminder/1.1"
+
+DEFAULT_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Accept': 'application/json',
+    'Accept-Encoding': 'gzip, deflate',
+}
+
+
+class HttpClient:
+    """
+    Pooled requests session with default timeouts, headers, pacing and retries
+
+    GETs go through the response cache (cache=None turns it off): stored
+    responses are revalidated with a conditional request and a 304 is answered
+    with the stored body. Other methods drop the cached resources they change.
+    """
+
+    _DEFAULT = object()
+
+    def __init__(self, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), pool_maxsize=POOL_MAXSIZE, scheduler=None,
+                 metrics=None, cache=_DEFAULT):
+        self.timeout = timeout
+        self.scheduler = scheduler or RequestScheduler(default_limits())
+        self.metrics = metrics or get_metrics()
+        self.cache = default_cache() if cache is HttpClient._DEFAULT else cache
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, rate_key=None, **kwargs):
+        """
+        Send a request through the pooled session (default timeout applied)
+
+        rate_key names the scheduler token bucket to pace the request with;
+        429/5xx responses are retried per the scheduler's policy. A GET answered
+        from the cache returns a 200 replaying the stored body (from_cache set).
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        endpoint = endpoint_name(url)
+        streamed = kwargs.get('stream', False)
+        cache = self.cache if method == 'GET' and cacheable_request(kwargs.get('params')) else None
+        entry = key = None
+        if cache is not None:
+            key = cache_key(url, kwargs.get('params'), kwargs.get('headers'))
+            entry = cache.lookup(key)
+            if entry is not None and entry.is_fresh(cache.ttl):
+                cache.record_fresh(entry)
+                return entry.to_response(url)
+            if entry is not None:
+                kwargs['headers'] = dict(kwargs.get('headers') or {}, **entry.conditional_headers())
+
+        def send():
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException:
+                self.metrics.record_request(endpoint, method, None, time.perf_counter() - started)
+                raise
+            if streamed and response.status_code == 200:
+                # The caller reads the body; stream() records the attempt once it has
+                response.started = started
+                return response
+            if streamed:
+                response.content  # Error bodies are small; read them so their size is known
+            self.metrics.record_request(endpoint, method, response.status_code, time.perf_counter() - started,
+                                        response_size(response))
+            return response
+
+        response = self.scheduler.send(method, send, rate_key=rate_key)
+
+        if cache is None:
+            if method not in ('GET', 'HEAD') and self.cache is not None:
+                self.cache.invalidate(url)
+            return response
+        if entry is not None and response.status_code == 304:
+            cache.record_revalidated(entry, response.headers)
+            response.close()
+            return entry.to_response(url)
+        cache.record_miss()
+        if response.status_code == 200 and cache.wants(response.headers):
+            if streamed:
+                _tee_body(response, key, cache.max_entry_bytes)
+            else:
+                cache.store(key, url, response.headers, response.content)
+        return response
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        """GET url through the pooled session"""
+        return self.request('GET', url, params=params, headers=headers, **kwargs)
+
+    @contextmanager
+    def stream(self, url, params=None, headers=None, **kwargs):
+        """
+        GET url without reading the body up front; yields the response for the caller to iterate
+
+        A successful response is recorded in the metrics when the block exits,
+        with the time and bytes of the whole body, and its connection is released.
+        A body read to the end is stored in the cache if it is cacheable.
+        """
+        response = self.request('GET', url, params=params, headers=headers, stream=True, **kwargs)
+        try:
+            yield response
+            body = getattr(response, 'cache_body', None)
+            if body is not None and response.cache_complete:
+                self.cache.store(response.cache_key, url, response.headers, b''.join(body))
+        finally:
+            if getattr(response, 'started', None) is not None:
+                self.metrics.record_request(endpoint_name(url), 'GET', response.status_code,
+                                            time.perf_counter() - response.started, response_size(response))
+            response.close()
+
+    def post(self, url, data=None, headers=None, **kwargs):
+        """POST url through the pooled session"""
+        return self.request('POST', url, data=data, headers=headers, **kwargs)
+
+    def close(self):
+        """Close pooled connections"""
+        self.session.close()
+
+
+def _tee_body(response, key, limit):
+    """Keep the chunks a streamed response yields (up to limit bytes) so stream() can cache the body"""
+    iter_content = response.iter_content
+    response.cache_key = key
+    response.cache_body = []
+    response.cache_complete = False
+
+    def tee(chunk_size=1, decode_unicode=False):
+        size = 0
+        for chunk in iter_content(chunk_size, decode_unicode):
+            if response.cache_body is not None:
+                size += len(chunk)
+                if size > limit or not isinstance(chunk, bytes):
+                    response.cache_body = None
+                else:
+                    response.cache_body.append(chunk)
+            yield chunk
+        response.cache_complete = True
+
+    response.iter_content = tee
+
+
+def response_size(response):
+    """Bytes read off the wire for a response (compressed size when gzip was used)"""
+    try:
+        return response.raw.tell()
+    except Exception:
+        return len(response.content)
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide shared client (created on first use)"""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = HttpClient()
+        return _shared_client
+
+
+def print_http_summary():
+    """Print request/retry/throttle counters when the run hit rate limits or retries, and the cache hit ratio"""
+    scheduler = get_client().scheduler
+    cache = get_client().cache
+    lines = []
+    if scheduler.stats['retries'] or scheduler.stats['throttled_seconds'] >= 1:
+        lines.append(f"HTTP: {scheduler.summary()}")
+    if cache is not None and cache.lookups:
+        lines.append(f"HTTP cache: {cache.summary()}")
+    if lines:
+        print('\n' + '\n'.join(lines))
+
+
+def write_run_metrics(args):
+    """Write the run's metrics summary (--metrics) and Prometheus textfile (--prometheus) if requested"""
+    if args.metrics or args.prometheus:
+        write_metrics(args.metrics, args.prometheus, scheduler=get_client().scheduler, cache=get_client().cache)
+
+
+def readwise_headers(token):
+    """Authorization headers for the Readwise API"""
+    return {'Authorization': f'Token {token}'}
+
+
+def beeminder_params(auth_token, params=None):
+    """Query/form parameters for the Beeminder API with auth_token added"""
+    merged = dict(params or {})
+    merged['auth_token'] = auth_token
+    return merged
@@ -0,0 +1,225 @@
+"""
+Incremental /list/ page decoding
+Decodes a Readwise /list/ response body as it streams in: each element of
+`results` is decoded on its own (with json's C scanner) and projected onto the
+fields the sync reads (documents.LIST_FIELDS) before the next one, so large
+fields like summaries and HTML content are never held for a whole page at
+once. The other top-level keys (`nextPageCursor`, `count`) are small and
+picked up wherever they appear in the body.
+"""
+
+import codecs
+import json
+import re
+from json.scanner import make_scanner
+
+from documents import LIST_FIELDS
+
+_WHITESPACE = ' \t\n\r'
+
+# Separator after an element of `results` (and the whitespace before the next one)
+_ITEM_END = re.compile(r'[ \t\n\r]*([,\]])[ \t\n\r]*')
+
+
+class ListPageDecoder:
+    """
+    Push decoder for one /list/ response body
+
+    Feed it text or bytes chunks in order; each feed() returns the documents
+    completed by that chunk, and close() checks that the body was complete.
+
+    Args:
+        fields: Document keys to keep (None keeps whole documents)
+    """
+
+    def __init__(self, fields=LIST_FIELDS):
+        self.fields = fields
+        self.values = {}
+        self.count = 0
+        self._decoder = json.JSONDecoder()
+        self._scan_once = make_scanner(self._decoder)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._state = 'start'
+        self._key = None
+
+    @property
+    def next_page_cursor(self):
+        return self.values.get('nextPageCursor')
+
+    def feed(self, chunk, final=False):
+        """
+        Decode as much of the body as the chunks so far allow
+
+        Returns:
+            List of (projected) documents completed by this chunk
+        """
+        if isinstance(chunk, bytes):
+            chunk = self._utf8.decode(chunk, final)
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        documents = []
+        while self._step(documents, final):
+            pass
+        return documents
+
+    def close(self):
+        """
+        Finish the body
+
+        Raises:
+            ValueError: If the body was not a complete /list/ object
+        """
+        documents = self.feed(b'', final=True)
+        if self._state != 'done' or self._buffer[self._pos:].strip(_WHITESPACE):
+            raise ValueError(f"Incomplete or invalid /list/ response (stopped in state {self._state!r})")
+        return documents
+
+    def _skip(self):
+        """Index of the next non-whitespace character (None if the buffer ends first)"""
+        buffer = self._buffer
+        pos = self._pos
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        self._pos = pos
+        return pos if pos < len(buffer) else None
+
+    def _expect(self, allowed):
+        pos = self._skip()
+        if pos is None:
+            return None
+        char = self._buffer[pos]
+        if char not in allowed:
+            raise ValueError(f"Unexpected {char!r} in /list/ response at offset {pos}")
+        self._pos = pos + 1
+        return char
+
+    def _value(self, final):
+        """Decode the next JSON value, or None if it may not be complete yet"""
+        pos = self._skip()
+        if pos is None:
+            return None
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return None
+        # A number at the end of the buffer might continue in the next chunk
+        if end == len(self._buffer) and not final:
+            return None
+        self._pos = end
+        return (value,)
+
+    def _step(self, documents, final):
+        """Advance the state machine once (False when more input is needed)"""
+        state = self._state
+        if state == 'start':
+            if self._expect('{') is None:
+                return False
+            self._state = 'key_or_end'
+        elif state in ('key', 'key_or_end'):
+            pos = self._skip()
+            if pos is None:
+                return False
+            if state == 'key_or_end' and self._buffer[pos] == '}':
+                self._pos = pos + 1
+                self._state = 'done'
+                return True
+            decoded = self._value(final)
+            if decoded is None:
+                return False
+            if not isinstance(decoded[0], str):
+                raise ValueError("Expected a key in /list/ response")
+            self._key = decoded[0]
+            self._state = 'colon'
+        elif state == 'colon':
+            if self._expect(':') is None:
+                return False
+            self._state = 'results_start' if self._key == 'results' else 'value'
+        elif state == 'value':
+            decoded = self._value(final)
+            if decoded is None:
+                return False
+            self.values[self._key] = decoded[0]
+            self._state = 'member_end'
+        elif state == 'member_end':
+            char = self._expect(',}')
+            if char is None:
+                return False
+            self._state = 'key' if char == ',' else 'done'
+        elif state == 'results_start':
+            pos = self._skip()
+            if pos is None:
+                return False
+            if self._buffer[pos] == 'n':
+                if len(self._buffer) - pos < 4 and not final:
+                    return False
+                if not self._buffer.startswith('null', pos):
+                    raise ValueError(f"Unexpected value for results in /list/ response at offset {pos}")
+                self._pos = pos + 4
+                self._state = 'member_end'
+                return True
+            self._expect('[')
+            self._state = 'item_or_end'
+        elif state in ('item', 'item_or_end'):
+            pos = self._skip()
+            if pos is None:
+                return False
+            if state == 'item_or_end' and self._buffer[pos] == ']':
+                self._pos = pos + 1
+                self._state = 'member_end'
+                return True
+            return self._read_items(documents)
+        else:
+            return False
+        return True
+
+    def _read_items(self, documents):
+        """
+        Decode consecutive complete documents of `results` in one tight loop
+
+        Returns:
+            True once the closing bracket is reached, False if the next document
+            (or its separator) is still to come
+        """
+        buffer = self._buffer
+        pos = self._pos
+        scan_once = self._scan_once
+        fields = self.fields
+        item_end = _ITEM_END.match
+        read = 0
+        while True:
+            try:
+                item, end = scan_once(buffer, pos)
+            except (StopIteration, ValueError):
+                break
+            separator = item_end(buffer, end)
+            if separator is None:
+                break
+            if fields is not None and type(item) is dict:
+                item = {key: item[key] for key in fields if key in item}
+            documents.append(item)
+            read += 1
+            pos = separator.end()
+            self._state = 'item'
+            if separator.group(1) == ']':
+                self._state = 'member_end'
+                break
+        self._pos = pos
+        self.count += read
+        return self._state == 'member_end'
+
+
+def decode_list_page(body, fields=LIST_FIELDS):
+    """
+    Decode a whole /list/ body (text or bytes) with projection
+
+    Returns:
+        (documents, nextPageCursor)
+    """
+    decoder = ListPageDecoder(fields)
+    documents = decoder.feed(body)
+    documents += decoder.close()
+    return documents, decoder.next_page_cursor
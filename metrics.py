@@ -0,0 +1,285 @@
+"""
+Run metrics
+Per-phase wall time and per-endpoint HTTP counters (requests, status codes,
+latency histogram, bytes received) collected during a run, exported as a JSON
+summary and optionally as a Prometheus textfile (node_exporter textfile
+collector format).
+
+Phases:
+    fetch: Readwise stage (index sync or archive scan, including the two below)
+    json_decode: Decoding /list/ pages
+    filter: Projecting pages onto compact records and matching them (or index queries)
+    lookup: Loading Beeminder goal state
+    post: Posting to Beeminder
+"""
+
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# Latency histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_PREFIX = "readwise_beeminder"
+
+# Phases being timed in the current context; a phase entered again inside itself
+# (e.g. a timed function calling another, or via asyncio.to_thread) isn't counted twice
+_active_phases = contextvars.ContextVar('active_phases', default=frozenset())
+
+
+def endpoint_name(url):
+    """Short, low-cardinality name for an API URL"""
+    path = urlparse(url).path
+    if path.endswith('/list/'):
+        return 'readwise_list'
+    if path.endswith('/create_all.json'):
+        return 'beeminder_create_all'
+    if path.endswith('/datapoints.json'):
+        return 'beeminder_datapoints'
+    if '/datapoints/' in path:
+        return 'beeminder_datapoint'
+    if '/goals/' in path:
+        return 'beeminder_goal'
+    return urlparse(url).hostname or 'other'
+
+
+class Metrics:
+    """Thread-safe accumulator for phase timings and HTTP request metrics"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.phases = {}
+        self.endpoints = {}
+
+    def add_time(self, phase, seconds):
+        """Add seconds to a phase"""
+        with self.lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as part of a phase"""
+        active = _active_phases.get()
+        if name in active:
+            yield
+            return
+        token = _active_phases.set(active | {name})
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+            _active_phases.reset(token)
+
+    def record_request(self, endpoint, method, status, seconds, bytes_received=0):
+        """
+        Record one HTTP attempt (retries are recorded individually)
+
+        Args:
+            endpoint: Endpoint name (see endpoint_name)
+            method: HTTP method
+            status: Response status code, or None if the request raised
+            seconds: Time until the response body was received
+            bytes_received: Response size on the wire
+        """
+        with self.lock:
+            entry = self.endpoints.get((endpoint, method))
+            if entry is None:
+                entry = self.endpoints[(endpoint, method)] = {
+                    'requests': 0, 'statuses': {}, 'bytes_received': 0,
+                    'latency_sum': 0.0, 'latency_buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+                }
+            entry['requests'] += 1
+            key = str(status) if status is not None else 'error'
+            entry['statuses'][key] = entry['statuses'].get(key, 0) + 1
+            entry['bytes_received'] += bytes_received
+            entry['latency_sum'] += seconds
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    entry['latency_buckets'][index] += 1
+                    break
+            else:
+                entry['latency_buckets'][-1] += 1
+
+    def summary(self, scheduler=None, cache=None):
+        """
+        Snapshot of everything collected so far
+
+        Args:
+            scheduler: Optional rate_limit.RequestScheduler whose retry/throttle counters are included
+            cache: Optional response_cache.ResponseCache whose lookup counters are included
+
+        Returns:
+            JSON-serializable dict
+        """
+        with self.lock:
+            phases = {name: round(seconds, 4) for name, seconds in self.phases.items()}
+            endpoints = []
+            for (endpoint, method), entry in sorted(self.endpoints.items()):
+                cumulative = 0
+                buckets = {}
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), entry['latency_buckets']):
+                    cumulative += count
+                    buckets[str(bound)] = cumulative
+                endpoints.append({
+                    'endpoint': endpoint,
+                    'method': method,
+                    'requests': entry['requests'],
+                    'statuses': dict(entry['statuses']),
+                    'bytes_received': entry['bytes_received'],
+                    'latency_seconds': {
+                        'sum': round(entry['latency_sum'], 4),
+                        'mean': round(entry['latency_sum'] / entry['requests'], 4),
+                        'buckets': buckets,
+                    },
+                })
+
+        summary = {
+            'started_at': self.started,
+            'wall_seconds': round(time.time() - self.started, 4),
+            'phases': phases,
+            'http': {
+                'requests': sum(e['requests'] for e in endpoints),
+                'bytes_received': sum(e['bytes_received'] for e in endpoints),
+                'endpoints': endpoints,
+            },
+        }
+        if scheduler is not None:
+            summary['http'].update({
+                'retries': scheduler.stats['retries'],
+                'rate_limited': scheduler.stats['rate_limited'],
+                'throttled_seconds': round(scheduler.stats['throttled_seconds'], 4),
+            })
+        if cache is not None:
+            hit_ratio = cache.hit_ratio()
+            summary['http']['cache'] = dict(cache.stats, lookups=cache.lookups,
+                                            hit_ratio=round(hit_ratio, 4) if hit_ratio is not None else None)
+        return summary
+
+
+def prometheus_text(summary):
+    """Render a summary() dict in the Prometheus text exposition format"""
+    p = METRIC_PREFIX
+    lines = [
+        f"# HELP {p}_run_timestamp_seconds Unix time the run started",
+        f"# TYPE {p}_run_timestamp_seconds gauge",
+        f"{p}_run_timestamp_seconds {summary['started_at']:.0f}",
+        f"# HELP {p}_run_duration_seconds Wall time of the run",
+        f"# TYPE {p}_run_duration_seconds gauge",
+        f"{p}_run_duration_seconds {summary['wall_seconds']}",
+        f"# HELP {p}_phase_duration_seconds Time spent per phase",
+        f"# TYPE {p}_phase_duration_seconds gauge",
+    ]
+    for name, seconds in sorted(summary['phases'].items()):
+        lines.append(f'{p}_phase_duration_seconds{{phase="{name}"}} {seconds}')
+
+    endpoints = summary['http']['endpoints']
+    lines += [
+        f"# HELP {p}_http_requests_total HTTP requests sent, including retries",
+        f"# TYPE {p}_http_requests_total counter",
+    ]
+    for e in endpoints:
+        for status, count in sorted(e['statuses'].items()):
+            lines.append(f'{p}_http_requests_total{{endpoint="{e["endpoint"]}",method="{e["method"]}",'
+                         f'status="{status}"}} {count}')
+
+    lines += [
+        f"# HELP {p}_http_response_bytes_total Response bytes received",
+        f"# TYPE {p}_http_response_bytes_total counter",
+    ]
+    for e in endpoints:
+        lines.append(f'{p}_http_response_bytes_total{{endpoint="{e["endpoint"]}",method="{e["method"]}"}} '
+                     f'{e["bytes_received"]}')
+
+    lines += [
+        f"# HELP {p}_http_request_duration_seconds HTTP request latency",
+        f"# TYPE {p}_http_request_duration_seconds histogram",
+    ]
+    for e in endpoints:
+        labels = f'endpoint="{e["endpoint"]}",method="{e["method"]}"'
+        for bound, count in e['latency_seconds']['buckets'].items():
+            lines.append(f'{p}_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'{p}_http_request_duration_seconds_sum{{{labels}}} {e["latency_seconds"]["sum"]}')
+        lines.append(f'{p}_http_request_duration_seconds_count{{{labels}}} {e["requests"]}')
+
+    for key, kind, help_text in (('retries', 'counter', 'Requests retried'),
+                                 ('rate_limited', 'counter', '429 responses received'),
+                                 ('throttled_seconds', 'gauge', 'Time spent waiting on rate limits and backoff')):
+        if key in summary['http']:
+            name = f"{p}_http_{key}" + ('_total' if kind == 'counter' else '')
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {summary['http'][key]}"]
+
+    cache = summary['http'].get('cache')
+    if cache is not None:
+        lines += [
+            f"# HELP {p}_http_cache_lookups_total Cacheable GETs by outcome (fresh, revalidated with a 304, miss)",
+            f"# TYPE {p}_http_cache_lookups_total counter",
+        ]
+        for result in ('fresh', 'revalidated', 'misses'):
+            lines.append(f'{p}_http_cache_lookups_total{{result="{result}"}} {cache[result]}')
+        lines += [
+            f"# HELP {p}_http_cache_hit_ratio Share of cacheable GETs answered from the cache",
+            f"# TYPE {p}_http_cache_hit_ratio gauge",
+            f"{p}_http_cache_hit_ratio {cache['hit_ratio'] if cache['hit_ratio'] is not None else 'NaN'}",
+        ]
+
+    return '\n'.join(lines) + '\n'
+
+
+def _write_atomic(path, text):
+    # The textfile collector may read at any time, so never expose a partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_metrics(json_path=None, prometheus_path=None, scheduler=None, cache=None):
+    """Write the current summary as JSON and/or a Prometheus textfile"""
+    summary = get_metrics().summary(scheduler, cache)
+    try:
+        if json_path:
+            _write_atomic(json_path, json.dumps(summary, indent=2) + '\n')
+        if prometheus_path:
+            _write_atomic(prometheus_path, prometheus_text(summary))
+    except OSError as e:
+        print(f"Warning: Could not write metrics: {e}")
+    return summary
+
+
+def timed(phase):
+    """Decorator timing every call of a function (or coroutine function) as part of a phase"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with get_metrics().phase(phase):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_metrics().phase(phase):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+_shared_metrics = None
+_shared_lock = threading.Lock()
+
+
+def get_metrics():
+    """Return the process-wide metrics collector (created on first use)"""
+    global _shared_metrics
+    with _shared_lock:
+        if _shared_metrics is None:
+            _shared_metrics = Metrics()
+        return _shared_metrics
@@ -0,0 +1,243 @@
+"""
+Rate-limit-aware request scheduling
+Client-side token buckets matched to the documented API limits, plus retries
+with Retry-After support and jittered exponential backoff, so a single 429 or
+transient 5xx doesn't throw away a long pagination run.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+
+# Readwise Reader documents 20 requests/minute for the list endpoint
+# (overridable for runs against a local test server)
+READWISE_LIST_RATE_PER_MINUTE = float(os.environ.get("READWISE_LIST_RATE_PER_MINUTE", 20))
+
+# Retry policy
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+MAX_RETRY_AFTER_SECONDS = 300.0
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at rate_per_minute, holding up to capacity tokens"""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Take one token if available (returns 0), otherwise return seconds until one will be"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Take one token, sleeping until one is available. Returns seconds spent waiting."""
+        waited = 0.0
+        while True:
+            delay = self.reserve()
+            if not delay:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    async def acquire_async(self):
+        """Take one token without blocking the event loop. Returns seconds spent waiting."""
+        waited = 0.0
+        while True:
+            delay = self.reserve()
+            if not delay:
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def drain(self):
+        """Empty the bucket (the server told us we're over the limit)"""
+        with self.lock:
+            self.tokens = 0.0
+            self.updated = time.monotonic()
+
+
+def parse_retry_after(value):
+    """Parse a Retry-After header (seconds or HTTP date) into seconds, or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE_SECONDS, cap=BACKOFF_MAX_SECONDS):
+    """Full-jitter exponential backoff for the given retry attempt (0-based)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RequestScheduler:
+    """
+    Paces requests through named token buckets and retries throttled or failed ones
+
+    Counters (in self.stats):
+        requests: HTTP requests sent (including retries)
+        retries: Requests retried after a 429, 5xx or connection error
+        rate_limited: 429 responses received
+        throttled_seconds: Time spent waiting on buckets, Retry-After and backoff
+    """
+
+    def __init__(self, limits=None, max_retries=MAX_RETRIES):
+        self.buckets = {key: TokenBucket(rate) for key, rate in (limits or {}).items()}
+        self.max_retries = max_retries
+        self.stats = {'requests': 0, 'retries': 0, 'rate_limited': 0, 'throttled_seconds': 0.0}
+        self.lock = threading.Lock()
+
+    def _count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def _wait(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+            self._count('throttled_seconds', seconds)
+
+    def send(self, method, send_request, rate_key=None):
+        """
+        Send a request with pacing and retries
+
+        Args:
+            method: HTTP method (non-idempotent methods are only retried on 429)
+            send_request: Zero-argument function performing the request
+            rate_key: Name of the token bucket to draw from (None for unpaced)
+
+        Returns:
+            The final response (callers still check its status)
+        """
+        bucket = self.buckets.get(rate_key)
+        retryable = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+
+        while True:
+            if bucket:
+                self._count('throttled_seconds', bucket.acquire())
+            self._count('requests')
+
+            try:
+                response = send_request()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                self._count('retries')
+                self._wait(backoff_delay(attempt))
+                attempt += 1
+                continue
+
+            status = response.status_code
+            if status not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                return response
+            if status != 429 and not retryable:
+                return response
+
+            if status == 429:
+                self._count('rate_limited')
+                if bucket:
+                    bucket.drain()
+
+            delay = parse_retry_after(response.headers.get('Retry-After'))
+            if delay is None:
+                delay = backoff_delay(attempt)
+            response.close()
+
+            self._count('retries')
+            self._wait(min(delay, MAX_RETRY_AFTER_SECONDS))
+            attempt += 1
+
+    async def send_async(self, method, send_request, rate_key=None, retry_exceptions=()):
+        """
+        Async counterpart of send() with the same pacing and retry policy
+
+        Args:
+            method: HTTP method (non-idempotent methods are only retried on 429)
+            send_request: Zero-argument coroutine function returning (status, headers, body)
+            rate_key: Name of the token bucket to draw from (None for unpaced)
+            retry_exceptions: Connection/timeout exception types worth retrying
+
+        Returns:
+            The final (status, headers, body)
+        """
+        bucket = self.buckets.get(rate_key)
+        retryable = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+
+        while True:
+            if bucket:
+                self._count('throttled_seconds', await bucket.acquire_async())
+            self._count('requests')
+
+            try:
+                status, headers, body = await send_request()
+            except retry_exceptions:
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                self._count('retries')
+                await self._wait_async(backoff_delay(attempt))
+                attempt += 1
+                continue
+
+            if status not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                return status, headers, body
+            if status != 429 and not retryable:
+                return status, headers, body
+
+            if status == 429:
+                self._count('rate_limited')
+                if bucket:
+                    bucket.drain()
+
+            delay = parse_retry_after(headers.get('Retry-After'))
+            if delay is None:
+                delay = backoff_delay(attempt)
+
+            self._count('retries')
+            await self._wait_async(min(delay, MAX_RETRY_AFTER_SECONDS))
+            attempt += 1
+
+    async def _wait_async(self, seconds):
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+            self._count('throttled_seconds', seconds)
+
+    def summary(self):
+        """One-line description of the counters"""
+        return (f"{self.stats['requests']} requests, {self.stats['retries']} retries, "
+                f"{self.stats['rate_limited']} rate-limited, "
+                f"{self.stats['throttled_seconds']:.1f}s throttled")
+
+
+def default_limits():
+    """Token bucket rates (requests/minute) for the APIs this tool calls"""
+    return {'readwise_list': READWISE_LIST_RATE_PER_MINUTE}
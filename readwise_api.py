@@ -0,0 +1,360 @@
+"""
+Shared Readwise Reader API helpers
+Pagination over the /list/ endpoint used by both sync scripts and the archive index
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from checkpoint import CHECKPOINT_SAMPLE_SIZE
+from documents import add_details, compact_page
+from http_client import get_client, readwise_headers
+from list_decoder import ListPageDecoder
+from metrics import get_metrics
+from tag_index import parse_tag_filter
+
+READWISE_API_BASE = os.environ.get("READWISE_API_BASE", "https://readwise.io/api/v3")
+
+# Document categories accepted by the /list/ endpoint
+CATEGORIES = ('article', 'email', 'rss', 'highlight', 'note', 'pdf', 'epub', 'tweet', 'video')
+
+# Category cursor chains fetched at once in parallel mode
+MAX_PARALLEL_CATEGORIES = 4
+
+# Decode /list/ pages as they stream in, keeping only documents.LIST_FIELDS
+# (READWISE_STREAM_DECODE=0 falls back to response.json() on the whole body)
+STREAM_DECODE = os.environ.get("READWISE_STREAM_DECODE", "1") != "0"
+
+# Bytes read off the response per decode step when streaming
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def _read_list_page(client, url, headers, params):
+    """
+    Fetch and decode one /list/ page
+
+    Returns:
+        (list of documents, nextPageCursor or None)
+    """
+    metrics = get_metrics()
+    if not STREAM_DECODE:
+        response = client.get(url, headers=headers, params=params, rate_key='readwise_list')
+        response.raise_for_status()
+        with metrics.phase('json_decode'):
+            data = response.json()
+        return data.get('results', []), data.get('nextPageCursor')
+
+    with client.stream(url, headers=headers, params=params, rate_key='readwise_list') as response:
+        response.raise_for_status()
+        decoder = ListPageDecoder()
+        page = []
+        for chunk in response.iter_content(STREAM_CHUNK_BYTES):
+            with metrics.phase('json_decode'):
+                page += decoder.feed(chunk)
+        with metrics.phase('json_decode'):
+            page += decoder.close()
+    return page, decoder.next_page_cursor
+
+
+def iter_list_pages_with_cursor(token, params=None, api_base=READWISE_API_BASE, client=None, cursor=None):
+    """
+    Yield (page, next_cursor) pairs from the Readwise Reader /list/ endpoint
+
+    Args:
+        token: Readwise access token
+        params: Query parameters (location, category, updatedAfter, ...)
+        api_base: Readwise API base URL
+        client: HttpClient to use (defaults to the shared pooled client)
+        cursor: pageCursor to resume from (None starts at the first page)
+
+    Yields:
+        (list of documents, cursor of the following page or None on the last page); documents
+        only carry documents.LIST_FIELDS unless STREAM_DECODE is off
+    """
+    client = client or get_client()
+    headers = readwise_headers(token)
+    params = dict(params or {})
+    url = f"{api_base}/list/"
+    if cursor:
+        params['pageCursor'] = cursor
+
+    while True:
+        page, next_page_cursor = _read_list_page(client, url, headers, params)
+        yield page, next_page_cursor
+
+        if not next_page_cursor:
+            break
+        params['pageCursor'] = next_page_cursor
+
+
+def iter_list_pages(token, params=None, api_base=READWISE_API_BASE, client=None):
+    """
+    Yield pages of documents from the Readwise Reader /list/ endpoint
+
+    Args:
+        token: Readwise access token
+        params: Query parameters (location, category, updatedAfter, ...)
+        api_base: Readwise API base URL
+        client: HttpClient to use (defaults to the shared pooled client)
+
+    Yields:
+        List of documents for each page, following nextPageCursor until exhausted
+    """
+    for page, _ in iter_list_pages_with_cursor(token, params, api_base=api_base, client=client):
+        yield page
+
+
+def _wants_details(kept, details):
+    return details is None or kept < details
+
+
+def iter_documents(token, params=None, predicates=(), api_base=READWISE_API_BASE, on_page=None,
+                   stop_when=None, client=None, details=0):
+    """
+    Stream documents from the /list/ endpoint as compact records, one page in memory at a time
+
+    Args:
+        token: Readwise access token
+        params: Query parameters for /list/
+        predicates: Functions taking a DocumentRecord; only records matching all are yielded
+        api_base: Readwise API base URL
+        on_page: Optional callback called with the number of documents scanned so far
+        stop_when: Optional function taking a page of records; pagination stops after a page it accepts
+        client: HttpClient to use (defaults to the shared pooled client)
+        details: Number of matching records to keep title/source_url on (None keeps them on all)
+
+    Yields:
+        Matching documents.DocumentRecord objects
+    """
+    metrics = get_metrics()
+    scanned = 0
+    kept = 0
+    for page in iter_list_pages(token, params, api_base=api_base, client=client):
+        with metrics.phase('filter'):
+            records = compact_page(page)
+            matches = []
+            for record, item in zip(records, page):
+                if all(predicate(record) for predicate in predicates):
+                    if _wants_details(kept, details):
+                        add_details(record, item)
+                        kept += 1
+                    matches.append(record)
+        yield from matches
+        scanned += len(page)
+        if on_page:
+            on_page(scanned)
+        if stop_when and stop_when(records):
+            break
+
+
+def iter_documents_by_category(token, categories, params=None, predicates=(), api_base=READWISE_API_BASE,
+                               on_page=None, stop_when=None, client=None, max_workers=MAX_PARALLEL_CATEGORIES,
+                               details=0):
+    """
+    Stream documents for several categories, paging each category's cursor chain in parallel
+
+    Each category is an independent /list/ query run on a worker thread; pages
+    are merged as they arrive and deduplicated by document id, so wall-clock
+    time tracks the slowest category rather than the sum of all of them.
+    Requests still share the client's rate limiter.
+
+    Args:
+        token: Readwise access token
+        categories: Categories to fetch (see CATEGORIES)
+        params: Query parameters shared by every category (location, updatedAfter, ...)
+        predicates: Functions taking a DocumentRecord; only records matching all are yielded
+        api_base: Readwise API base URL
+        on_page: Optional callback called with the number of documents scanned so far
+        stop_when: Optional function taking a page of records; that category stops after a page it accepts
+        client: HttpClient to use (defaults to the shared pooled client)
+        max_workers: Number of category chains fetched at once
+        details: Number of matching records to keep title/source_url on (None keeps them on all)
+
+    Yields:
+        Matching documents.DocumentRecord objects, each id at most once
+    """
+    client = client or get_client()
+    metrics = get_metrics()
+    pages = queue.Queue(maxsize=max_workers * 2)
+    cancelled = threading.Event()
+
+    def put(message):
+        while not cancelled.is_set():
+            try:
+                pages.put(message, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def fetch_category(category):
+        try:
+            category_params = dict(params or {})
+            category_params['category'] = category
+            for page in iter_list_pages(token, category_params, api_base=api_base, client=client):
+                records = compact_page(page)
+                put(('page', (records, page)))
+                if cancelled.is_set() or (stop_when and stop_when(records)):
+                    break
+        except Exception as e:
+            put(('error', e))
+        finally:
+            put(('done', category))
+
+    seen_ids = set()
+    scanned = 0
+    kept = 0
+    remaining = len(categories)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for category in categories:
+            executor.submit(fetch_category, category)
+        try:
+            while remaining:
+                kind, payload = pages.get()
+                if kind == 'done':
+                    remaining -= 1
+                    continue
+                if kind == 'error':
+                    raise payload
+
+                records, page = payload
+                with metrics.phase('filter'):
+                    matches = []
+                    for record, item in zip(records, page):
+                        if record.id is not None:
+                            if record.id in seen_ids:
+                                continue
+                            seen_ids.add(record.id)
+                        if all(predicate(record) for predicate in predicates):
+                            if _wants_details(kept, details):
+                                add_details(record, item)
+                                kept += 1
+                            matches.append(record)
+                yield from matches
+                scanned += len(records)
+                if on_page:
+                    on_page(scanned)
+        finally:
+            cancelled.set()
+
+
+def page_older_than(since_timestamp):
+    """
+    Page check: every dated record on the page is at or before since_timestamp
+
+    The list endpoint returns the most recently updated documents first, so once
+    a whole page is past the cutoff no later page can contain newer documents.
+    """
+    def check(records):
+        timestamps = [record.updated_at for record in records if record.updated_at is not None]
+        return bool(timestamps) and max(timestamps) <= since_timestamp
+    return check
+
+
+def time_window_params(params, since_timestamp):
+    """Return a copy of params with the time window pushed to the server as updatedAfter"""
+    windowed = dict(params)
+    windowed['updatedAfter'] = datetime.fromtimestamp(since_timestamp, tz=timezone.utc).isoformat()
+    return windowed
+
+
+def updated_since(since_timestamp):
+    """Predicate: record updated after since_timestamp (unparseable or missing timestamps match)"""
+    def predicate(record):
+        return record.updated_at is None or record.updated_at > since_timestamp
+    return predicate
+
+
+def has_tag(filter_tag):
+    """Predicate: record matches filter_tag (a tag name or expression, see tag_index.py)"""
+    return parse_tag_filter(filter_tag).matches
+
+
+def sample_record(record):
+    """Small, JSON-serializable copy of a record (with details) for display samples"""
+    return {
+        'title': record.title or 'Untitled',
+        'source_url': record.source_url or 'No URL',
+        'tags': record.tag_names(),
+    }
+
+
+def count_documents(token, params=None, predicates=(), sample_size=5, api_base=READWISE_API_BASE,
+                    on_page=None, stop_when=None, client=None, checkpoint=None):
+    """
+    Count matching documents page by page, keeping a bounded sample
+
+    With a checkpoint (see checkpoint.ScanCheckpoint) the next cursor and the
+    counts so far are saved after every page, and a fresh checkpoint is resumed
+    from instead of starting at the first page. Only the first
+    CHECKPOINT_SAMPLE_SIZE sample entries are saved, so a resumed scan may show
+    a shorter sample (the count is exact).
+
+    Args:
+        token: Readwise access token
+        params: Query parameters for /list/
+        predicates: Functions taking a DocumentRecord; only records matching all are counted
+        sample_size: Number of matching documents to keep (None keeps everything)
+        api_base: Readwise API base URL
+        on_page: Optional callback called with the number of documents scanned so far
+        stop_when: Optional function taking a page of records; pagination stops after a page it accepts
+        client: HttpClient to use (defaults to the shared pooled client)
+        checkpoint: Optional ScanCheckpoint for resumable scans
+
+    Returns:
+        (count, sample list of sample_record dicts)
+    """
+    cursor, progress = checkpoint.load() if checkpoint else (None, None)
+    progress = progress or {}
+    count = progress.get('count', 0)
+    scanned = progress.get('scanned', 0)
+    sample = progress.get('sample', [])
+    if cursor:
+        print(f"Resuming scan from checkpoint ({scanned} items already scanned)...")
+
+    metrics = get_metrics()
+    pages = iter_list_pages_with_cursor(token, params, api_base=api_base, client=client, cursor=cursor)
+    for page, next_cursor in pages:
+        with metrics.phase('filter'):
+            records = compact_page(page)
+            for record, item in zip(records, page):
+                if all(predicate(record) for predicate in predicates):
+                    count += 1
+                    if sample_size is None or len(sample) < sample_size:
+                        sample.append(sample_record(add_details(record, item)))
+        scanned += len(page)
+        if on_page:
+            on_page(scanned)
+
+        done = not next_cursor or (stop_when and stop_when(records))
+        if checkpoint and not done:
+            checkpoint.save(next_cursor, {'count': count, 'scanned': scanned,
+                                          'sample': sample[:CHECKPOINT_SAMPLE_SIZE]})
+        if done:
+            break
+
+    if checkpoint:
+        checkpoint.clear()
+    return count, sample
+
+
+def count_and_sample(items, sample_size=5):
+    """
+    Consume an iterable, counting every item but keeping only the first sample_size
+
+    Args:
+        items: Iterable of documents
+        sample_size: Number of items to keep (None keeps everything)
+
+    Returns:
+        (count, sample list)
+    """
+    count = 0
+    sample = []
+    for item in items:
+        count += 1
+        if sample_size is None or len(sample) < sample_size:
+            sample.append(item)
+    return count, sample
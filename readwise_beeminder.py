@@ -6,183 +6,272 @@ Tracks archived articles/videos from Readwise Reader to Beeminder
 
 import os
 import sys
-import json
 import time
+import signal
+import sqlite3
 import argparse
 from datetime import datetime, timedelta
-from pathlib import Path
 import requests
 
+from http_client import get_client, beeminder_params, print_http_summary, write_run_metrics
+from metrics import get_metrics, timed
+from beeminder_state import fetch_goal_state
+from checkpoint import ScanCheckpoint, account_key, clear_scans, scan_key
+from state_store import STATE_DB, get_watermark, set_watermark, reset_state
+from archive_index import (
+    INDEX_FILE, open_index, get_meta, sync_index, count_archived, count_goal, list_archived, goal_timestamps,
+)
+from readwise_api import (
+    CATEGORIES, count_documents, count_and_sample, iter_documents, iter_documents_by_category,
+    updated_since, has_tag, sample_record, page_older_than, time_window_params,
+)
+from goal_map import GoalRule, load_goal_rules, shared_list_params, count_by_goal, matching_goals, rules_by_goal
+from documents import tag_names
+from tag_index import parse_tag_filter
+from backfill import (
+    BACKFILL_BATCH_SIZE, parse_date, fetch_window, daily_counts, backfill_datapoints, submit_datapoints,
+)
+from reconcile import fetch_datapoints, find_drift, repair_plan, apply_repairs
+from stats import (
+    ArchiveRates, day_date, day_numbers, goal_rate_per_day, load_archive_columns, local_today, project, week_start,
+)
+from serve import (DEFAULT_DEBOUNCE_SECONDS, DEFAULT_PORT, DEFAULT_RECONCILE_SECONDS, LOCAL_HOST, PUBLIC_HOST,
+                   WebhookDaemon, is_loopback, serve)
+
 # Configuration
 READWISE_TOKEN = os.environ.get("READWISE_TOKEN")
-BEEMINDER_USERNAME = "kyle"  # Replace with your Beeminder username
-BEEMINDER_GOAL = "learning"  # Replace with your goal name
+BEEMINDER_USERNAME = os.environ.get("BEEMINDER_USERNAME", "kyle")  # Replace with your Beeminder username
+BEEMINDER_GOAL = os.environ.get("BEEMINDER_GOAL", "learning")  # Replace with your goal name
 BEEMINDER_AUTH_TOKEN = os.environ.get("BEEMINDER_TOKEN")
 
 # Tag filtering - only track items with this tag
 DEFAULT_TAG = "learning"  # Set to None to track all archived items
 
-# State file to track last run
-STATE_FILE = Path.home() / ".readwise_beeminder_state.json"
+# Category to track - can be: article, email, rss, highlight, note, pdf, epub, tweet, video
+DEFAULT_CATEGORY = "article"
+
+# Number of items kept for display (all matching items are still counted)
+SAMPLE_SIZE = 5
+
+# Tags listed by the stats command (--verbose lists all)
+STATS_TOP_TAGS = 15
+
+# Days the stats projection looks back (for the pace) and ahead
+PROJECTION_DAYS = 28
 
 # API Endpoints
-READWISE_API_BASE = "https://readwise.io/api/v3"
-BEEMINDER_API_BASE = "https://www.beeminder.com/api/v1"
+READWISE_API_BASE = os.environ.get("READWISE_API_BASE", "https://readwise.io/api/v3")
+BEEMINDER_API_BASE = os.environ.get("BEEMINDER_API_BASE", "https://www.beeminder.com/api/v1")
 
 
-def get_last_beeminder_datapoint():
+@timed('lookup')
+def get_last_beeminder_datapoint(goal=None):
     """Get the timestamp of the last datapoint from Beeminder"""
     if not BEEMINDER_AUTH_TOKEN:
         return None
 
     try:
-        url = f"{BEEMINDER_API_BASE}/users/{BEEMINDER_USERNAME}/goals/{BEEMINDER_GOAL}/datapoints.json"
-        params = {
-            'auth_token': BEEMINDER_AUTH_TOKEN,
-            'count': 1,  # Just get the most recent one
-            'sort': 'timestamp'
-        }
-        response = requests.get(url, params=params)
-        if response.status_code == 200:
-            datapoints = response.json()
-            if datapoints and len(datapoints) > 0:
-                # Return timestamp of most recent datapoint
-                return datapoints[-1].get('timestamp')
-        return None
+        state = fetch_goal_state(BEEMINDER_USERNAME, goal or BEEMINDER_GOAL, BEEMINDER_AUTH_TOKEN, BEEMINDER_API_BASE)
+        return state.last_timestamp()
     except Exception as e:
         print(f"Warning: Could not fetch last Beeminder datapoint: {e}")
         return None
 
 
-def load_last_run_time():
-    """Load the last run timestamp from state file or Beeminder"""
-    # Try state file first
-    if STATE_FILE.exists():
+def state_keys(rules):
+    """(goal, tag) state store keys of a list of goal rules"""
+    return list(dict.fromkeys((rule.goal, rule.tag) for rule in rules))
+
+
+def load_last_run_time(keys):
+    """
+    Load the last run timestamp for (goal, tag) keys from the state store or Beeminder
+
+    With several keys the earliest timestamp is used, so no goal misses items.
+    """
+    timestamps = []
+    for goal, tag in keys:
         try:
-            with open(STATE_FILE, 'r') as f:
-                state = json.load(f)
-                timestamp = state.get('last_run_timestamp')
-                if timestamp:
-                    return timestamp
-        except Exception as e:
-            print(f"Warning: Could not load state file: {e}")
+            timestamp = get_watermark(BEEMINDER_USERNAME, goal, tag)
+        except sqlite3.Error as e:
+            print(f"Warning: Could not load state: {e}")
+            timestamp = None
 
-    # Fall back to checking last Beeminder datapoint
-    last_datapoint = get_last_beeminder_datapoint()
-    if last_datapoint:
-        print(f"No local state found, using last Beeminder datapoint timestamp")
-        return last_datapoint
+        if timestamp is None:
+            # Fall back to checking last Beeminder datapoint
+            timestamp = get_last_beeminder_datapoint(goal)
+            if timestamp is None:
+                return None
+            print(f"No local state for '{goal}', using last Beeminder datapoint timestamp")
+        timestamps.append(timestamp)
 
-    return None
+    return min(timestamps) if timestamps else None
 
 
-def save_last_run_time(timestamp):
-    """Save the current run timestamp to state file"""
-    try:
-        state = {'last_run_timestamp': timestamp}
-        with open(STATE_FILE, 'w') as f:
-            json.dump(state, f)
-    except Exception as e:
-        print(f"Warning: Could not save state file: {e}")
+def save_last_run_time(timestamp, keys):
+    """Save the run timestamp for (goal, tag) keys in the state store"""
+    for goal, tag in keys:
+        try:
+            set_watermark(BEEMINDER_USERNAME, goal, tag, timestamp)
+        except sqlite3.Error as e:
+            print(f"Warning: Could not save state: {e}")
+
+
+def advance_last_run_time(timestamp, keys):
+    """Move the run timestamp for (goal, tag) keys forward to timestamp (later timestamps are kept)"""
+    for goal, tag in keys:
+        try:
+            current = get_watermark(BEEMINDER_USERNAME, goal, tag)
+            if current is None or current < timestamp:
+                set_watermark(BEEMINDER_USERNAME, goal, tag, timestamp)
+        except sqlite3.Error as e:
+            print(f"Warning: Could not save state: {e}")
 
 
-def get_archived_items(since_timestamp=None, filter_tag=None):
+def require_readwise_token():
+    """Exit with setup instructions if READWISE_TOKEN is missing"""
+    if not READWISE_TOKEN:
+        print("Error: READWISE_TOKEN environment variable not set")
+        print("Get your token from: https://readwise.io/access_token")
+        print("Set it with: export READWISE_TOKEN='your_token_here'")
+        sys.exit(1)
+
+
+def require_beeminder_token():
+    """Exit with setup instructions if BEEMINDER_TOKEN is missing"""
+    if not BEEMINDER_AUTH_TOKEN:
+        print("Error: BEEMINDER_TOKEN environment variable not set")
+        print("Get your token from: https://www.beeminder.com/api/v1/auth_token.json")
+        print("Set it with: export BEEMINDER_TOKEN='your_token_here'")
+        sys.exit(1)
+
+
+@timed('fetch')
+def get_indexed_archived_items(since_timestamp=None, filter_tag=None, sample_size=SAMPLE_SIZE, categories=None):
     """
-    Fetch archived items from Readwise Reader
+    Sync the local archive index and return archived items from it
+
+    Only documents changed since the previous sync are fetched from Readwise,
+    and documents are deduplicated by id, so the cost scales with the delta.
 
     Args:
         since_timestamp: Unix timestamp to fetch items updated since
         filter_tag: Optional tag to filter items by
+        sample_size: Number of matching items to keep for display (None keeps all)
+        categories: Optional list of categories to count (default: DEFAULT_CATEGORY)
 
     Returns:
-        List of archived documents
+        (number of matching archived documents, sample of matching documents)
     """
-    if not READWISE_TOKEN:
-        print("Error: READWISE_TOKEN environment variable not set")
-        print("Get your token from: https://readwise.io/access_token")
-        print("Set it with: export READWISE_TOKEN='your_token_here'")
+    require_readwise_token()
+    category = categories or DEFAULT_CATEGORY
+
+    try:
+        conn = open_index()
+        try:
+            sync_index(conn, READWISE_TOKEN, api_base=READWISE_API_BASE)
+            count = count_archived(conn, filter_tag=filter_tag, category=category,
+                                   since_timestamp=since_timestamp)
+            sample = list_archived(conn, filter_tag=filter_tag, category=category,
+                                   since_timestamp=since_timestamp, limit=sample_size)
+        finally:
+            conn.close()
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching from Readwise: {e}")
+        if hasattr(e.response, 'text'):
+            print(f"Response: {e.response.text}")
         sys.exit(1)
 
-    headers = {
-        'Authorization': f'Token {READWISE_TOKEN}'
-    }
+    if since_timestamp:
+        print(f"✓ Found {count} items updated since {datetime.fromtimestamp(since_timestamp)}")
+    if filter_tag:
+        print(f"✓ Filtered to {count} items with tag '{filter_tag}'")
+    return count, sample
 
-    params = {
-        'location': 'archive',  # Only get archived items
-        'category': 'article',  # Can be: article, email, rss, highlight, note, pdf, epub, tweet, video
-    }
 
-    # Note: We fetch ALL archived items and then filter by updatedAt on our end
-    # The 'updatedAfter' API param catches items that were archived OR had any update,
-    # which causes duplicates. Instead we'll filter by the 'updated_at' field client-side.
+@timed('fetch')
+def get_archived_items(since_timestamp=None, filter_tag=None, sample_size=SAMPLE_SIZE, time_window=True,
+                       categories=None):
+    """
+    Fetch archived items from Readwise Reader (no index)
 
-    url = f"{READWISE_API_BASE}/list/"
+    Documents are streamed page by page with the time and tag filters applied
+    inline, so only the current page and the displayed sample are held in memory.
 
-    try:
-        print(f"Fetching archived items from Readwise Reader...")
-        if since_timestamp:
-            print(f"Looking for items updated since: {datetime.fromtimestamp(since_timestamp)}")
+    Args:
+        since_timestamp: Unix timestamp to fetch items updated since
+        filter_tag: Optional tag to filter items by
+        sample_size: Number of matching items to keep for display (None keeps all)
+        time_window: Push since_timestamp to the server and stop paging once pages
+            are past it (False scans the whole archive)
+        categories: Optional list of categories fetched as parallel cursor chains
+            (default: DEFAULT_CATEGORY only; parallel scans are not checkpointed)
 
-        all_items = []
-        next_page_cursor = None
+    Returns:
+        (number of matching archived documents, sample of matching documents)
+    """
+    require_readwise_token()
 
-        while True:
-            if next_page_cursor:
-                params['pageCursor'] = next_page_cursor
+    params = {
+        'location': 'archive',  # Only get archived items
+        'category': DEFAULT_CATEGORY,
+    }
 
-            response = requests.get(url, headers=headers, params=params)
-            response.raise_for_status()
+    # Note: The 'updatedAfter' API param catches items that were archived OR had any update.
+    # We always filter by the 'updated_at' field client-side as well, so pushing the window
+    # to the server (and stopping once pages are older than it) returns the same items as
+    # a full scan - it just skips downloading the rest of the archive.
+    # (The default path, get_indexed_archived_items, uses updatedAfter deltas safely
+    # because the local index deduplicates documents by id.)
 
-            data = response.json()
-            results = data.get('results', [])
-            all_items.extend(results)
+    # Checkpoint key from the inputs that stay the same between runs; the window is checked on resume
+    key = scan_key('archived', account_key(READWISE_TOKEN), params, filter_tag, time_window, sample_size)
 
-            # Check if there are more pages
-            next_page_cursor = data.get('nextPageCursor')
-            if not next_page_cursor:
-                break
+    predicates = []
+    stop_when = None
+    if since_timestamp:
+        predicates.append(updated_since(since_timestamp))
+        if time_window:
+            params = time_window_params(params, since_timestamp)
+            stop_when = page_older_than(since_timestamp)
+    if filter_tag:
+        predicates.append(has_tag(filter_tag))
 
-            print(f"Fetched {len(all_items)} items so far...")
+    scanned = [0]
 
-        print(f"✓ Found {len(all_items)} archived items")
+    def report_progress(count):
+        scanned[0] = count
+        print(f"Fetched {count} items so far...")
 
-        # Filter by updated_at timestamp client-side
+    try:
+        print(f"Fetching archived items from Readwise Reader...")
         if since_timestamp:
-            filtered_by_time = []
-            for item in all_items:
-                # Check when the item was last updated
-                updated_at_str = item.get('updated_at')
-                if updated_at_str:
-                    try:
-                        # Parse ISO format timestamp
-                        updated_at = datetime.fromisoformat(updated_at_str.replace('Z', '+00:00'))
-                        updated_timestamp = updated_at.timestamp()
-                        if updated_timestamp > since_timestamp:
-                            filtered_by_time.append(item)
-                    except:
-                        # If we can't parse, include it to be safe
-                        filtered_by_time.append(item)
-                else:
-                    # No timestamp, include it
-                    filtered_by_time.append(item)
-
-            all_items = filtered_by_time
-            print(f"✓ Filtered to {len(all_items)} items updated since {datetime.fromtimestamp(since_timestamp)}")
-
-        # Filter by tag if specified
-        if filter_tag:
-            filtered_items = []
-            for item in all_items:
-                tags = item.get('tags', [])
-                # Tags might be a list of tag objects or strings
-                tag_names = [tag.get('name', tag) if isinstance(tag, dict) else tag for tag in tags]
-                if filter_tag in tag_names:
-                    filtered_items.append(item)
+            print(f"Looking for items updated since: {datetime.fromtimestamp(since_timestamp)}")
 
-            print(f"✓ Filtered to {len(filtered_items)} items with tag '{filter_tag}'")
-            return filtered_items
+        if categories:
+            # One cursor chain per category, fetched in parallel and deduplicated by id
+            del params['category']
+            print(f"Fetching categories in parallel: {', '.join(categories)}")
+            documents = iter_documents_by_category(READWISE_TOKEN, categories, params, predicates=predicates,
+                                                   api_base=READWISE_API_BASE, on_page=report_progress,
+                                                   stop_when=stop_when, details=sample_size)
+            count, sample = count_and_sample(documents, sample_size)
+            sample = [sample_record(record) for record in sample]
+        else:
+            # Progress is checkpointed after every page so an interrupted scan resumes where it stopped
+            checkpoint = ScanCheckpoint(key, window=since_timestamp)
+            count, sample = count_documents(READWISE_TOKEN, params, predicates=predicates,
+                                            sample_size=sample_size, api_base=READWISE_API_BASE,
+                                            on_page=report_progress, stop_when=stop_when,
+                                            checkpoint=checkpoint)
+
+        print(f"✓ Scanned {scanned[0]} archived items")
+        if since_timestamp:
+            print(f"✓ Filtered to items updated since {datetime.fromtimestamp(since_timestamp)}")
+        if filter_tag:
+            print(f"✓ Filtered to {count} items with tag '{filter_tag}'")
 
-        return all_items
+        return count, sample
 
     except requests.exceptions.RequestException as e:
         print(f"Error fetching from Readwise: {e}")
@@ -191,7 +280,8 @@ def get_archived_items(since_timestamp=None, filter_tag=None):
         sys.exit(1)
 
 
-def post_to_beeminder(value, comment=None, dry_run=False):
+@timed('post')
+def post_to_beeminder(value, comment=None, dry_run=False, goal=None):
     """
     Post datapoint to Beeminder
 
@@ -199,36 +289,33 @@ def post_to_beeminder(value, comment=None, dry_run=False):
         value: Number to post
         comment: Optional comment for the datapoint
         dry_run: If True, don't actually post
+        goal: Goal slug to post to (default: BEEMINDER_GOAL)
     """
-    if not BEEMINDER_AUTH_TOKEN:
-        print("Error: BEEMINDER_TOKEN environment variable not set")
-        print("Get your token from: https://www.beeminder.com/api/v1/auth_token.json")
-        print("Set it with: export BEEMINDER_TOKEN='your_token_here'")
-        sys.exit(1)
+    goal = goal or BEEMINDER_GOAL
+    require_beeminder_token()
 
-    url = f"{BEEMINDER_API_BASE}/users/{BEEMINDER_USERNAME}/goals/{BEEMINDER_GOAL}/datapoints.json"
+    url = f"{BEEMINDER_API_BASE}/users/{BEEMINDER_USERNAME}/goals/{goal}/datapoints.json"
 
-    data = {
-        'auth_token': BEEMINDER_AUTH_TOKEN,
+    data = beeminder_params(BEEMINDER_AUTH_TOKEN, {
         'value': value,
         'timestamp': int(time.time()),
-    }
+    })
 
     if comment:
         data['comment'] = comment
 
     if dry_run:
-        print(f"[DRY RUN] Would post to Beeminder: {value} items")
+        print(f"[DRY RUN] Would post to Beeminder goal '{goal}': {value} items")
         if comment:
             print(f"[DRY RUN] Comment: {comment}")
         return True
 
     try:
         print(f"Posting to Beeminder: {value} items")
-        response = requests.post(url, data=data)
+        response = get_client().post(url, data=data)
 
         if response.status_code == 200:
-            print(f"✓ Successfully posted {value} items to Beeminder goal '{BEEMINDER_GOAL}'")
+            print(f"✓ Successfully posted {value} items to Beeminder goal '{goal}'")
             return True
         else:
             print(f"✗ Error posting to Beeminder: {response.status_code}")
@@ -239,6 +326,437 @@ def post_to_beeminder(value, comment=None, dry_run=False):
         return False
 
 
+@timed('fetch')
+def count_goal_items(rules, since_timestamp, use_index=True, time_window=True):
+    """
+    Count items archived since since_timestamp for every goal rule in one pass
+
+    With the index, Readwise is synced once and each goal is a local query.
+    Without it, the archive is streamed once and every rule is checked per document.
+
+    Args:
+        rules: List of goal_map.GoalRule
+        since_timestamp: Unix timestamp to count items updated since
+        use_index: Use the local archive index (default) instead of querying Readwise directly
+        time_window: Without the index, stop paging once pages are past since_timestamp
+
+    Returns:
+        Dict of goal slug -> count
+    """
+    require_readwise_token()
+
+    try:
+        if use_index:
+            # The index holds the whole archive; rules for other locations only
+            # see documents that changed after the index was first built
+            conn = open_index()
+            try:
+                sync_index(conn, READWISE_TOKEN, api_base=READWISE_API_BASE)
+                counts = {goal: count_goal(conn, goal_rules, since_timestamp=since_timestamp)
+                          for goal, goal_rules in rules_by_goal(rules).items()}
+            finally:
+                conn.close()
+            return counts
+
+        print(f"Fetching items from Readwise Reader for {len(rules)} goals...")
+        params = shared_list_params(rules)
+        stop_when = None
+        if time_window:
+            params = time_window_params(params, since_timestamp)
+            stop_when = page_older_than(since_timestamp)
+        documents = iter_documents(READWISE_TOKEN, params, predicates=[updated_since(since_timestamp)],
+                                   api_base=READWISE_API_BASE, stop_when=stop_when,
+                                   on_page=lambda n: print(f"Fetched {n} items so far..."))
+        return count_by_goal(documents, rules)
+
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching from Readwise: {e}")
+        if hasattr(e.response, 'text'):
+            print(f"Response: {e.response.text}")
+        sys.exit(1)
+
+
+def sync_goals(rules, since_timestamp, args):
+    """
+    Count and post every goal from a goal map with a single Readwise pass
+
+    Returns:
+        True if at least one datapoint was posted and every post succeeded
+    """
+    counts = count_goal_items(rules, since_timestamp, use_index=not args.no_index,
+                              time_window=not args.full_scan)
+
+    print("\nItems archived since last run:")
+    for goal, goal_rules in rules_by_goal(rules).items():
+        print(f"  {goal}: {counts[goal]} [{'; '.join(rule.describe() for rule in goal_rules)}]")
+
+    posted = False
+    all_ok = True
+    for goal, count in counts.items():
+        if count == 0:
+            continue
+        descriptions = ', '.join(rule.describe() for rule in rules if rule.goal == goal)
+        comment = f"Auto-tracked from Readwise Reader ({count} items) [{descriptions}]"
+        print()
+        if post_to_beeminder(count, comment=comment, dry_run=args.dry_run, goal=goal):
+            posted = True
+        else:
+            all_ok = False
+
+    if not posted and all_ok:
+        print("\nNo new items to track")
+    return posted and all_ok
+
+
+@timed('fetch')
+def collect_goal_timestamps(rules, since_timestamp, until_timestamp, use_index=True):
+    """
+    Update timestamps of archived items in [since_timestamp, until_timestamp) for every goal rule
+
+    Returns:
+        Dict of goal slug -> list of Unix timestamps
+    """
+    require_readwise_token()
+    timestamps = {rule.goal: [] for rule in rules}
+
+    try:
+        if use_index:
+            conn = open_index()
+            try:
+                sync_index(conn, READWISE_TOKEN, api_base=READWISE_API_BASE)
+                for goal, goal_rules in rules_by_goal(rules).items():
+                    timestamps[goal] = goal_timestamps(conn, goal_rules, since_timestamp=since_timestamp,
+                                                       until_timestamp=until_timestamp)
+            finally:
+                conn.close()
+            return timestamps
+
+        print(f"Fetching items from Readwise Reader for {len(rules)} goals...")
+        params = time_window_params(shared_list_params(rules), since_timestamp)
+        documents = iter_documents(READWISE_TOKEN, params, predicates=[updated_since(since_timestamp)],
+                                   api_base=READWISE_API_BASE, stop_when=page_older_than(since_timestamp),
+                                   on_page=lambda n: print(f"Fetched {n} items so far..."))
+        for record in documents:
+            if record.updated_at is None or record.updated_at >= until_timestamp:
+                continue
+            for goal in matching_goals(rules, record):
+                timestamps[goal].append(record.updated_at)
+        return timestamps
+
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching from Readwise: {e}")
+        if hasattr(e.response, 'text'):
+            print(f"Response: {e.response.text}")
+        sys.exit(1)
+
+
+def run_backfill(rules, start, end, args):
+    """
+    Rebuild per-day counts for start..end and submit them with create_all
+
+    Each item counts on the Beeminder day (goal timezone and deadline) of its
+    Readwise updated_at time. Datapoints carry a requestid per goal-day, so a
+    rerun over the same dates updates the earlier datapoints rather than adding
+    to them. Once a goal's days are submitted, its sync watermark is moved to
+    the end of the range, so the normal sync doesn't count the same items again.
+
+    Returns:
+        True if every batch was accepted (or dry run)
+    """
+    require_beeminder_token()
+
+    since_timestamp, until_timestamp = fetch_window(start, end)
+    timestamps = collect_goal_timestamps(rules, since_timestamp, until_timestamp, use_index=not args.no_index)
+
+    all_ok = True
+    for goal in timestamps:
+        try:
+            with get_metrics().phase('lookup'):
+                state = fetch_goal_state(BEEMINDER_USERNAME, goal, BEEMINDER_AUTH_TOKEN, BEEMINDER_API_BASE)
+        except requests.exceptions.RequestException as e:
+            print(f"✗ Could not load Beeminder goal '{goal}': {e}")
+            all_ok = False
+            continue
+
+        counts = daily_counts(timestamps[goal], state.daystamp, start, end)
+        parts = dict.fromkeys(part for rule in rules if rule.goal == goal for part in rule.describe().split(', '))
+        datapoints = backfill_datapoints(goal, counts, ', '.join(parts))
+
+        print(f"\nGoal '{goal}' ({state.timezone}): {sum(counts.values())} items on "
+              f"{len(datapoints)} of {len(counts)} days")
+        if args.verbose:
+            for datapoint in datapoints:
+                print(f"  {datapoint['daystamp']}: {datapoint['value']}")
+
+        if args.dry_run:
+            if datapoints:
+                print(f"[DRY RUN] Would submit {len(datapoints)} datapoints to Beeminder goal '{goal}' "
+                      f"in batches of {BACKFILL_BATCH_SIZE}")
+            continue
+
+        failures = []
+        if datapoints:
+            with get_metrics().phase('post'):
+                accepted, failures = submit_datapoints(BEEMINDER_USERNAME, goal, BEEMINDER_AUTH_TOKEN,
+                                                       BEEMINDER_API_BASE, datapoints)
+            if accepted:
+                print(f"✓ Submitted {accepted} datapoints to Beeminder goal '{goal}'")
+        for batch, error in failures:
+            print(f"✗ Error submitting batch {batch + 1} to Beeminder: {error}")
+            all_ok = False
+        if not failures:
+            # Items up to the end of the range are now posted; the normal sync continues from there
+            advance_last_run_time(int(min(state.day_end(end), time.time())),
+                                  state_keys([rule for rule in rules if rule.goal == goal]))
+
+    return all_ok
+
+
+def _daystamp_date(daystamp):
+    return datetime.strptime(daystamp, '%Y%m%d').date()
+
+
+def run_reconcile(rules, start, end, args):
+    """
+    Compare each goal's datapoints per Beeminder day with Readwise archive counts
+
+    Without a start date the goal's whole datapoint history is checked. Days
+    after the goal's last sync are left out (their items haven't been posted
+    yet), and on that day only items archived before the sync count. With
+    --fix, drifted days are repaired through create_all (see reconcile.py).
+
+    Returns:
+        True if no drift is left (none found, or every repair was accepted)
+    """
+    require_beeminder_token()
+
+    goals = {}
+    for goal in dict.fromkeys(rule.goal for rule in rules):
+        try:
+            with get_metrics().phase('lookup'):
+                state = fetch_goal_state(BEEMINDER_USERNAME, goal, BEEMINDER_AUTH_TOKEN, BEEMINDER_API_BASE)
+                datapoints = fetch_datapoints(BEEMINDER_USERNAME, goal, BEEMINDER_AUTH_TOKEN, BEEMINDER_API_BASE,
+                                              since_daystamp=start.strftime('%Y%m%d') if start else None)
+        except requests.exceptions.RequestException as e:
+            print(f"✗ Could not load Beeminder goal '{goal}': {e}")
+            return False
+
+        cutoff = load_last_run_time(state_keys([rule for rule in rules if rule.goal == goal])) or time.time()
+        last_day = _daystamp_date(state.daystamp(cutoff))
+        days = [str(dp['daystamp']) for dp in datapoints if dp.get('daystamp')]
+        goal_start = start or (_daystamp_date(min(days)) if days else last_day)
+        goal_end = min(end, last_day) if end else last_day
+        goals[goal] = (state, datapoints, cutoff, goal_start, goal_end)
+
+    checked = {goal: entry for goal, entry in goals.items() if entry[3] <= entry[4]}
+    if not checked:
+        print("Nothing to reconcile (no days before the last sync)")
+        return True
+
+    since_timestamp, until_timestamp = fetch_window(min(entry[3] for entry in checked.values()),
+                                                    max(entry[4] for entry in checked.values()))
+    until_timestamp = min(until_timestamp, max(entry[2] for entry in checked.values()))
+    timestamps = collect_goal_timestamps([rule for rule in rules if rule.goal in checked], since_timestamp,
+                                         until_timestamp, use_index=not args.no_index)
+
+    all_ok = True
+    for goal, (state, datapoints, cutoff, goal_start, goal_end) in checked.items():
+        if state.metadata.get('aggday', 'sum') != 'sum':
+            print(f"Warning: Goal '{goal}' aggregates days with '{state.metadata['aggday']}'; "
+                  f"reconcile compares daily sums")
+        counts = daily_counts([t for t in timestamps[goal] if t < cutoff], state.daystamp, goal_start, goal_end)
+        drift = find_drift(goal, datapoints, counts, state.daystamp)
+
+        print(f"\nGoal '{goal}' ({state.timezone}): {len(datapoints)} datapoints, "
+              f"{goal_start.isoformat()} to {goal_end.isoformat()}")
+        if not drift:
+            print(f"✓ All {len(counts)} days match Readwise ({sum(counts.values())} items)")
+            continue
+
+        net = sum(day.difference for day in drift)
+        print(f"✗ {len(drift)} of {len(counts)} days drifted (Beeminder is {'short' if net > 0 else 'over'} "
+              f"by {abs(net):g} items overall)")
+        shown = drift if args.verbose else drift[:20]
+        for day in shown:
+            print(f"  {day.daystamp}: posted {day.posted:g}, Readwise {day.expected} ({day.difference:+g})")
+        if len(shown) < len(drift):
+            print(f"  ... and {len(drift) - len(shown)} more days (--verbose lists all)")
+
+        if not args.fix:
+            all_ok = False
+            continue
+        upserts, deletes = repair_plan(goal, drift)
+        requests_needed = -(-len(upserts) // BACKFILL_BATCH_SIZE) + len(deletes)
+        if args.dry_run:
+            print(f"[DRY RUN] Would update {len(upserts)} days and delete {len(deletes)} datapoints "
+                  f"({requests_needed} requests)")
+            continue
+
+        with get_metrics().phase('post'):
+            accepted, deleted, errors = apply_repairs(BEEMINDER_USERNAME, goal, BEEMINDER_AUTH_TOKEN,
+                                                      BEEMINDER_API_BASE, upserts, deletes)
+        print(f"✓ Repaired goal '{goal}': {accepted} days updated, {deleted} datapoints deleted "
+              f"({requests_needed} requests)")
+        for error in errors:
+            print(f"✗ Error repairing goal '{goal}': {error}")
+            all_ok = False
+
+    return all_ok
+
+
+def _bar(count, peak, width=40):
+    return '█' * int(round(width * count / peak)) if peak else ''
+
+
+def run_stats(rules, args):
+    """
+    Print archive rates per goal from the local index (see stats.py)
+
+    Days follow each goal's Beeminder timezone and deadline when BEEMINDER_TOKEN
+    is set, which also enables the projection against the goal's rate; otherwise
+    local days are used. Readwise is only queried if the index was never built.
+    """
+    try:
+        conn = open_index()
+        try:
+            if get_meta(conn, 'watermark') is None:
+                require_readwise_token()
+                sync_index(conn, READWISE_TOKEN, api_base=READWISE_API_BASE)
+            watermark = get_meta(conn, 'watermark')
+            started = time.perf_counter()
+            with get_metrics().phase('filter'):
+                columns = load_archive_columns(conn)
+            loaded = time.perf_counter() - started
+        finally:
+            conn.close()
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching from Readwise: {e}")
+        sys.exit(1)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    newest = datetime.fromtimestamp(float(watermark)).strftime('%Y-%m-%d %H:%M') if watermark else 'none'
+    print(f"Archive index: {len(columns)} archived documents, {len(columns.tag_names)} tags, "
+          f"{len(columns.category_names)} categories (newest update {newest}; loaded in {loaded * 1000:.0f} ms)")
+
+    for goal in dict.fromkeys(rule.goal for rule in rules):
+        goal_rules = [rule for rule in rules if rule.goal == goal]
+        tz, deadline, state = None, 0, None
+        if BEEMINDER_AUTH_TOKEN:
+            try:
+                with get_metrics().phase('lookup'):
+                    state = fetch_goal_state(BEEMINDER_USERNAME, goal, BEEMINDER_AUTH_TOKEN, BEEMINDER_API_BASE)
+                    if 'rate' not in state.metadata:
+                        # Cached before the rate was part of the goal metadata
+                        state = fetch_goal_state(BEEMINDER_USERNAME, goal, BEEMINDER_AUTH_TOKEN, BEEMINDER_API_BASE,
+                                                 refresh=True)
+                tz, deadline = state.tzinfo, state.deadline
+            except requests.exceptions.RequestException as e:
+                print(f"Warning: Could not load Beeminder goal '{goal}' ({e}); using local days")
+
+        started = time.perf_counter()
+        with get_metrics().phase('filter'):
+            selected = columns.updated_at[columns.selection(goal_rules)]
+            rates = ArchiveRates(day_numbers(selected, tz, deadline), local_today(tz, deadline))
+        elapsed = time.perf_counter() - started
+
+        parts = dict.fromkeys(part for rule in goal_rules for part in rule.describe().split(', '))
+        print(f"\nGoal '{goal}' ({', '.join(parts)}; {state.timezone if state else 'local time'})")
+        if not rates.total:
+            print("  No archived items match")
+            continue
+        print(f"  {rates.total} items since {day_date(rates.first_day).isoformat()} "
+              f"({rates.total / len(rates.daily):.2f}/day on average; computed in {elapsed * 1000:.0f} ms)")
+        print(f"  Rolling average: {rates.pace(7):.2f}/day (7 days), {rates.pace(PROJECTION_DAYS):.2f}/day "
+              f"({PROJECTION_DAYS} days), {rates.pace(90):.2f}/day (90 days)")
+
+        days, counts = rates.last_days(args.days)
+        peak = counts.max()
+        print(f"  Last {len(days)} days:")
+        for day, count in zip(days, counts):
+            print(f"    {day_date(day).strftime('%a %Y-%m-%d')} {count:>5} {_bar(count, peak)}")
+
+        weeks, counts = rates.full_weeks(args.weeks)
+        peak = max(counts.max(initial=0), rates.weekly[-1])
+        print(f"  Last {len(weeks)} complete weeks (and this week so far):")
+        for week, count in zip(weeks, counts):
+            print(f"    week of {day_date(week_start(week)).isoformat()} {count:>5} {_bar(count, peak)}")
+        print(f"    this week          {rates.weekly[-1]:>5} {_bar(rates.weekly[-1], peak)}")
+
+        goal_rate = goal_rate_per_day(state.metadata) if state else None
+        if goal_rate is None:
+            if state:
+                print("  (Goal has no rate to project against)")
+            continue
+        projection = project(rates, goal_rate, PROJECTION_DAYS, args.weeks)
+        print(f"  Goal rate {state.metadata['rate']:g}/{state.metadata.get('runits') or 'd'}: "
+              f"the next {PROJECTION_DAYS} days at the {PROJECTION_DAYS}-day pace bring "
+              f"{projection.projected:.0f} items, {projection.required:.0f} needed "
+              f"({projection.surplus:+.0f} {'ahead' if projection.surplus >= 0 else 'behind'})")
+        if state.metadata.get('safebuf') is not None:
+            print(f"  Safety buffer: {state.metadata['safebuf']} days")
+        if projection.weekly_floor is not None:
+            print(f"  3 weeks in 4 of the last {len(weeks)} brought at least {projection.weekly_floor:.0f} items "
+                  f"(a rate of {projection.weekly_floor:.0f}/w would have been met that often)")
+
+    today = local_today()
+    dated = columns.dated
+    recent = dated.copy()
+    recent[dated] = day_numbers(columns.updated_at[dated]) > today - PROJECTION_DAYS
+    totals = columns.tag_counts()
+    recent_totals = columns.tag_counts(recent)
+    order = totals.argsort(kind='stable')[::-1]
+    shown = order if args.verbose else order[:STATS_TOP_TAGS]
+    if len(shown):
+        width = max(len('tag'), max(len(columns.tag_names[code]) for code in shown))
+        print(f"\nTags ({'all' if args.verbose else 'top'} {len(shown)} of {len(columns.tag_names)}, "
+              f"all archived items):")
+        print(f"  {'tag':<{width}} {'total':>7} {'share':>6} {'per week (last ' + str(PROJECTION_DAYS) + ' days)':>28}")
+        for code in shown:
+            print(f"  {columns.tag_names[code]:<{width}} {totals[code]:>7} {totals[code] / len(columns):>6.1%} "
+                  f"{recent_totals[code] * 7 / PROJECTION_DAYS:>28.1f}")
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def run_serve(rules, args):
+    """
+    Run the webhook daemon until interrupted (see serve.py)
+
+    Each debounced post also saves the run timestamp, so a scheduled sync
+    running alongside only counts items archived after the daemon's last post.
+    Without READWISE_WEBHOOK_SECRET the daemon only listens on loopback.
+    """
+    require_readwise_token()
+    if not args.dry_run:
+        require_beeminder_token()
+    secret = os.environ.get("READWISE_WEBHOOK_SECRET")
+    host = args.host or (PUBLIC_HOST if secret else LOCAL_HOST)
+    if not secret:
+        if not is_loopback(host):
+            print(f"Error: Refusing to listen on {host} without READWISE_WEBHOOK_SECRET")
+            print("Set it to the secret from the Readwise webhook settings, or listen on 127.0.0.1")
+            sys.exit(1)
+        print(f"Warning: READWISE_WEBHOOK_SECRET not set - accepting unauthenticated events on {host} only")
+
+    def post(goal, count, comment):
+        posted = post_to_beeminder(count, comment=comment, dry_run=args.dry_run, goal=goal)
+        if posted and not args.dry_run:
+            save_last_run_time(int(time.time()), state_keys([rule for rule in rules if rule.goal == goal]))
+        return posted
+
+    daemon = WebhookDaemon(rules, READWISE_TOKEN, post, api_base=READWISE_API_BASE, debounce=args.debounce,
+                           reconcile_interval=args.reconcile_minutes * 60,
+                           secret=secret)
+    signal.signal(signal.SIGTERM, _interrupt)
+    serve(daemon, host=host, port=args.port)
+    print(f"Events: {daemon.stats['events']}, documents: {daemon.stats['documents']}, "
+          f"posts: {daemon.stats['posts']}, reconciliations: {daemon.stats['reconciles']}")
+
+
 def parse_arguments():
     """Parse command-line arguments"""
     parser = argparse.ArgumentParser(
@@ -248,21 +766,76 @@ def parse_arguments():
 Examples:
   %(prog)s --dry-run              # Test without posting (uses default tag: {DEFAULT_TAG})
   %(prog)s --tag videos           # Track items tagged 'videos' instead
+  %(prog)s --tag learning,-fiction  # Tagged 'learning' but not 'fiction' ('|' for OR)
   %(prog)s --reset                # Reset state and check last 24 hours
   %(prog)s --hours 48             # Check last 48 hours (ignores saved state)
+  %(prog)s --rebuild-index        # Rebuild the local archive index from scratch
+  %(prog)s --goals goals.json     # Post to several goals from one Readwise pass
+  %(prog)s --categories article,video,pdf  # Track several categories
+  %(prog)s backfill --from 2024-01-01 --to 2024-01-31  # Rebuild daily datapoints for January
+  %(prog)s reconcile --fix        # Check every day's datapoints against Readwise and repair drift
+  %(prog)s serve --port 8787 --debounce 600  # Count from Readwise webhooks, post every 10 minutes
+  %(prog)s stats --weeks 26       # Archive rates per day/week/tag and a projection against the goal rate
         """
     )
 
+    parser.add_argument('command', nargs='?', default='sync',
+                        choices=['sync', 'backfill', 'reconcile', 'serve', 'stats'],
+                        help='sync: post items archived since the last run (default); '
+                             'backfill: post per-day counts for a date range; '
+                             'reconcile: compare posted datapoints with Readwise per day; '
+                             'serve: run a Readwise webhook listener that posts as items are archived; '
+                             'stats: archive rates and goal projection from the local index')
+
     parser.add_argument('--dry-run', action='store_true',
                         help='Test mode - do not post to Beeminder')
     parser.add_argument('--tag', type=str,
-                        help=f'Only count items with this tag (default: {DEFAULT_TAG})')
+                        help=f'Only count items with this tag or tag expression, e.g. "learning|papers,-fiction" '
+                             f'(default: {DEFAULT_TAG})')
     parser.add_argument('--reset', action='store_true',
-                        help='Reset state file and check last 24 hours')
+                        help='Reset saved sync state and check last 24 hours')
     parser.add_argument('--hours', type=int,
                         help='Check last N hours (overrides saved state)')
     parser.add_argument('--verbose', '-v', action='store_true',
                         help='Show detailed output')
+    parser.add_argument('--no-index', action='store_true',
+                        help='Query Readwise directly instead of using the local index')
+    parser.add_argument('--full-scan', action='store_true',
+                        help='With --no-index, page through the whole archive instead of stopping at the time window')
+    parser.add_argument('--rebuild-index', action='store_true',
+                        help='Delete the local archive index and rebuild it')
+    parser.add_argument('--no-http-cache', action='store_true',
+                        help='Download every response instead of revalidating cached ones')
+    parser.add_argument('--categories', type=str,
+                        help=f'Comma-separated categories to track, fetched in parallel (default: {DEFAULT_CATEGORY}; '
+                             f'choices: {", ".join(CATEGORIES)})')
+    parser.add_argument('--goals', type=str, metavar='FILE',
+                        help='JSON goal map (tag/category/location -> goal) to post several goals in one pass')
+    parser.add_argument('--metrics', type=str, metavar='FILE',
+                        help='Write per-phase timings and HTTP metrics as JSON to FILE')
+    parser.add_argument('--prometheus', type=str, metavar='FILE',
+                        help='Write the same metrics as a Prometheus textfile to FILE')
+    parser.add_argument('--from', dest='from_date', type=str, metavar='YYYY-MM-DD',
+                        help='backfill: first day to rebuild; reconcile: first day to check (default: first datapoint)')
+    parser.add_argument('--to', dest='to_date', type=str, metavar='YYYY-MM-DD',
+                        help='backfill: last day to rebuild (default: yesterday); '
+                             'reconcile: last day to check (default: day of the last sync)')
+    parser.add_argument('--fix', action='store_true',
+                        help='reconcile: repair drifted days in Beeminder')
+    parser.add_argument('--host', type=str,
+                        help='serve: address to listen on (default: 0.0.0.0 with READWISE_WEBHOOK_SECRET set, '
+                             'otherwise 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f'serve: port to listen on (default: {DEFAULT_PORT})')
+    parser.add_argument('--debounce', type=float, default=DEFAULT_DEBOUNCE_SECONDS, metavar='SECONDS',
+                        help=f'serve: collect events this long before posting (default: {DEFAULT_DEBOUNCE_SECONDS})')
+    parser.add_argument('--reconcile-minutes', type=float, default=DEFAULT_RECONCILE_SECONDS / 60, metavar='MINUTES',
+                        help=f'serve: re-sync the index this often to catch missed events '
+                             f'(default: {DEFAULT_RECONCILE_SECONDS // 60})')
+    parser.add_argument('--days', type=int, default=14,
+                        help='stats: days shown in the daily histogram (default: 14)')
+    parser.add_argument('--weeks', type=int, default=12,
+                        help='stats: complete weeks shown and used for the weekly rate (default: 12)')
 
     return parser.parse_args()
 
@@ -270,26 +843,124 @@ Examples:
 def main():
     """Main execution function"""
     args = parse_arguments()
+    if args.no_http_cache:
+        get_client().cache = None
 
     # Use DEFAULT_TAG if no --tag specified
     tag_to_use = args.tag if args.tag else DEFAULT_TAG
+    try:
+        parse_tag_filter(tag_to_use)
+    except ValueError as e:
+        print(f"Error: Invalid --tag: {e}")
+        sys.exit(1)
+
+    categories = None
+    if args.categories:
+        categories = [c.strip() for c in args.categories.split(',') if c.strip()]
+        unknown = [c for c in categories if c not in CATEGORIES]
+        if unknown:
+            print(f"Error: Unknown categories: {', '.join(unknown)} (choices: {', '.join(CATEGORIES)})")
+            sys.exit(1)
+
+    goal_rules = None
+    if args.goals:
+        try:
+            goal_rules = load_goal_rules(args.goals)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not load goal map: {e}")
+            sys.exit(1)
+
+    if args.command in ('backfill', 'reconcile'):
+        if args.command == 'backfill' and not args.from_date:
+            print("Error: backfill needs --from YYYY-MM-DD")
+            sys.exit(1)
+        try:
+            start = parse_date(args.from_date) if args.from_date else None
+            end = parse_date(args.to_date) if args.to_date else None
+        except ValueError as e:
+            print(f"Error: Invalid date: {e}")
+            sys.exit(1)
+        if args.command == 'backfill' and end is None:
+            # Today is still being counted by the normal sync
+            end = datetime.now().date() - timedelta(days=1)
+        if start and end and start > end:
+            print("Error: --from must not be after --to")
+            sys.exit(1)
+    if args.command == 'serve' and args.no_index:
+        print("Error: serve keeps its counts in the local index and can't run with --no-index")
+        sys.exit(1)
+    if args.command == 'stats' and args.no_index:
+        print("Error: stats reads the local index and can't run with --no-index")
+        sys.exit(1)
+    if args.command == 'stats' and (args.days < 1 or args.weeks < 1):
+        print("Error: --days and --weeks must be at least 1")
+        sys.exit(1)
 
     print("=== Readwise Reader to Beeminder Sync ===")
     print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     if args.dry_run:
         print("MODE: DRY RUN (no data will be posted)")
-    if tag_to_use:
+    if goal_rules:
+        print(f"GOALS: {', '.join(rules_by_goal(goal_rules))} (from {args.goals})")
+    elif tag_to_use:
         print(f"FILTER: Only items tagged '{tag_to_use}'")
     print()
 
-    # Handle reset
-    if args.reset:
-        if STATE_FILE.exists():
-            STATE_FILE.unlink()
-            print("✓ State file reset")
+    # Without --goals the single-goal options act as a goal map for BEEMINDER_GOAL
+    rules = goal_rules or [GoalRule(BEEMINDER_GOAL, tag=tag_to_use, category=category)
+                           for category in (categories or [DEFAULT_CATEGORY])]
 
-    # Load last run time
-    last_run = load_last_run_time()
+    # Handle reset (only this run's goals and tags; other keys and posted totals are kept)
+    if args.reset:
+        try:
+            reset_state(BEEMINDER_USERNAME, state_keys(rules))
+            clear_scans('archived', account_key(READWISE_TOKEN))
+            print(f"✓ Sync state and scan checkpoints reset for {', '.join(rules_by_goal(rules))} ({STATE_DB})")
+        except sqlite3.Error as e:
+            print(f"Warning: Could not reset state: {e}")
+
+    if args.rebuild_index:
+        if INDEX_FILE.exists():
+            INDEX_FILE.unlink()
+            print("✓ Archive index reset")
+
+    if args.command == 'backfill':
+        print(f"Backfilling {start.isoformat()} to {end.isoformat()}")
+        if not run_backfill(rules, start, end, args):
+            print_http_summary()
+            write_run_metrics(args)
+            sys.exit(1)
+        print_http_summary()
+        write_run_metrics(args)
+        print("\n=== Backfill Complete ===")
+        return
+
+    if args.command == 'reconcile':
+        ok = run_reconcile(rules, start, end, args)
+        print_http_summary()
+        write_run_metrics(args)
+        if not ok:
+            sys.exit(1)
+        print("\n=== Reconcile Complete ===")
+        return
+
+    if args.command == 'serve':
+        run_serve(rules, args)
+        print_http_summary()
+        write_run_metrics(args)
+        print("\n=== Serve Stopped ===")
+        return
+
+    if args.command == 'stats':
+        run_stats(rules, args)
+        print_http_summary()
+        write_run_metrics(args)
+        print("\n=== Stats Complete ===")
+        return
+
+    # Load last run time (per goal and tag, see state_store.py)
+    keys = state_keys(rules)
+    last_run = load_last_run_time(keys)
 
     # Override with --hours if specified
     if args.hours:
@@ -302,11 +973,25 @@ def main():
         # Default to 24 hours ago for first run
         last_run = int((datetime.now() - timedelta(hours=24)).timestamp())
 
-    # Fetch archived items
-    items = get_archived_items(since_timestamp=last_run, filter_tag=tag_to_use)
+    if goal_rules:
+        if sync_goals(goal_rules, last_run, args) and not args.dry_run:
+            save_last_run_time(int(time.time()), keys)
+            print("\n✓ State saved for next run")
+        print_http_summary()
+        write_run_metrics(args)
+        print("\n=== Sync Complete ===")
+        return
+
+    # Fetch archived items (verbose mode lists every item, otherwise keep a bounded sample)
+    sample_size = None if args.verbose else SAMPLE_SIZE
+    if args.no_index:
+        count, items = get_archived_items(since_timestamp=last_run, filter_tag=tag_to_use,
+                                          sample_size=sample_size, time_window=not args.full_scan,
+                                          categories=categories)
+    else:
+        count, items = get_indexed_archived_items(since_timestamp=last_run, filter_tag=tag_to_use,
+                                                  sample_size=sample_size, categories=categories)
 
-    # Count items
-    count = len(items)
     print(f"\nItems archived since last run: {count}")
 
     # Show sample of items if any were found
@@ -319,10 +1004,9 @@ def main():
             print(f"  - {title[:60]}...")
             if args.verbose:
                 print(f"    URL: {url}")
-                tags = item.get('tags', [])
-                if tags:
-                    tag_names = [tag.get('name', tag) if isinstance(tag, dict) else tag for tag in tags]
-                    print(f"    Tags: {', '.join(tag_names)}")
+                names = tag_names(item)
+                if names:
+                    print(f"    Tags: {', '.join(names)}")
 
         if count > display_count:
             print(f"  ... and {count - display_count} more")
@@ -339,11 +1023,14 @@ def main():
 
         if success and not args.dry_run:
             # Save current timestamp as last run
-            save_last_run_time(int(time.time()))
+            save_last_run_time(int(time.time()), keys)
             print(f"\n✓ State saved for next run")
     else:
         print("\nNo new items to track")
 
+    print_http_summary()
+    write_run_metrics(args)
+
     print("\n=== Sync Complete ===")
 
 
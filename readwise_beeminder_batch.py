@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Readwise Reader to Beeminder Sync for a whole roster
+Runs the sync for every tenant in a roster file on a bounded worker pool.
+Each tenant runs as its own process with its own tokens, Beeminder user and
+HOME directory, so tenants get separate rate-limit budgets, archive indexes
+and sync state, and one tenant's failure doesn't affect the others.
+
+Usage:
+    ./readwise_beeminder_batch.py roster.json --workers 8
+    ./readwise_beeminder_batch.py roster.json --dry-run --json summary.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent
+
+# Per-tenant HOME directories (archive index, state store, goal cache, logs)
+TENANTS_DIR = Path.home() / ".readwise_beeminder_tenants"
+
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT_SECONDS = 30 * 60
+
+SCRIPTS = {
+    'sync': 'readwise_beeminder.py',
+    'total': 'readwise_beeminder_simple.py',
+}
+
+
+class Tenant:
+    """One roster entry (error is set when its tokens couldn't be resolved; it is then reported, not run)"""
+
+    def __init__(self, name, readwise_token, beeminder_user, beeminder_token, goals=None, tag=None,
+                 script='sync', args=None, error=None):
+        self.name = name
+        self.readwise_token = readwise_token
+        self.beeminder_user = beeminder_user
+        self.beeminder_token = beeminder_token
+        self.goals = goals or []
+        self.tag = tag
+        self.script = script
+        self.args = args or []
+        self.error = error
+
+
+def _secret(entry, key, name):
+    """A token given inline (key) or through an environment variable (key + '_env')"""
+    if entry.get(key):
+        return entry[key]
+    env_name = entry.get(f'{key}_env')
+    if env_name:
+        value = os.environ.get(env_name)
+        if not value:
+            raise ValueError(f"Tenant '{name}': environment variable {env_name} is not set")
+        return value
+    raise ValueError(f"Tenant '{name}' needs '{key}' or '{key}_env'")
+
+
+def load_roster(path):
+    """
+    Load tenants from a JSON roster (see roster.example.json)
+
+    Returns:
+        List of Tenant
+
+    Raises:
+        ValueError: If the roster is malformed
+    """
+    with open(path, 'r') as f:
+        config = json.load(f)
+
+    entries = config.get('tenants', []) if isinstance(config, dict) else config
+    if not entries:
+        raise ValueError(f"No tenants defined in {path}")
+
+    tenants = []
+    names = set()
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get('name'):
+            raise ValueError(f"Each tenant needs a 'name': {entry!r}")
+        name = entry['name']
+        if name in names or not name.replace('-', '').replace('_', '').isalnum():
+            raise ValueError(f"Tenant names must be unique and alphanumeric (with - or _): {name!r}")
+        names.add(name)
+
+        script = entry.get('script', 'sync')
+        if script not in SCRIPTS:
+            raise ValueError(f"Tenant '{name}': unknown script {script!r} (choices: {', '.join(SCRIPTS)})")
+        goals = entry.get('goals') or []
+        if isinstance(goals, str):
+            goals = [{'goal': goals, 'tag': entry.get('tag')}]
+        if not all(isinstance(rule, dict) and rule.get('goal') for rule in goals):
+            raise ValueError(f"Tenant '{name}': each goal needs a 'goal' slug")
+
+        # A missing token only fails its own tenant
+        readwise_token = beeminder_token = error = None
+        try:
+            readwise_token = _secret(entry, 'readwise_token', name)
+            beeminder_token = _secret(entry, 'beeminder_token', name)
+        except ValueError as e:
+            error = str(e)
+
+        tenants.append(Tenant(
+            name,
+            readwise_token,
+            entry.get('beeminder_user') or name,
+            beeminder_token,
+            goals=goals,
+            tag=entry.get('tag'),
+            script=script,
+            args=[str(arg) for arg in entry.get('args', [])],
+            error=error,
+        ))
+    return tenants
+
+
+def tenant_command(tenant, home, dry_run=False):
+    """
+    Command line and environment for one tenant's run
+
+    A roster entry with one goal runs like a single-goal sync; several goals
+    are written to a goal map in the tenant's HOME and passed with --goals.
+    """
+    metrics_path = home / 'metrics.json'
+    command = [sys.executable, str(REPO_ROOT / SCRIPTS[tenant.script]), '--metrics', str(metrics_path)]
+    env = dict(os.environ,
+               HOME=str(home),
+               READWISE_TOKEN=tenant.readwise_token,
+               BEEMINDER_TOKEN=tenant.beeminder_token,
+               BEEMINDER_USERNAME=tenant.beeminder_user,
+               PYTHONUNBUFFERED='1')
+
+    # A lone goal with at most a tag doesn't need a goal map
+    if len(tenant.goals) == 1 and not set(tenant.goals[0]) - {'goal', 'tag'}:
+        env['BEEMINDER_GOAL'] = tenant.goals[0]['goal']
+        tag = tenant.goals[0].get('tag') or tenant.tag
+        if tag:
+            command.append(f'--tag={tag}')
+    elif tenant.goals:
+        goals_path = home / 'goals.json'
+        with open(goals_path, 'w') as f:
+            json.dump({'goals': tenant.goals}, f, indent=2)
+        command += ['--goals', str(goals_path)]
+    elif tenant.tag:
+        command.append(f'--tag={tenant.tag}')
+
+    if dry_run:
+        command.append('--dry-run')
+    return command + tenant.args, env, metrics_path
+
+
+def run_tenant(tenant, tenants_dir, dry_run=False, timeout=DEFAULT_TIMEOUT_SECONDS):
+    """
+    Run one tenant's sync to completion; never raises
+
+    Returns:
+        Result dict (status, exit code, wall seconds, request/retry counts, log path)
+    """
+    home = Path(tenants_dir) / tenant.name
+    log_path = home / 'last_run.log'
+    result = {'tenant': tenant.name, 'user': tenant.beeminder_user, 'script': tenant.script,
+              'goals': [rule['goal'] for rule in tenant.goals], 'log': str(log_path)}
+    start = time.perf_counter()
+    metrics_path = None
+    try:
+        if tenant.error:
+            raise ValueError(tenant.error)
+        home.mkdir(parents=True, exist_ok=True)
+        command, env, run_metrics = tenant_command(tenant, home, dry_run)
+        if run_metrics.exists():
+            run_metrics.unlink()
+        metrics_path = run_metrics
+        with open(log_path, 'w') as log:
+            process = subprocess.run(command, cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+                                     timeout=timeout)
+        result['exit_code'] = process.returncode
+        result['status'] = 'ok' if process.returncode == 0 else 'failed'
+    except subprocess.TimeoutExpired:
+        result['exit_code'] = None
+        result['status'] = 'timeout'
+    except Exception as e:
+        result['exit_code'] = None
+        result['status'] = 'error'
+        result['error'] = str(e)
+    result['wall_seconds'] = round(time.perf_counter() - start, 3)
+
+    if metrics_path is None:
+        # The tenant never ran, so any metrics file in its HOME is from an earlier run
+        return result
+    try:
+        with open(metrics_path, 'r') as f:
+            http = json.load(f).get('http', {})
+        result['requests'] = http.get('requests', 0)
+        result['retries'] = http.get('retries', 0)
+        result['rate_limited'] = http.get('rate_limited', 0)
+    except (OSError, ValueError):
+        pass
+    return result
+
+
+def run_roster(tenants, workers=DEFAULT_WORKERS, tenants_dir=TENANTS_DIR, dry_run=False,
+               timeout=DEFAULT_TIMEOUT_SECONDS):
+    """
+    Run every tenant on a pool of at most `workers` concurrent processes
+
+    Returns:
+        List of result dicts in roster order
+    """
+    def run(tenant):
+        result = run_tenant(tenant, tenants_dir, dry_run, timeout)
+        marker = '✓' if result['status'] == 'ok' else '✗'
+        print(f"{marker} {tenant.name}: {result['status']} ({result['wall_seconds']:.1f}s)", flush=True)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(run, tenants))
+
+
+def print_summary(results):
+    """Print the per-tenant results as an aligned table"""
+    width = max([len('tenant')] + [len(r['tenant']) for r in results])
+    header = (f"{'tenant':<{width}} {'script':<6} {'status':<8} {'wall (s)':>9} {'requests':>9} "
+              f"{'retries':>8} {'429s':>5}  goals")
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['tenant']:<{width}} {r['script']:<6} {r['status']:<8} {r['wall_seconds']:>9.2f} "
+              f"{r.get('requests', '-'):>9} {r.get('retries', '-'):>8} {r.get('rate_limited', '-'):>5}  "
+              f"{', '.join(r['goals']) or '(default)'}")
+    failed = [r for r in results if r['status'] != 'ok']
+    print(f"\n{len(results) - len(failed)} of {len(results)} tenants succeeded")
+    for r in failed:
+        detail = r.get('error') or f"see {r['log']}"
+        print(f"  ✗ {r['tenant']}: {r['status']} - {detail}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the Readwise to Beeminder sync for every tenant in a roster')
+    parser.add_argument('roster', help='JSON roster of tenants (see roster.example.json)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Tenants to run at once (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--dry-run', action='store_true', help='Pass --dry-run to every tenant')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT_SECONDS, metavar='SECONDS',
+                        help=f'Stop a tenant after this long (default: {DEFAULT_TIMEOUT_SECONDS})')
+    parser.add_argument('--tenants-dir', type=str, default=str(TENANTS_DIR),
+                        help=f'Directory holding each tenant\'s state and logs (default: {TENANTS_DIR})')
+    parser.add_argument('--only', type=str, help='Comma-separated tenant names to run')
+    parser.add_argument('--json', type=str, metavar='FILE', help='Also write the results as JSON to FILE')
+    args = parser.parse_args()
+
+    try:
+        tenants = load_roster(args.roster)
+    except (OSError, ValueError) as e:
+        print(f"Error: Could not load roster: {e}")
+        sys.exit(1)
+
+    if args.only:
+        selected = {name.strip() for name in args.only.split(',') if name.strip()}
+        unknown = selected - {tenant.name for tenant in tenants}
+        if unknown:
+            print(f"Error: Unknown tenants: {', '.join(sorted(unknown))}")
+            sys.exit(1)
+        tenants = [tenant for tenant in tenants if tenant.name in selected]
+
+    print("=== Readwise Reader to Beeminder Batch Sync ===")
+    print(f"Tenants: {len(tenants)}, workers: {args.workers}" + (" (DRY RUN)" if args.dry_run else ""))
+    print()
+
+    start = time.perf_counter()
+    results = run_roster(tenants, args.workers, args.tenants_dir, args.dry_run, args.timeout)
+    wall = time.perf_counter() - start
+
+    print()
+    print_summary(results)
+    print(f"Wall time: {wall:.1f}s")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'wall_seconds': round(wall, 3), 'results': results}, f, indent=2)
+        print(f"✓ Results written to {args.json}")
+
+    if any(r['status'] != 'ok' for r in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
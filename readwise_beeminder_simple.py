@@ -6,158 +6,224 @@ Posts once per day - counts items archived TODAY with the specified tag
 
 import os
 import sys
+import sqlite3
+import asyncio
 import argparse
 from datetime import datetime, timedelta
-import requests
+
+from http_client import get_client, beeminder_params, print_http_summary, write_run_metrics
+from metrics import get_metrics, timed
+from archive_index import open_index, sync_index, count_archived, count_goal, list_archived
+from state_store import get_last_total as get_stored_total, set_last_total
+from readwise_api import (
+    CATEGORIES, count_documents, count_and_sample, iter_documents, iter_documents_by_category, has_tag,
+    sample_record,
+)
+from documents import add_details
+from async_engine import AsyncHttpClient, scan_documents_async
+from beeminder_state import fetch_goal_state, goal_state_request, goal_state_from_response
+from goal_map import load_goal_rules, shared_list_params, count_by_goal, matching_goals, rules_by_goal
+from tag_index import parse_tag_filter
+from checkpoint import ScanCheckpoint, account_key, scan_key
 
 # Configuration
 READWISE_TOKEN = os.environ.get("READWISE_TOKEN")
-BEEMINDER_USERNAME = "kyle"
-BEEMINDER_GOAL = "learning"
+BEEMINDER_USERNAME = os.environ.get("BEEMINDER_USERNAME", "kyle")
+BEEMINDER_GOAL = os.environ.get("BEEMINDER_GOAL", "learning")
 BEEMINDER_AUTH_TOKEN = os.environ.get("BEEMINDER_TOKEN")
 DEFAULT_TAG = "learning"
 
-READWISE_API_BASE = "https://readwise.io/api/v3"
-BEEMINDER_API_BASE = "https://www.beeminder.com/api/v1"
+READWISE_API_BASE = os.environ.get("READWISE_API_BASE", "https://readwise.io/api/v3")
+BEEMINDER_API_BASE = os.environ.get("BEEMINDER_API_BASE", "https://www.beeminder.com/api/v1")
+
+
+# Goal state loaded this run, shared by every Beeminder read (one request per goal)
+_goal_states = {}
+
 
+@timed('lookup')
+def get_goal_state(goal=None):
+    """
+    Load a goal's Beeminder state once per run (see beeminder_state.py)
 
-def already_posted_today():
-    """Check if we've already posted to Beeminder today (in Beeminder's timezone)"""
+    Raises:
+        Exception: If Beeminder can't be reached; callers decide how to degrade
+    """
+    goal = goal or BEEMINDER_GOAL
+    if goal not in _goal_states:
+        _goal_states[goal] = fetch_goal_state(BEEMINDER_USERNAME, goal, BEEMINDER_AUTH_TOKEN, BEEMINDER_API_BASE)
+    return _goal_states[goal]
+
+
+def already_posted_today(goal=None):
+    """Check if we've already posted to Beeminder today (in the goal's timezone and deadline)"""
     if not BEEMINDER_AUTH_TOKEN:
         return False
 
     try:
-        # Get goal info to find timezone
-        goal_url = f"{BEEMINDER_API_BASE}/users/{BEEMINDER_USERNAME}/goals/{BEEMINDER_GOAL}.json"
-        goal_params = {'auth_token': BEEMINDER_AUTH_TOKEN}
-        goal_response = requests.get(goal_url, params=goal_params)
-
-        # Get timezone offset from goal (defaults to UTC if not found)
-        goal_data = goal_response.json() if goal_response.status_code == 200 else {}
-        # Beeminder uses 'timezone' field like 'America/Los_Angeles'
-        # For simplicity, we'll just check the last few datapoints instead
-
-        url = f"{BEEMINDER_API_BASE}/users/{BEEMINDER_USERNAME}/goals/{BEEMINDER_GOAL}/datapoints.json"
-        params = {'auth_token': BEEMINDER_AUTH_TOKEN, 'count': 5, 'sort': 'id'}
-        response = requests.get(url, params=params)
-
-        if response.status_code == 200:
-            datapoints = response.json()
-
-            # Check the most recent datapoints for our signature
-            # Don't rely on daystamp matching since timezones differ
-            for dp in datapoints:
-                comment = dp.get('comment', '')
-                timestamp = dp.get('timestamp', 0)
-
-                # Check if this was posted in the last 20 hours AND has our signature
-                # This handles timezone differences (24h - 4h buffer = 20h)
-                hours_ago = (datetime.now().timestamp() - timestamp) / 3600
-
-                if hours_ago < 20 and 'Total archived items with tag' in comment:
-                    print(f"Found recent post ({hours_ago:.1f}h ago): {comment}")
-                    return True
+        state = get_goal_state(goal)
+        if state.posted_today():
+            record = state.last_total_record()
+            print(f"Found post from today: Total: {record.total}")
+            return True
         return False
     except Exception as e:
         print(f"Warning checking duplicates: {e}")
         return False
 
 
-def get_total_archived_items(filter_tag=None):
-    """Get TOTAL count of all archived items with the tag (not just today)"""
+@timed('fetch')
+def get_indexed_archive_total(filter_tag=None, sample_size=5, categories=None):
+    """
+    Get TOTAL count of archived items with the tag from the local archive index
+
+    The index is synced with an updatedAfter delta first, so only documents
+    changed since the last run are fetched from Readwise.
+
+    Returns:
+        (total count, list of the most recent items up to sample_size)
+    """
     if not READWISE_TOKEN:
         print("Error: READWISE_TOKEN not set")
         sys.exit(1)
 
-    headers = {'Authorization': f'Token {READWISE_TOKEN}'}
-    params = {'location': 'archive'}
-
     try:
-        print(f"Fetching all archived items...")
-        all_items = []
-        next_cursor = None
+        conn = open_index()
+        try:
+            sync_index(conn, READWISE_TOKEN, api_base=READWISE_API_BASE)
+            total = count_archived(conn, filter_tag=filter_tag, category=categories)
+            sample = list_archived(conn, filter_tag=filter_tag, category=categories, limit=sample_size)
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
-        while True:
-            if next_cursor:
-                params['pageCursor'] = next_cursor
+    return total, sample
 
-            response = requests.get(f"{READWISE_API_BASE}/list/", headers=headers, params=params)
-            response.raise_for_status()
-            data = response.json()
 
-            all_items.extend(data.get('results', []))
-            next_cursor = data.get('nextPageCursor')
-            if not next_cursor:
-                break
+@timed('fetch')
+def get_total_archived_items(filter_tag=None, sample_size=5, categories=None):
+    """
+    Get TOTAL count of all archived items with the tag (not just today)
 
-            print(f"Fetched {len(all_items)} items so far...")
+    Streams the archive page by page, filtering inline and keeping only a
+    bounded sample of matching items. With categories, each category is paged
+    as its own cursor chain in parallel (not checkpointed).
 
-        print(f"✓ Found {len(all_items)} total archived items")
+    Returns:
+        (total count, list of the first items up to sample_size)
+    """
+    if not READWISE_TOKEN:
+        print("Error: READWISE_TOKEN not set")
+        sys.exit(1)
 
-        # Filter by tag
+    params = {'location': 'archive'}
+    predicates = [has_tag(filter_tag)] if filter_tag else []
+
+    try:
+        print(f"Fetching all archived items...")
+        scanned = [0]
+
+        def report_progress(count):
+            scanned[0] = count
+            print(f"Fetched {count} items so far...")
+
+        if categories:
+            documents = iter_documents_by_category(READWISE_TOKEN, categories, params, predicates=predicates,
+                                                   api_base=READWISE_API_BASE, on_page=report_progress,
+                                                   details=sample_size)
+            total, sample = count_and_sample(documents, sample_size)
+            sample = [sample_record(record) for record in sample]
+        else:
+            # Progress is checkpointed after every page so an interrupted scan resumes where it stopped
+            checkpoint = ScanCheckpoint(scan_key('total', account_key(READWISE_TOKEN), params, filter_tag, sample_size))
+            total, sample = count_documents(READWISE_TOKEN, params, predicates=predicates,
+                                            sample_size=sample_size, api_base=READWISE_API_BASE,
+                                            on_page=report_progress, checkpoint=checkpoint)
+
+        print(f"✓ Found {scanned[0]} total archived items")
         if filter_tag:
-            filtered = []
-            for item in all_items:
-                tags = item.get('tags', [])
-                tag_names = [tag.get('name', tag) if isinstance(tag, dict) else tag for tag in tags]
-                if filter_tag in tag_names:
-                    filtered.append(item)
-            print(f"✓ Filtered to {len(filtered)} items with tag '{filter_tag}'")
-            return filtered
+            print(f"✓ Filtered to {total} items with tag '{filter_tag}'")
 
-        return all_items
+        return total, sample
 
     except Exception as e:
         print(f"Error: {e}")
         sys.exit(1)
 
 
-def get_last_total_from_beeminder():
+def get_last_total_from_beeminder(goal=None):
     """Get the last total count we posted to Beeminder"""
     if not BEEMINDER_AUTH_TOKEN:
         return 0
 
     try:
-        url = f"{BEEMINDER_API_BASE}/users/{BEEMINDER_USERNAME}/goals/{BEEMINDER_GOAL}/datapoints.json"
-        params = {'auth_token': BEEMINDER_AUTH_TOKEN, 'count': 10, 'sort': 'id'}
-        response = requests.get(url, params=params)
-
-        if response.status_code == 200:
-            datapoints = response.json()
-            # Find most recent datapoint with our signature
-            # API returns most recent first when sort=id, so iterate normally
-            for dp in datapoints:  # Most recent first
-                comment = dp.get('comment', '')
-                if 'Total:' in comment:
-                    # Extract total from comment like "Total: 5 (+2 new)"
-                    try:
-                        total = int(comment.split('Total:')[1].split()[0])
-                        return total
-                    except:
-                        pass
-        return 0
+        return get_goal_state(goal).last_total()
     except Exception as e:
         print(f"Warning: Could not get last total: {e}")
         return 0
 
 
-def post_to_beeminder(current_total, dry_run=False):
-    """Post the DIFFERENCE (new items) to Beeminder"""
-    if not BEEMINDER_AUTH_TOKEN:
-        print("Error: BEEMINDER_TOKEN not set")
-        sys.exit(1)
+def goal_filter(rules, goal):
+    """State store tag key for a goal fed by goal map rules"""
+    return '; '.join(rule.describe() for rule in rules if rule.goal == goal)
 
-    # Get last total we posted
-    last_total = get_last_total_from_beeminder()
-    difference = current_total - last_total
 
-    url = f"{BEEMINDER_API_BASE}/users/{BEEMINDER_USERNAME}/goals/{BEEMINDER_GOAL}/datapoints.json"
+def get_recorded_total(goal=None, tag=None):
+    """Total last posted for the goal and tag filter according to the state store (None if not recorded)"""
+    try:
+        return get_stored_total(BEEMINDER_USERNAME, goal or BEEMINDER_GOAL, tag)
+    except sqlite3.Error as e:
+        print(f"Warning: Could not read posted total from state store: {e}")
+        return None
+
+
+def record_posted_total(goal, tag, total):
+    """Remember a successfully posted total in the state store"""
+    try:
+        set_last_total(BEEMINDER_USERNAME, goal or BEEMINDER_GOAL, tag, total)
+    except sqlite3.Error as e:
+        print(f"Warning: Could not record posted total in state store: {e}")
+
+
+def get_last_total(goal=None, tag=None):
+    """
+    Last total posted to the goal
+
+    The total recorded in the state store is used when there is one; the
+    'Total: N' comment of the last Beeminder datapoint is only a fallback
+    (first run, or a filter the state store hasn't seen).
+    """
+    recorded = get_recorded_total(goal, tag)
+    if recorded is not None:
+        return recorded
+    return get_last_total_from_beeminder(goal)
+
+
+def plan_post(current_total, last_total):
+    """
+    Print the totals and work out the datapoint to post
+
+    Returns:
+        (difference, comment)
+    """
+    difference = current_total - last_total
     comment = f"Total: {current_total} (+{difference} new)"
 
     print(f"Last total: {last_total}")
     print(f"Current total: {current_total}")
     print(f"Difference (new items): {difference}")
+    return difference, comment
+
 
+def report_post(goal, difference, comment, dry_run=False, status=None, text=None, error=None):
+    """
+    Print the outcome of posting (or skipping) a difference datapoint
+
+    Returns:
+        True if nothing needed posting or the post succeeded
+    """
     # Skip posting if difference is 0
     if difference == 0:
         print("No new items to post - skipping")
@@ -168,44 +234,322 @@ def post_to_beeminder(current_total, dry_run=False):
         print(f"[DRY RUN] Comment: {comment}")
         return True
 
+    if error is not None:
+        print(f"Error: {error}")
+        return False
+    if status == 200:
+        print(f"✓ Posted {difference} new items to Beeminder goal '{goal}'")
+        return True
+    print(f"✗ Error: {status} - {text}")
+    return False
+
+
+def difference_datapoint(difference, comment):
+    """Form data for a difference datapoint"""
+    return beeminder_params(BEEMINDER_AUTH_TOKEN, {
+        'value': difference,  # Post the difference, not the total
+        'comment': comment
+    })
+
+
+def post_to_beeminder(current_total, dry_run=False, goal=None, tag=None):
+    """Post the DIFFERENCE (new items) to Beeminder (recording the new total in the state store on success)"""
+    if not BEEMINDER_AUTH_TOKEN:
+        print("Error: BEEMINDER_TOKEN not set")
+        sys.exit(1)
+    goal = goal or BEEMINDER_GOAL
+
+    # Get last total we posted
+    last_total = get_last_total(goal, tag)
+    difference, comment = plan_post(current_total, last_total)
+
+    if difference == 0 or dry_run:
+        return report_post(goal, difference, comment, dry_run)
+
+    url = f"{BEEMINDER_API_BASE}/users/{BEEMINDER_USERNAME}/goals/{goal}/datapoints.json"
     try:
-        data = {
-            'auth_token': BEEMINDER_AUTH_TOKEN,
-            'value': difference,  # Post the difference, not the total
-            'comment': comment
-        }
-        response = requests.post(url, data=data)
-
-        if response.status_code == 200:
-            print(f"✓ Posted {difference} new items to Beeminder")
-            return True
-        else:
-            print(f"✗ Error: {response.status_code} - {response.text}")
-            return False
+        with get_metrics().phase('post'):
+            response = get_client().post(url, data=difference_datapoint(difference, comment))
+    except Exception as e:
+        return report_post(goal, difference, comment, error=e)
+    posted = report_post(goal, difference, comment, status=response.status_code, text=response.text)
+    if posted:
+        record_posted_total(goal, tag, current_total)
+    return posted
+
+
+@timed('fetch')
+def get_goal_totals(rules, use_index=True):
+    """
+    Get TOTAL archived counts for every goal rule from a single Readwise pass
+
+    Returns:
+        Dict of goal slug -> total count
+    """
+    if not READWISE_TOKEN:
+        print("Error: READWISE_TOKEN not set")
+        sys.exit(1)
+
+    try:
+        if use_index:
+            conn = open_index()
+            try:
+                sync_index(conn, READWISE_TOKEN, api_base=READWISE_API_BASE)
+                totals = {goal: count_goal(conn, goal_rules) for goal, goal_rules in rules_by_goal(rules).items()}
+            finally:
+                conn.close()
+            return totals
+
+        print(f"Fetching all archived items for {len(rules)} goals...")
+        documents = iter_documents(READWISE_TOKEN, shared_list_params(rules), api_base=READWISE_API_BASE,
+                                   on_page=lambda n: print(f"Fetched {n} items so far..."))
+        return count_by_goal(documents, rules)
+
     except Exception as e:
         print(f"Error: {e}")
-        return False
+        sys.exit(1)
+
+
+@timed('lookup')
+async def fetch_last_total_async(client, goal):
+    """
+    Async get_last_total_from_beeminder (same single goal-state request, skipped if this run already loaded it)
+
+    Returns:
+        (last total, warning to print or None)
+    """
+    if goal in _goal_states:
+        return _goal_states[goal].last_total(), None
+    url, params, metadata = goal_state_request(BEEMINDER_USERNAME, goal, BEEMINDER_AUTH_TOKEN, BEEMINDER_API_BASE)
+    try:
+        payload = await client.get_json(url, params=params)
+        state = goal_state_from_response(BEEMINDER_USERNAME, goal, payload, metadata)
+        _goal_states[goal] = state
+        return state.last_total(), None
+    except Exception as e:
+        return 0, f"Warning: Could not get last total: {e}"
+
+
+@timed('post')
+async def post_difference_async(client, goal, difference, comment):
+    """Post a difference datapoint; returns keyword arguments for report_post"""
+    url = f"{BEEMINDER_API_BASE}/users/{BEEMINDER_USERNAME}/goals/{goal}/datapoints.json"
+    try:
+        status, body = await client.request('POST', url, data=difference_datapoint(difference, comment))
+    except Exception as e:
+        return {'error': e}
+    return {'status': status, 'text': body}
+
+
+@timed('fetch')
+async def count_totals_async(client, tag, categories, goal_rules, use_index):
+    """
+    Async Readwise counting for --async runs (same output as the sync functions)
+
+    The index path runs the regular index sync on a worker thread; the scan
+    path pages Readwise with the async client.
+
+    Returns:
+        Dict of goal slug -> total with goal_rules, otherwise (total, sample)
+    """
+    if use_index:
+        if goal_rules:
+            return await asyncio.to_thread(get_goal_totals, goal_rules, True)
+        return await asyncio.to_thread(get_indexed_archive_total, tag, 5, categories)
+
+    if not READWISE_TOKEN:
+        print("Error: READWISE_TOKEN not set")
+        sys.exit(1)
+
+    def report_progress(count):
+        print(f"Fetched {count} items so far...")
+
+    try:
+        if goal_rules:
+            print(f"Fetching all archived items for {len(goal_rules)} goals...")
+            totals = {rule.goal: 0 for rule in goal_rules}
+
+            def count_for_goals(record, item):
+                for goal in matching_goals(goal_rules, record):
+                    totals[goal] += 1
+
+            await scan_documents_async(client, READWISE_TOKEN, [shared_list_params(goal_rules)], count_for_goals,
+                                       api_base=READWISE_API_BASE, on_page=report_progress)
+            return totals
+
+        print("Fetching all archived items...")
+        params = {'location': 'archive'}
+        chains = [dict(params, category=category) for category in categories] if categories else [params]
+        total = 0
+        sample = []
+
+        matches_tag = has_tag(tag) if tag else None
+
+        def count_item(record, item):
+            nonlocal total
+            if matches_tag and not matches_tag(record):
+                return
+            total += 1
+            if len(sample) < 5:
+                sample.append(sample_record(add_details(record, item)))
+
+        scanned = await scan_documents_async(client, READWISE_TOKEN, chains, count_item,
+                                             api_base=READWISE_API_BASE, on_page=report_progress)
+        print(f"✓ Found {scanned} total archived items")
+        if tag:
+            print(f"✓ Filtered to {total} items with tag '{tag}'")
+        return total, sample
+
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+async def run_async(args, tag, categories, goal_rules):
+    """
+    Asyncio version of the sync pipeline (--async)
+
+    Beeminder last-total lookups for every goal start immediately and overlap
+    Readwise paging; posts to several goals are sent concurrently. Output is
+    printed in the same order as the sync path.
+    """
+    async with AsyncHttpClient(scheduler=get_client().scheduler, cache=get_client().cache) as client:
+        goals = list(rules_by_goal(goal_rules)) if goal_rules else [BEEMINDER_GOAL]
+        lookups = {}
+        if BEEMINDER_AUTH_TOKEN:
+            lookups = {goal: asyncio.ensure_future(fetch_last_total_async(client, goal)) for goal in goals}
+
+        result = await count_totals_async(client, tag, categories, goal_rules, use_index=not args.no_index)
+
+        if goal_rules:
+            totals = result
+            blocks = [(f"\n== {goal} [{goal_filter(goal_rules, goal)}] ==", goal, totals[goal])
+                      for goal in rules_by_goal(goal_rules)]
+            filters = {goal: goal_filter(goal_rules, goal) for goal in totals}
+        else:
+            total_count, items = result
+            print(f"\nTotal archived items with tag '{tag}': {total_count}")
+            if total_count > 0:
+                print("\nMost recent items:")
+                for item in items[:5]:
+                    print(f"  - {item.get('title', 'Untitled')[:60]}...")
+                if total_count > 5:
+                    print(f"  ... and {total_count - 5} more")
+            blocks = [("", BEEMINDER_GOAL, total_count)]
+            filters = {BEEMINDER_GOAL: tag}
+
+        if not BEEMINDER_AUTH_TOKEN:
+            print(blocks[0][0])
+            print("Error: BEEMINDER_TOKEN not set")
+            sys.exit(1)
+
+        last_totals = {goal: await lookup for goal, lookup in lookups.items()}
+        for goal in last_totals:
+            recorded = get_recorded_total(goal, filters[goal])
+            if recorded is not None:
+                last_totals[goal] = (recorded, None)
+
+        # Send every needed post at once, then report in order
+        posts = {}
+        for _, goal, current_total in blocks:
+            difference = current_total - last_totals[goal][0]
+            if difference != 0 and not args.dry_run and goal not in posts:
+                comment = f"Total: {current_total} (+{difference} new)"
+                posts[goal] = asyncio.ensure_future(post_difference_async(client, goal, difference, comment))
+        outcomes = {goal: await post for goal, post in posts.items()}
+
+        for header, goal, current_total in blocks:
+            print(header)
+            last_total, warning = last_totals[goal]
+            if warning:
+                print(warning)
+            difference, comment = plan_post(current_total, last_total)
+            outcome = outcomes.get(goal, {})
+            posted = report_post(goal, difference, comment, args.dry_run, **outcome)
+            if posted and outcome.get('status') == 200:
+                record_posted_total(goal, filters[goal], current_total)
 
 
 def main():
     parser = argparse.ArgumentParser(description='Readwise total count to Beeminder')
     parser.add_argument('--dry-run', action='store_true', help='Test mode')
-    parser.add_argument('--tag', type=str, help=f'Tag to filter (default: {DEFAULT_TAG})')
+    parser.add_argument('--tag', type=str, help=f'Tag or tag expression to filter, e.g. "learning,-fiction" (default: {DEFAULT_TAG})')
     parser.add_argument('--force', action='store_true', help='Post even if already posted today')
+    parser.add_argument('--no-index', action='store_true', help='Scan the full archive instead of using the local index')
+    parser.add_argument('--no-http-cache', action='store_true',
+                        help='Download every response instead of revalidating cached ones')
+    parser.add_argument('--goals', type=str, metavar='FILE', help='JSON goal map to post several goals in one pass')
+    parser.add_argument('--categories', type=str,
+                        help=f'Comma-separated categories to count, fetched in parallel ({", ".join(CATEGORIES)})')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='Overlap Readwise paging, Beeminder lookups and posts with asyncio (requires aiohttp)')
+    parser.add_argument('--metrics', type=str, metavar='FILE',
+                        help='Write per-phase timings and HTTP metrics as JSON to FILE')
+    parser.add_argument('--prometheus', type=str, metavar='FILE',
+                        help='Write the same metrics as a Prometheus textfile to FILE')
     args = parser.parse_args()
+    if args.no_http_cache:
+        get_client().cache = None
 
     tag = args.tag or DEFAULT_TAG
+    try:
+        parse_tag_filter(tag)
+    except ValueError as e:
+        print(f"Error: Invalid --tag: {e}")
+        sys.exit(1)
+
+    categories = None
+    if args.categories:
+        categories = [c.strip() for c in args.categories.split(',') if c.strip()]
+        unknown = [c for c in categories if c not in CATEGORIES]
+        if unknown:
+            print(f"Error: Unknown categories: {', '.join(unknown)}")
+            sys.exit(1)
+
+    goal_rules = None
+    if args.goals:
+        try:
+            goal_rules = load_goal_rules(args.goals)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not load goal map: {e}")
+            sys.exit(1)
 
     print("=== Readwise Reader to Beeminder (Total Count) ===")
     print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     if args.dry_run:
         print("MODE: DRY RUN")
-    print(f"FILTER: Tag '{tag}'")
+    if goal_rules:
+        print(f"GOALS: {', '.join(rules_by_goal(goal_rules))} (from {args.goals})")
+    else:
+        print(f"FILTER: Tag '{tag}'")
     print()
 
+    if args.use_async:
+        try:
+            asyncio.run(run_async(args, tag, categories, goal_rules))
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print_http_summary()
+        write_run_metrics(args)
+        print("\n=== Sync Complete ===")
+        return
+
+    if goal_rules:
+        totals = get_goal_totals(goal_rules, use_index=not args.no_index)
+        for goal in rules_by_goal(goal_rules):
+            print(f"\n== {goal} [{goal_filter(goal_rules, goal)}] ==")
+            post_to_beeminder(totals[goal], dry_run=args.dry_run, goal=goal, tag=goal_filter(goal_rules, goal))
+        print_http_summary()
+        write_run_metrics(args)
+        print("\n=== Sync Complete ===")
+        return
+
     # Get ALL archived items with tag
-    items = get_total_archived_items(filter_tag=tag)
-    total_count = len(items)
+    if args.no_index:
+        total_count, items = get_total_archived_items(filter_tag=tag, categories=categories)
+    else:
+        total_count, items = get_indexed_archive_total(filter_tag=tag, categories=categories)
 
     print(f"\nTotal archived items with tag '{tag}': {total_count}")
 
@@ -220,7 +564,10 @@ def main():
     # Note: This will post every time it runs. Rely on cron schedule (once daily) to prevent duplicates.
     # Goal should use 'last' aggregation so only the final value of the day counts.
     print()
-    post_to_beeminder(total_count, dry_run=args.dry_run)
+    post_to_beeminder(total_count, dry_run=args.dry_run, tag=tag)
+
+    print_http_summary()
+    write_run_metrics(args)
 
     print("\n=== Sync Complete ===")
 
@@ -0,0 +1,209 @@
+"""
+Beeminder reconciliation
+Compares what a goal's datapoints add up to on each Beeminder day with the
+number of items Readwise says were archived that day, and repairs the days
+that drifted (manual edits, deleted datapoints, double runs). Datapoints are
+paged newest day first and paging stops at the start of the range; repairs
+go through create_all in batches, adjusting one managed datapoint per
+goal-day (the same requestid backfill uses), so a repair costs O(days)
+requests however many datapoints the goal has.
+"""
+
+from backfill import BACKFILL_BATCH_SIZE, request_id, submit_datapoints
+from http_client import get_client, beeminder_params
+
+# Datapoints fetched per page of the goal's history
+DATAPOINTS_PER_PAGE = 300
+
+
+class DayDrift:
+    """
+    One Beeminder day whose datapoints don't add up to the Readwise count
+
+    managed is the goal-day's managed datapoint (requestid from backfill.request_id)
+    if it already exists; the repair sets it so the day sums to expected.
+    """
+
+    __slots__ = ('daystamp', 'posted', 'expected', 'managed')
+
+    def __init__(self, daystamp, posted, expected, managed=None):
+        self.daystamp = daystamp
+        self.posted = posted
+        self.expected = expected
+        self.managed = managed
+
+    @property
+    def difference(self):
+        """Items missing from Beeminder (negative: posted too many)"""
+        return self.expected - self.posted
+
+    def corrected_value(self):
+        """Value the managed datapoint needs for the day to sum to expected"""
+        managed_value = _value(self.managed) if self.managed else 0
+        return self.expected - (self.posted - managed_value)
+
+    def __repr__(self):
+        return f"DayDrift({self.daystamp}, posted={self.posted:g}, expected={self.expected})"
+
+
+def _value(datapoint):
+    try:
+        return float(datapoint.get('value') or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def fetch_datapoints(username, goal, auth_token, api_base, since_daystamp=None, per_page=DATAPOINTS_PER_PAGE,
+                     client=None):
+    """
+    Page through a goal's datapoints, newest day first
+
+    Args:
+        username: Beeminder username
+        goal: Goal slug
+        auth_token: Beeminder auth token
+        api_base: Beeminder API base URL
+        since_daystamp: Stop once a page reaches days before this YYYYMMDD (None fetches the whole history)
+        per_page: Datapoints per request
+        client: HttpClient to use (defaults to the shared pooled client)
+
+    Returns:
+        List of datapoint dicts (those before since_daystamp may be included)
+
+    Raises:
+        requests.exceptions.RequestException: On network errors or a non-200 response
+    """
+    client = client or get_client()
+    url = f"{api_base}/users/{username}/goals/{goal}/datapoints.json"
+    datapoints = []
+    page = 1
+    while True:
+        params = beeminder_params(auth_token, {'sort': 'daystamp', 'page': page, 'per': per_page})
+        response = client.get(url, params=params)
+        response.raise_for_status()
+        batch = response.json() or []
+        datapoints.extend(batch)
+        if len(batch) < per_page:
+            break
+        days = [str(dp['daystamp']) for dp in batch if dp.get('daystamp')]
+        if since_daystamp and days and min(days) < since_daystamp:
+            break
+        page += 1
+    return datapoints
+
+
+def posted_by_day(datapoints, daystamp_of, start_day=None, end_day=None):
+    """
+    Sum datapoint values per Beeminder day
+
+    Args:
+        datapoints: Datapoint dicts from fetch_datapoints()
+        daystamp_of: Function mapping a timestamp to its YYYYMMDD day, for datapoints without a daystamp
+        start_day: First YYYYMMDD day to include (None: no limit)
+        end_day: Last YYYYMMDD day to include (None: no limit)
+
+    Returns:
+        Dict of daystamp -> total value
+    """
+    totals = {}
+    for datapoint in datapoints:
+        day = str(datapoint.get('daystamp') or daystamp_of(datapoint.get('timestamp') or 0))
+        if (start_day and day < start_day) or (end_day and day > end_day):
+            continue
+        totals[day] = totals.get(day, 0) + _value(datapoint)
+    return totals
+
+
+def find_drift(goal, datapoints, expected, daystamp_of):
+    """
+    Days in expected whose posted total differs from the Readwise count
+
+    Args:
+        goal: Goal slug (to recognise its managed datapoints)
+        datapoints: Datapoint dicts from fetch_datapoints()
+        expected: Dict of daystamp -> Readwise count covering every day to check (see backfill.daily_counts)
+        daystamp_of: Function mapping a timestamp to its YYYYMMDD day
+
+    Returns:
+        List of DayDrift, oldest day first
+    """
+    if not expected:
+        return []
+    posted = posted_by_day(datapoints, daystamp_of, min(expected), max(expected))
+    managed = {dp.get('requestid'): dp for dp in datapoints if dp.get('requestid')}
+    drift = []
+    for day in sorted(expected):
+        total = posted.get(day, 0)
+        if round(total, 6) != expected[day]:
+            drift.append(DayDrift(day, total, expected[day], managed.get(request_id(goal, day))))
+    return drift
+
+
+def repair_plan(goal, drift):
+    """
+    create_all datapoints and deletions that make every drifted day sum to its Readwise count
+
+    A managed datapoint whose corrected value is zero is deleted instead of
+    being kept at zero.
+
+    Returns:
+        (list of create_all datapoint dicts, list of datapoint ids to delete)
+    """
+    upserts = []
+    deletes = []
+    for day in drift:
+        value = day.corrected_value()
+        if float(value).is_integer():
+            value = int(value)
+        if value == 0:
+            if day.managed and day.managed.get('id'):
+                deletes.append(day.managed['id'])
+            continue
+        upserts.append({
+            'daystamp': day.daystamp,
+            'value': value,
+            'comment': f"Reconciled with Readwise Reader ({day.expected} items archived this day)",
+            'requestid': request_id(goal, day.daystamp),
+        })
+    return upserts, deletes
+
+
+def delete_datapoints(username, goal, auth_token, api_base, datapoint_ids, client=None):
+    """
+    Delete datapoints by id (one request each; Beeminder has no bulk delete)
+
+    Returns:
+        (number deleted, list of (datapoint id, error message) for failures)
+    """
+    client = client or get_client()
+    deleted = 0
+    failures = []
+    for datapoint_id in datapoint_ids:
+        url = f"{api_base}/users/{username}/goals/{goal}/datapoints/{datapoint_id}.json"
+        try:
+            response = client.request('DELETE', url, params=beeminder_params(auth_token))
+        except Exception as e:
+            failures.append((datapoint_id, str(e)))
+            continue
+        if response.status_code == 200:
+            deleted += 1
+        else:
+            failures.append((datapoint_id, f"{response.status_code} - {response.text}"))
+    return deleted, failures
+
+
+def apply_repairs(username, goal, auth_token, api_base, upserts, deletes, batch_size=BACKFILL_BATCH_SIZE,
+                  client=None):
+    """
+    Submit a repair_plan(): upserts in create_all batches, then deletions
+
+    Returns:
+        (datapoints upserted, datapoints deleted, list of error messages)
+    """
+    accepted, batch_failures = submit_datapoints(username, goal, auth_token, api_base, upserts,
+                                                 batch_size=batch_size, client=client)
+    deleted, delete_failures = delete_datapoints(username, goal, auth_token, api_base, deletes, client=client)
+    errors = [f"batch {batch + 1}: {error}" for batch, error in batch_failures]
+    errors += [f"datapoint {datapoint_id}: {error}" for datapoint_id, error in delete_failures]
+    return accepted, deleted, errors
+
@@ -0,0 +1,323 @@
+"""
+On-disk HTTP response cache
+Keeps the bodies of GET responses from Readwise and Beeminder in a small
+SQLite database, keyed by URL, query parameters and credentials. A stored
+response is revalidated with If-None-Match / If-Modified-Since, so an
+unchanged resource costs a 304 instead of a download and parse; within the
+TTL (off by default) it is served without a request at all. Writes
+(POST/PUT/DELETE) drop the cached resources they change, entries unused for
+CACHE_MAX_AGE_SECONDS are dropped, and the least recently used entries are
+evicted once the bodies exceed CACHE_MAX_BYTES. Readwise /list/ pages after
+the first (requested with a pageCursor) bypass the cache.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+CACHE_DB = Path.home() / ".readwise_beeminder_http_cache.sqlite3"
+
+# READWISE_BEEMINDER_HTTP_CACHE=0 turns the cache off
+CACHE_ENABLED = os.environ.get("READWISE_BEEMINDER_HTTP_CACHE", "1") != "0"
+
+# Seconds a stored response is served without revalidating (0: always revalidate)
+CACHE_TTL_SECONDS = float(os.environ.get("READWISE_BEEMINDER_HTTP_CACHE_TTL", 0))
+
+# Entries not used for this long are dropped
+CACHE_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+
+# Total body bytes kept; the least recently used entries are evicted beyond it
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Larger bodies (e.g. full /list/ pages with HTML content) aren't stored
+CACHE_MAX_ENTRY_BYTES = 4 * 1024 * 1024
+
+# Seconds to wait for another process's write
+BUSY_TIMEOUT_SECONDS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    content_type TEXT,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_url ON responses (url);
+CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at);
+CREATE TABLE IF NOT EXISTS cache_meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_meta (name, value) SELECT 'total_size', COALESCE(SUM(size), 0) FROM responses;
+CREATE TRIGGER IF NOT EXISTS responses_size_insert AFTER INSERT ON responses BEGIN
+    UPDATE cache_meta SET value = value + NEW.size WHERE name = 'total_size';
+END;
+CREATE TRIGGER IF NOT EXISTS responses_size_update AFTER UPDATE OF size ON responses BEGIN
+    UPDATE cache_meta SET value = value + NEW.size - OLD.size WHERE name = 'total_size';
+END;
+CREATE TRIGGER IF NOT EXISTS responses_size_delete AFTER DELETE ON responses BEGIN
+    UPDATE cache_meta SET value = value - OLD.size WHERE name = 'total_size';
+END;
+"""
+
+# Query parameter of Readwise /list/ pages after the first; those pages are fetched once per scan and
+# rarely revalidated, so they aren't cached
+PAGE_CURSOR_PARAM = 'pageCursor'
+
+
+def resource_url(url):
+    """URL without query string or fragment"""
+    return urlsplit(url)._replace(query='', fragment='').geturl()
+
+
+def cache_key(url, params=None, headers=None):
+    """
+    Key of a GET request: a hash of the URL, sorted query parameters and Authorization header
+
+    Credentials are part of the key, so accounts never share entries, but are
+    only stored hashed.
+    """
+    authorization = ''
+    for name, value in (headers or {}).items():
+        if name.lower() == 'authorization':
+            authorization = value
+    material = json.dumps([url, sorted((str(k), str(v)) for k, v in (params or {}).items()), authorization])
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+def invalidated_urls(url):
+    """
+    Cached resources a write to url changes: url itself and every parent resource
+
+    Beeminder names resources PATH.json, so a POST to
+    .../goals/g/datapoints/create_all.json changes .../goals/g/datapoints.json,
+    .../goals/g.json and so on up the path.
+    """
+    parts = urlsplit(resource_url(url))
+    path = parts.path[:-len('.json')] if parts.path.endswith('.json') else parts.path.rstrip('/')
+    urls = [resource_url(url)]
+    while '/' in path.strip('/'):
+        path = path.rsplit('/', 1)[0]
+        urls.append(parts._replace(path=f"{path}.json").geturl())
+    return urls
+
+
+def cacheable_request(params):
+    """True if a GET with these query parameters is worth a cache lookup (not a /list/ cursor page)"""
+    return not (params or {}).get(PAGE_CURSOR_PARAM)
+
+
+def cacheable(headers):
+    """True if response headers allow storing the body"""
+    return 'no-store' not in headers.get('Cache-Control', '').lower()
+
+
+class CachedResponse:
+    """A stored response body and its validators"""
+
+    __slots__ = ('key', 'url', 'etag', 'last_modified', 'content_type', 'body', 'stored_at')
+
+    def __init__(self, key, url, etag, last_modified, content_type, body, stored_at):
+        self.key = key
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_type = content_type
+        self.body = body
+        self.stored_at = stored_at
+
+    def is_fresh(self, ttl, now=None):
+        """True while the entry may be served without revalidating"""
+        return ttl > 0 and (now or time.time()) - self.stored_at < ttl
+
+    def conditional_headers(self):
+        """If-None-Match / If-Modified-Since headers for revalidating the entry"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def to_response(self, url=None):
+        """A 200 requests.Response replaying the stored body"""
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url or self.url
+        response.headers = CaseInsensitiveDict({'Content-Type': self.content_type or 'application/json'})
+        # Mark the body as already read, so .json()/.text and iter_content() serve it from memory
+        response._content = bytes(self.body)
+        response._content_consumed = True
+        response.from_cache = True
+        return response
+
+
+class ResponseCache:
+    """
+    Conditional-request cache shared by the threads of a process
+
+    stats counts lookups by outcome: fresh (served without a request),
+    revalidated (a 304 confirmed the entry) and misses (a full response was
+    needed), plus entries stored and evicted.
+
+    Args:
+        path: SQLite file holding the entries
+        ttl: Seconds an entry is served without revalidating (0: always revalidate)
+        max_bytes: Body bytes kept before least recently used entries are evicted
+        max_entry_bytes: Largest body stored
+        max_age: Seconds an unused entry is kept
+    """
+
+    def __init__(self, path=CACHE_DB, ttl=CACHE_TTL_SECONDS, max_bytes=CACHE_MAX_BYTES,
+                 max_entry_bytes=CACHE_MAX_ENTRY_BYTES, max_age=CACHE_MAX_AGE_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.stats = {'fresh': 0, 'revalidated': 0, 'misses': 0, 'stored': 0, 'evicted': 0}
+        self._conn = None
+
+    def _connection(self):
+        """Open the database on first use, dropping entries unused for max_age"""
+        if self._conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            expired = conn.execute("DELETE FROM responses WHERE used_at < ?", (time.time() - self.max_age,))
+            self._count('evicted', expired.rowcount)
+            self._conn = conn
+        return self._conn
+
+    def _count(self, outcome, amount=1):
+        with self.stats_lock:
+            self.stats[outcome] += amount
+
+    def _safely(self, operation, default=None):
+        # A broken or locked cache never fails a run; requests just go out uncached
+        with self.lock:
+            try:
+                return operation(self._connection())
+            except sqlite3.Error as e:
+                print(f"Warning: HTTP cache unavailable ({e})")
+                return default
+
+    def lookup(self, key):
+        """The stored response for a cache_key() (None if there is none)"""
+        row = self._safely(lambda conn: conn.execute(
+            "SELECT key, url, etag, last_modified, content_type, body, stored_at FROM responses WHERE key = ?",
+            (key,)).fetchone())
+        return CachedResponse(*row) if row else None
+
+    def record_fresh(self, entry):
+        """Count an entry served without a request"""
+        self._count('fresh')
+        self._safely(lambda conn: conn.execute("UPDATE responses SET used_at = ? WHERE key = ?",
+                                               (time.time(), entry.key)))
+
+    def record_revalidated(self, entry, headers):
+        """Count a 304 for an entry, taking any new validators from its headers"""
+        self._count('revalidated')
+        now = time.time()
+        self._safely(lambda conn: conn.execute(
+            "UPDATE responses SET etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified), "
+            "stored_at = ?, used_at = ? WHERE key = ?",
+            (headers.get('ETag'), headers.get('Last-Modified'), now, now, entry.key)))
+
+    def record_miss(self):
+        """Count a lookup that needed a full response"""
+        self._count('misses')
+
+    def wants(self, headers):
+        """True if a 200 with these headers is worth storing (it has validators, or a TTL applies)"""
+        if not cacheable(headers):
+            return False
+        return bool(headers.get('ETag') or headers.get('Last-Modified') or self.ttl > 0)
+
+    def store(self, key, url, headers, body):
+        """Store a 200 response body (skipped if it is too large or not wanted)"""
+        if len(body) > self.max_entry_bytes or not self.wants(headers):
+            return False
+        now = time.time()
+
+        def write(conn):
+            # An upsert, not INSERT OR REPLACE: replacing a row doesn't fire the delete trigger keeping total_size
+            conn.execute(
+                "INSERT INTO responses (key, url, etag, last_modified, content_type, body, size, "
+                "stored_at, used_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET url = excluded.url, etag = excluded.etag, "
+                "last_modified = excluded.last_modified, content_type = excluded.content_type, "
+                "body = excluded.body, size = excluded.size, stored_at = excluded.stored_at, "
+                "used_at = excluded.used_at",
+                (key, resource_url(url), headers.get('ETag'), headers.get('Last-Modified'),
+                 headers.get('Content-Type'), sqlite3.Binary(body), len(body), now, now))
+            self._evict(conn)
+            return True
+
+        if self._safely(write, False):
+            self._count('stored')
+            return True
+        return False
+
+    def _evict(self, conn):
+        # Body bytes are tallied by triggers, so checking the limit is one row read rather than a table scan
+        total = conn.execute("SELECT value FROM cache_meta WHERE name = 'total_size'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY used_at").fetchall():
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._count('evicted')
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def invalidate(self, url):
+        """Drop the entries a write to url may have changed (see invalidated_urls)"""
+        urls = invalidated_urls(url)
+        self._safely(lambda conn: conn.execute(
+            f"DELETE FROM responses WHERE url IN ({', '.join('?' * len(urls))})", urls))
+
+    @property
+    def lookups(self):
+        return self.stats['fresh'] + self.stats['revalidated'] + self.stats['misses']
+
+    def hit_ratio(self):
+        """Share of lookups answered from the cache (fresh or revalidated); None before any lookup"""
+        if not self.lookups:
+            return None
+        return (self.stats['fresh'] + self.stats['revalidated']) / self.lookups
+
+    def summary(self):
+        """One-line summary of the cache counters"""
+        if not self.lookups:
+            return "no cacheable reads"
+        return (f"{self.lookups} cacheable reads, {self.stats['fresh']} fresh, "
+                f"{self.stats['revalidated']} revalidated (304), {self.stats['misses']} downloaded - "
+                f"{self.hit_ratio():.0%} hit ratio")
+
+    def close(self):
+        with self.lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def default_cache():
+    """ResponseCache for the shared client (None when READWISE_BEEMINDER_HTTP_CACHE=0)"""
+    return ResponseCache() if CACHE_ENABLED else None
@@ -0,0 +1,334 @@
+"""
+Webhook-driven sync daemon (`readwise_beeminder.py serve`)
+Listens for Readwise Reader webhook events (document moved to archive, tags
+updated, ...), applies each document change to the local archive index and
+counts documents that newly match a goal rule in memory. Pending counts are
+posted to Beeminder once per debounce window, so a burst of archiving becomes
+one datapoint per goal. The index is re-synced with `updatedAfter` on a slower
+interval, which catches any events that never arrived.
+"""
+
+import hmac
+import ipaddress
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from archive_index import INDEX_FILE, get_meta, open_index, sync_index, upsert_documents
+from goal_map import matching_goals
+from readwise_api import READWISE_API_BASE
+
+DEFAULT_PORT = 8787
+
+# Without a webhook secret anyone who can reach the port could post events, so only loopback is allowed
+LOCAL_HOST = '127.0.0.1'
+PUBLIC_HOST = '0.0.0.0'
+DEFAULT_DEBOUNCE_SECONDS = 300
+DEFAULT_RECONCILE_SECONDS = 60 * 60
+
+WEBHOOK_PATH = '/webhook'
+
+# Webhook bodies are single documents; anything larger is refused
+MAX_BODY_BYTES = 1024 * 1024
+
+# Location recorded for documents a deletion event removes
+DELETED_LOCATION = 'deleted'
+
+
+def log(message):
+    """Print a timestamped daemon log line"""
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}", flush=True)
+
+
+def webhook_documents(payload):
+    """
+    Documents carried by a webhook payload
+
+    Accepts a document with event fields mixed in (Reader's format), a
+    {'document': {...}} envelope, or a list of either. Deletion events keep the
+    document id and move it out of every location.
+
+    Returns:
+        List of document dicts shaped like /list/ results
+    """
+    events = payload if isinstance(payload, list) else [payload]
+    documents = []
+    for event in events:
+        if not isinstance(event, dict):
+            continue
+        doc = event.get('document') if isinstance(event.get('document'), dict) else event
+        if not doc.get('id'):
+            continue
+        doc = {key: value for key, value in doc.items() if key not in ('secret', 'event_type')}
+        if str(event.get('event_type', '')).endswith('deleted'):
+            doc['location'] = DELETED_LOCATION
+        documents.append(doc)
+    return documents
+
+
+class GoalCounter:
+    """
+    Documents per goal that started matching a rule since the last post
+
+    A document that stops matching before the post (unarchived, tag removed)
+    is taken back out; one that matched already isn't counted again. A goal
+    with several rules counts documents matching any of them.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.lock = threading.Lock()
+        self.pending = {rule.goal: set() for rule in rules}
+
+    def document_changed(self, old, new):
+        """upsert_documents() callback comparing a document's stored and new state"""
+        with self.lock:
+            matched = matching_goals(self.rules, old) if old is not None else set()
+            matches = matching_goals(self.rules, new)
+            for goal in matches - matched:
+                self.pending[goal].add(new.id)
+            for goal in matched - matches:
+                self.pending[goal].discard(new.id)
+
+    def counts(self):
+        """Dict of goal slug -> pending count"""
+        with self.lock:
+            return {goal: len(ids) for goal, ids in self.pending.items()}
+
+    def has_pending(self):
+        with self.lock:
+            return any(self.pending.values())
+
+    def take(self):
+        """Remove and return the pending documents (goal -> set of ids, non-empty goals only)"""
+        with self.lock:
+            taken = {goal: ids for goal, ids in self.pending.items() if ids}
+            for goal in taken:
+                self.pending[goal] = set()
+            return taken
+
+    def restore(self, goal, ids):
+        """Put back documents whose post failed"""
+        with self.lock:
+            self.pending[goal] |= ids
+
+
+def _secret_matches(value, secret):
+    # Constant-time comparison, so response timing doesn't reveal how much of a guess was right
+    return isinstance(value, str) and hmac.compare_digest(value.encode(), secret.encode())
+
+
+def is_loopback(host):
+    """True if host only accepts connections from this machine"""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class WebhookDaemon:
+    """
+    Applies webhook events and reconciliation syncs to the index on one worker thread
+
+    Args:
+        rules: List of goal_map.GoalRule to count for
+        token: Readwise access token (for reconciliation syncs)
+        post: Callable(goal, count, comment) -> bool posting a datapoint
+        debounce: Seconds to collect events after the first pending document before posting
+        reconcile_interval: Seconds between updatedAfter syncs of the index
+        secret: Webhook secret events must carry (None accepts any event; serve() then only listens on loopback)
+    """
+
+    def __init__(self, rules, token, post, api_base=READWISE_API_BASE, debounce=DEFAULT_DEBOUNCE_SECONDS,
+                 reconcile_interval=DEFAULT_RECONCILE_SECONDS, secret=None, index_path=INDEX_FILE):
+        self.rules = rules
+        self.token = token
+        self.post = post
+        self.api_base = api_base
+        self.debounce = debounce
+        self.reconcile_interval = reconcile_interval
+        self.secret = secret
+        self.index_path = index_path
+        self.counter = GoalCounter(rules)
+        self.events = queue.Queue()
+        self.stop_event = threading.Event()
+        self.stats_lock = threading.Lock()
+        self.stats = {'events': 0, 'documents': 0, 'rejected': 0, 'posts': 0, 'failed_posts': 0, 'reconciles': 0}
+
+    def accepts(self, payload):
+        """Check the secret Readwise includes in each webhook body"""
+        if not self.secret:
+            return True
+        events = payload if isinstance(payload, list) else [payload]
+        return all(isinstance(event, dict) and _secret_matches(event.get('secret'), self.secret) for event in events)
+
+    def count(self, stat, amount=1):
+        """Add to a stats counter (handler threads and the worker both count)"""
+        with self.stats_lock:
+            self.stats[stat] += amount
+
+    def submit(self, payload):
+        """Queue a webhook payload for the worker (called from HTTP handler threads)"""
+        self.count('events')
+        self.events.put(payload)
+
+    def status(self):
+        """JSON-serializable daemon status"""
+        with self.stats_lock:
+            stats = dict(self.stats)
+        return {'pending': self.counter.counts(), 'stats': stats}
+
+    def apply(self, conn, payload):
+        """Write a webhook payload's documents to the index, counting goal transitions"""
+        documents = webhook_documents(payload)
+        if not documents:
+            return
+        upsert_documents(conn, documents, on_change=self.counter.document_changed)
+        conn.commit()
+        self.count('documents', len(documents))
+
+    def reconcile(self, conn):
+        """Sync the index with Readwise, counting transitions the webhooks missed"""
+        # The first sync builds the index from the whole archive; that is the baseline, not new items
+        on_change = self.counter.document_changed if get_meta(conn, 'watermark') is not None else None
+        try:
+            sync_index(conn, self.token, api_base=self.api_base, on_change=on_change)
+            self.count('reconciles')
+        except Exception as e:
+            log(f"Warning: Reconciliation sync failed: {e}")
+
+    def flush(self):
+        """Post every goal's pending count (failed posts are kept for the next flush)"""
+        for goal, ids in self.counter.take().items():
+            descriptions = ', '.join(rule.describe() for rule in self.rules if rule.goal == goal)
+            comment = f"Auto-tracked from Readwise Reader ({len(ids)} items) [{descriptions}]"
+            if self.post(goal, len(ids), comment):
+                self.count('posts')
+            else:
+                self.count('failed_posts')
+                self.counter.restore(goal, ids)
+
+    def run(self):
+        """Worker loop: apply events, post after each debounce window, reconcile periodically"""
+        conn = open_index(self.index_path)
+        try:
+            self.reconcile(conn)
+            next_reconcile = time.monotonic() + self.reconcile_interval
+            flush_at = None
+            while not self.stop_event.is_set():
+                now = time.monotonic()
+                deadline = min(next_reconcile, flush_at or next_reconcile)
+                try:
+                    payload = self.events.get(timeout=min(max(deadline - now, 0), 1.0))
+                except queue.Empty:
+                    payload = None
+                if payload is not None:
+                    try:
+                        self.apply(conn, payload)
+                    except Exception as e:
+                        log(f"Warning: Could not apply webhook event: {e}")
+
+                now = time.monotonic()
+                if now >= next_reconcile:
+                    self.reconcile(conn)
+                    next_reconcile = now + self.reconcile_interval
+                if flush_at is None and self.counter.has_pending():
+                    flush_at = now + self.debounce
+                if flush_at is not None and now >= flush_at:
+                    self.flush()
+                    flush_at = None
+
+            # Drain what arrived before shutdown and post it
+            while not self.events.empty():
+                self.apply(conn, self.events.get_nowait())
+            self.flush()
+        finally:
+            conn.close()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def make_handler(daemon):
+    """Request handler class bound to a WebhookDaemon"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path in ('/', '/health'):
+                self._send(200, daemon.status())
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path.rstrip('/') != WEBHOOK_PATH:
+                self._send(404, {'error': 'not found'})
+                return
+            length = int(self.headers.get('Content-Length') or 0)
+            if length > MAX_BODY_BYTES:
+                self._send(413, {'error': 'payload too large'})
+                return
+            try:
+                payload = json.loads(self.rfile.read(length) or b'null')
+            except ValueError:
+                self._send(400, {'error': 'invalid JSON'})
+                return
+            if not daemon.accepts(payload):
+                daemon.count('rejected')
+                self._send(401, {'error': 'invalid secret'})
+                return
+            daemon.submit(payload)
+            self._send(202, {'queued': True})
+
+    return Handler
+
+
+def serve(daemon, host=LOCAL_HOST, port=DEFAULT_PORT):
+    """
+    Run the webhook listener and worker until interrupted (Ctrl-C or SIGTERM)
+
+    Pending counts are posted before returning.
+
+    Raises:
+        ValueError: If the daemon has no secret and host is not a loopback address
+    """
+    if not daemon.secret and not is_loopback(host):
+        raise ValueError(f"Refusing to listen on {host} without a webhook secret (set READWISE_WEBHOOK_SECRET)")
+    server = ThreadingHTTPServer((host, port), make_handler(daemon))
+
+    def work():
+        try:
+            daemon.run()
+        except Exception as e:
+            log(f"Error: Webhook worker stopped: {e}")
+        finally:
+            # Stop listening if the worker exits on its own
+            server.shutdown()
+
+    worker = threading.Thread(target=work, name='webhook-worker')
+    worker.start()
+    log(f"Listening for Readwise webhooks on http://{host}:{port}{WEBHOOK_PATH} "
+        f"(posting every {daemon.debounce:g}s, reconciling every {daemon.reconcile_interval:g}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log("Shutting down...")
+    finally:
+        server.server_close()
+        daemon.stop()
+        worker.join()
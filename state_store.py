@@ -0,0 +1,205 @@
+"""
+Per-goal sync state
+A small SQLite database (WAL mode) holding, per (Beeminder user, goal, tag
+filter), the watermark of the last successful sync and the last total posted,
+plus the cursors of interrupted scans. Every read and write is its own short
+transaction, so several sync processes on one host (different goals or tags,
+or a cron run overlapping the daemon) can share it without clobbering each
+other, and a crash can't leave a half-written file behind.
+
+Replaces the single-timestamp ~/.readwise_beeminder_state.json, which is
+migrated on first use.
+"""
+
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+STATE_DB = Path.home() / ".readwise_beeminder_state.sqlite3"
+
+# Single-run state file used before the state store
+LEGACY_STATE_FILE = Path.home() / ".readwise_beeminder_state.json"
+
+# Seconds to wait for another process's write transaction
+BUSY_TIMEOUT_SECONDS = 30
+
+# Key of the state migrated from LEGACY_STATE_FILE; it recorded one run for
+# every goal and tag, so it stands in for keys without state of their own
+LEGACY_KEY = ('', '', '')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_state (
+    user TEXT NOT NULL,
+    goal TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    watermark REAL,
+    last_total INTEGER,
+    last_posted_at REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (user, goal, tag)
+);
+CREATE TABLE IF NOT EXISTS scan_checkpoints (
+    key TEXT PRIMARY KEY,
+    cursor TEXT,
+    progress TEXT,
+    saved_at REAL NOT NULL
+);
+"""
+
+_initialized = set()
+
+
+@contextmanager
+def transaction(path=STATE_DB):
+    """
+    Connection with an immediate (write-locked) transaction, committed on exit
+
+    The schema is created and the legacy state file migrated the first time
+    a path is used in this process.
+    """
+    conn = sqlite3.connect(str(path), timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        if str(path) not in _initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            _initialized.add(str(path))
+            _migrate_legacy(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+def _migrate_legacy(conn, legacy_path=None):
+    """Import the old JSON state file once, then rename it out of the way"""
+    legacy_path = Path(legacy_path or LEGACY_STATE_FILE)
+    if not legacy_path.exists():
+        return
+    try:
+        with open(legacy_path, 'r') as f:
+            timestamp = json.load(f).get('last_run_timestamp')
+    except Exception as e:
+        print(f"Warning: Could not migrate state file: {e}")
+        return
+    if timestamp:
+        conn.execute(
+            "INSERT OR IGNORE INTO sync_state (user, goal, tag, watermark, updated_at) VALUES (?, ?, ?, ?, ?)",
+            LEGACY_KEY + (timestamp, time.time())
+        )
+    try:
+        legacy_path.rename(legacy_path.with_name(legacy_path.name + '.migrated'))
+    except OSError:
+        return  # Another process migrated it first
+    print(f"✓ Migrated {legacy_path.name} into {STATE_DB.name}")
+
+
+def _key(user, goal, tag):
+    return (user or '', goal or '', tag or '')
+
+
+def get_state(user, goal, tag=None, path=STATE_DB):
+    """Stored state for a key as a dict (None if the key has never synced)"""
+    with transaction(path) as conn:
+        row = conn.execute("SELECT * FROM sync_state WHERE user = ? AND goal = ? AND tag = ?",
+                           _key(user, goal, tag)).fetchone()
+    return dict(row) if row else None
+
+
+def _update(user, goal, tag, path, **fields):
+    columns = ', '.join(fields)
+    updates = ', '.join(f"{column} = excluded.{column}" for column in fields)
+    with transaction(path) as conn:
+        conn.execute(
+            f"INSERT INTO sync_state (user, goal, tag, {columns}, updated_at) "
+            f"VALUES (?, ?, ?, {', '.join('?' * len(fields))}, ?) "
+            f"ON CONFLICT(user, goal, tag) DO UPDATE SET {updates}, updated_at = excluded.updated_at",
+            _key(user, goal, tag) + tuple(fields.values()) + (time.time(),)
+        )
+
+
+def get_watermark(user, goal, tag=None, path=STATE_DB):
+    """Timestamp of the key's last successful sync (the migrated legacy timestamp if it has none)"""
+    with transaction(path) as conn:
+        row = conn.execute("SELECT watermark FROM sync_state WHERE user = ? AND goal = ? AND tag = ?",
+                           _key(user, goal, tag)).fetchone()
+        if row is None or row['watermark'] is None:
+            row = conn.execute("SELECT watermark FROM sync_state WHERE user = ? AND goal = ? AND tag = ?",
+                               LEGACY_KEY).fetchone()
+    return row['watermark'] if row else None
+
+
+def set_watermark(user, goal, tag, timestamp, path=STATE_DB):
+    """Record a successful sync up to timestamp"""
+    _update(user, goal, tag, path, watermark=timestamp)
+
+
+def get_last_total(user, goal, tag=None, path=STATE_DB):
+    """Total last posted for the key (None if never recorded)"""
+    state = get_state(user, goal, tag, path)
+    return state['last_total'] if state else None
+
+
+def set_last_total(user, goal, tag, total, path=STATE_DB):
+    """Record the total just posted for the key"""
+    _update(user, goal, tag, path, last_total=total, last_posted_at=time.time())
+
+
+def reset_state(user, keys, path=STATE_DB):
+    """
+    Forget the watermarks of (goal, tag) keys
+
+    Posted totals and the state of other keys are kept. The migrated legacy
+    watermark is cleared as well, since it would otherwise stand in for the
+    cleared ones.
+    """
+    with transaction(path) as conn:
+        for key in [_key(user, goal, tag) for goal, tag in keys] + [LEGACY_KEY]:
+            conn.execute("UPDATE sync_state SET watermark = NULL, updated_at = ? "
+                         "WHERE user = ? AND goal = ? AND tag = ?", (time.time(),) + key)
+
+
+def load_checkpoint(key, path=STATE_DB):
+    """Saved scan checkpoint as (cursor, progress dict, saved_at), or None"""
+    with transaction(path) as conn:
+        row = conn.execute("SELECT cursor, progress, saved_at FROM scan_checkpoints WHERE key = ?",
+                           (key,)).fetchone()
+    if row is None:
+        return None
+    return row['cursor'], json.loads(row['progress'] or '{}'), row['saved_at']
+
+
+def save_checkpoint(key, cursor, progress, path=STATE_DB):
+    """Save the next page cursor and progress of a scan"""
+    with transaction(path) as conn:
+        conn.execute(
+            "INSERT INTO scan_checkpoints (key, cursor, progress, saved_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET cursor = excluded.cursor, progress = excluded.progress, "
+            "saved_at = excluded.saved_at",
+            (key, cursor, json.dumps(progress), time.time())
+        )
+
+
+def prune_checkpoints(before, keep=None, path=STATE_DB):
+    """Remove scan checkpoints saved before a Unix timestamp (except the one keyed keep)"""
+    with transaction(path) as conn:
+        conn.execute("DELETE FROM scan_checkpoints WHERE saved_at < ? AND key != ?", (before, keep or ''))
+
+
+def clear_checkpoint(key, path=STATE_DB):
+    """Remove a scan checkpoint"""
+    with transaction(path) as conn:
+        conn.execute("DELETE FROM scan_checkpoints WHERE key = ?", (key,))
+
+
+def clear_checkpoints(prefix, path=STATE_DB):
+    """Remove the scan checkpoints whose keys start with prefix"""
+    with transaction(path) as conn:
+        conn.execute("DELETE FROM scan_checkpoints WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
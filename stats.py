@@ -0,0 +1,291 @@
+"""
+Columnar archive statistics
+Loads the archived documents of the local index (archive_index.py) into NumPy
+columns - update timestamps, category codes and (document, tag id) pairs - and
+answers the `stats` questions with array operations: archive counts per day,
+week and tag, rolling averages, and a projection of the current pace against
+the Beeminder goal's rate. Nothing here touches the API, and after loading
+Python only loops per distinct day (timezone offsets), not per document.
+
+Requires numpy (pip install numpy).
+"""
+
+import time
+from datetime import date, datetime
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency - only needed for the stats command
+    np = None
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# Day numbers count days since 1970-01-01; weeks start on Monday (day 4)
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+MONDAY_OFFSET = 3
+
+# Beeminder rate units in days
+RATE_UNIT_DAYS = {'y': 365.25, 'm': 365.25 / 12, 'w': 7, 'd': 1, 'h': 1 / 24}
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("The stats command requires numpy: pip install numpy")
+
+
+class ArchiveColumns:
+    """
+    Archived documents of the index as parallel NumPy columns
+
+    updated_at holds Unix timestamps (NaN where Readwise had none) and category
+    codes into category_names, one row per document. Tags are stored as pairs:
+    tag_doc[i] is a document row and tag_id[i] a code into tag_names.
+    """
+
+    def __init__(self, updated_at, category, category_names, tag_doc, tag_id, tag_names):
+        _require_numpy()
+        self.updated_at = updated_at
+        self.category = category
+        self.category_names = list(category_names)
+        self.tag_doc = tag_doc
+        self.tag_id = tag_id
+        self.tag_names = list(tag_names)
+        self._category_codes = {name: code for code, name in enumerate(self.category_names)}
+        self._tag_codes = {name: code for code, name in enumerate(self.tag_names)}
+
+    def __len__(self):
+        return len(self.updated_at)
+
+    def tag_mask(self, name):
+        """Boolean mask of the documents carrying a tag"""
+        mask = np.zeros(len(self), dtype=bool)
+        code = self._tag_codes.get(name)
+        if code is not None:
+            mask[self.tag_doc[self.tag_id == code]] = True
+        return mask
+
+    def expression_mask(self, expression):
+        """Boolean mask of the documents matching a tag_index.TagExpression"""
+        mask = np.ones(len(self), dtype=bool)
+        for clause in expression.clauses:
+            matched = np.zeros(len(self), dtype=bool)
+            for name, negated in clause:
+                matched |= ~self.tag_mask(name) if negated else self.tag_mask(name)
+            mask &= matched
+        return mask
+
+    def rule_mask(self, rule):
+        """Boolean mask of the documents a goal_map.GoalRule counts (only archived documents are loaded)"""
+        if rule.location not in (None, 'archive'):
+            return np.zeros(len(self), dtype=bool)
+        mask = np.ones(len(self), dtype=bool)
+        if rule.category:
+            code = self._category_codes.get(rule.category)
+            mask &= (self.category == code) if code is not None else False
+        if rule.expression is not None:
+            mask &= self.expression_mask(rule.expression)
+        return mask
+
+    @property
+    def dated(self):
+        """Boolean mask of the documents with an update timestamp"""
+        return ~np.isnan(self.updated_at)
+
+    def selection(self, rules):
+        """Boolean mask of the dated documents any of the goal_map.GoalRule objects count"""
+        mask = np.zeros(len(self), dtype=bool)
+        for rule in rules:
+            mask |= self.rule_mask(rule)
+        return mask & self.dated
+
+    def tag_counts(self, mask=None):
+        """Documents per tag (indexed like tag_names), optionally only those in a document mask"""
+        tag_id = self.tag_id if mask is None else self.tag_id[mask[self.tag_doc]]
+        return np.bincount(tag_id, minlength=len(self.tag_names))
+
+
+def _factorize(values):
+    """(distinct values in order of appearance, int32 code array)"""
+    codes = {}
+    array = np.array([codes.setdefault(value, len(codes)) for value in values], dtype=np.int32)
+    return list(codes), array
+
+
+def load_archive_columns(conn):
+    """
+    Load the archived documents of an index connection into columns
+
+    Documents come from one table scan (NOT INDEXED: the location index would
+    cost a table lookup per row) and tags as one row per tag with the rowids
+    of its documents, so few Python objects are built per document.
+
+    Returns:
+        ArchiveColumns
+    """
+    _require_numpy()
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    rows = cursor.execute(
+        "SELECT rowid, updated_at, COALESCE(category, '') FROM documents NOT INDEXED WHERE location = 'archive' "
+        "ORDER BY rowid"
+    ).fetchall()
+    rowids, updated_at, categories = zip(*rows) if rows else ((), (), ())
+    rowids = np.array(rowids, dtype=np.int64)
+    category_names, category = _factorize(categories)
+
+    groups = cursor.execute(
+        "SELECT t.tag, group_concat(d.rowid, ' ') FROM documents d NOT INDEXED "
+        "JOIN document_tags t ON t.doc_id = d.id WHERE d.location = 'archive' GROUP BY t.tag"
+    ).fetchall()
+    tag_rowids = [np.array(members.split(), dtype=np.int64) for _, members in groups]
+    tag_id = np.repeat(np.arange(len(groups), dtype=np.int32), [len(members) for members in tag_rowids])
+    tag_doc = np.searchsorted(rowids, np.concatenate(tag_rowids) if groups else np.array([], dtype=np.int64))
+
+    return ArchiveColumns(
+        np.array(updated_at, dtype=np.float64),
+        category,
+        category_names,
+        tag_doc.astype(np.int32),
+        tag_id,
+        [tag for tag, _ in groups],
+    )
+
+
+def _utc_offset(timestamp, tz):
+    moment = datetime.fromtimestamp(timestamp, tz) if tz is not None else datetime.fromtimestamp(timestamp).astimezone()
+    return int(moment.utcoffset().total_seconds())
+
+
+def day_numbers(timestamps, tz=None, deadline=0):
+    """
+    Day of each timestamp as days since 1970-01-01, in a timezone (None: local time)
+
+    With a deadline (seconds after midnight) days end at that time, as
+    beeminder_state.GoalState.daystamp counts them. UTC offsets are looked up
+    once per distinct UTC day, and per timestamp only on days with a DST change.
+
+    Args:
+        timestamps: Array of Unix timestamps (no NaNs)
+        tz: tzinfo of the days (None for the local timezone)
+        deadline: Seconds after local midnight at which a day ends
+
+    Returns:
+        int64 array of day numbers
+    """
+    _require_numpy()
+    seconds = np.floor(np.asarray(timestamps, dtype=np.float64)).astype(np.int64)
+    utc_days, inverse = np.unique(seconds // SECONDS_PER_DAY, return_inverse=True)
+    starts = (utc_days * SECONDS_PER_DAY).tolist()
+    first = np.array([_utc_offset(start, tz) for start in starts], dtype=np.int64)
+    last = np.array([_utc_offset(start + SECONDS_PER_DAY - 1, tz) for start in starts], dtype=np.int64)
+    offsets = first[inverse]
+    changed = (first != last)[inverse]
+    if changed.any():
+        offsets[changed] = [_utc_offset(second, tz) for second in seconds[changed].tolist()]
+    return (seconds + offsets - deadline) // SECONDS_PER_DAY
+
+
+def day_date(day):
+    """datetime.date of a day number"""
+    return date.fromordinal(EPOCH_ORDINAL + int(day))
+
+
+def week_number(days):
+    """Monday-based week of day numbers (scalar or array)"""
+    return (days + MONDAY_OFFSET) // 7
+
+
+def week_start(week):
+    """Day number of the Monday starting a week_number()"""
+    return int(week) * 7 - MONDAY_OFFSET
+
+
+class ArchiveRates:
+    """
+    Archive counts of one selection of documents up to and including day `today`
+
+    daily has one entry per day from first_day to today, weekly one per
+    Monday-based week from first_day's week to today's (the last one partial).
+    """
+
+    def __init__(self, days, today):
+        _require_numpy()
+        days = days[days <= today]
+        self.today = int(today)
+        self.total = len(days)
+        self.first_day = int(days.min()) if self.total else self.today
+        self.daily = np.bincount(days - self.first_day, minlength=self.today - self.first_day + 1)
+        first_week = week_number(self.first_day)
+        self.weekly = np.bincount(week_number(days) - first_week,
+                                  minlength=week_number(self.today) - first_week + 1)
+        self.first_week = first_week
+
+    def pace(self, window):
+        """Items per day over the last `window` days (days before first_day count as zero)"""
+        return self.daily[-window:].sum() / window
+
+    def last_days(self, count):
+        """(day numbers, counts) of the last `count` days, oldest first"""
+        counts = self.daily[-count:]
+        return np.arange(self.today - len(counts) + 1, self.today + 1), counts
+
+    def full_weeks(self, count):
+        """(week numbers, counts) of the last `count` complete weeks, oldest first"""
+        counts = self.weekly[:-1][-count:]
+        end = self.first_week + len(self.weekly) - 1
+        return np.arange(end - len(counts), end), counts
+
+
+def goal_rate_per_day(metadata):
+    """The goal's rate in items per day from Beeminder goal metadata (None if unknown)"""
+    rate = metadata.get('rate')
+    unit_days = RATE_UNIT_DAYS.get(metadata.get('runits') or 'd')
+    if rate is None or unit_days is None:
+        return None
+    return float(rate) / unit_days
+
+
+class Projection:
+    """Items expected over the next `horizon` days at the recent pace versus what the goal rate needs"""
+
+    __slots__ = ('horizon', 'pace', 'goal_rate', 'weekly_floor')
+
+    def __init__(self, horizon, pace, goal_rate, weekly_floor=None):
+        self.horizon = horizon
+        self.pace = pace
+        self.goal_rate = goal_rate
+        self.weekly_floor = weekly_floor
+
+    @property
+    def projected(self):
+        return self.pace * self.horizon
+
+    @property
+    def required(self):
+        return self.goal_rate * self.horizon
+
+    @property
+    def surplus(self):
+        """Items ahead of the goal rate at the end of the horizon (negative: behind)"""
+        return self.projected - self.required
+
+
+def project(rates, goal_rate, horizon=28, weeks=12, percentile=25):
+    """
+    Project the last `horizon` days' pace against a goal rate (items per day)
+
+    weekly_floor is the weekly count reached in all but `percentile` percent of
+    the last `weeks` complete weeks - a slope that would have been met about
+    that often.
+
+    Returns:
+        Projection
+    """
+    _, weekly = rates.full_weeks(weeks)
+    floor = float(np.percentile(weekly, percentile)) if len(weekly) else None
+    return Projection(horizon, rates.pace(horizon), goal_rate, floor)
+
+
+def local_today(tz=None, deadline=0, now=None):
+    """Day number of now (default: the current time) in a timezone"""
+    return int(day_numbers([time.time() if now is None else now], tz, deadline)[0])
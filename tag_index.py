@@ -0,0 +1,176 @@
+"""
+Tag expressions and an inverted tag index
+`--tag` accepts boolean expressions over tag names, and a scan can build an
+inverted index (tag/category/location -> document positions) as pages arrive,
+so many goals or tags are counted from one sweep with bitmap operations
+instead of re-checking every document per query.
+
+Expression syntax:
+    learning            tagged learning
+    learning,-fiction   learning AND NOT fiction (comma-separated clauses are ANDed)
+    learning|papers     learning OR papers ('|' separates alternatives within a clause)
+    -fiction            everything not tagged fiction
+"""
+
+from array import array
+
+from documents import TAGS
+
+
+class TagExpression:
+    """
+    Parsed tag filter in conjunctive normal form
+
+    clauses is a list of clauses; each clause is a list of (tag name, negated)
+    alternatives. A document matches when every clause has a matching alternative.
+    """
+
+    def __init__(self, clauses, text=None, tags=TAGS):
+        self.clauses = clauses
+        self.text = text or ','.join('|'.join(('-' if negated else '') + name for name, negated in clause)
+                                     for clause in clauses)
+        self._ids = [[(tags.intern(name), negated) for name, negated in clause] for clause in clauses]
+
+    @classmethod
+    def parse(cls, text, tags=TAGS):
+        """
+        Parse an expression like 'learning|papers,-fiction'
+
+        Raises:
+            ValueError: If a clause or tag name is empty
+        """
+        clauses = []
+        for clause_text in text.split(','):
+            clause = []
+            for term in clause_text.split('|'):
+                term = term.strip()
+                negated = term.startswith('-')
+                name = term[1:].strip() if negated else term
+                if not name:
+                    raise ValueError(f"Empty tag in expression: {text!r}")
+                clause.append((name, negated))
+            clauses.append(clause)
+        return cls(clauses, text, tags)
+
+    @property
+    def single_tag(self):
+        """The tag name if the expression is one plain tag, else None"""
+        if len(self.clauses) == 1 and len(self.clauses[0]) == 1 and not self.clauses[0][0][1]:
+            return self.clauses[0][0][0]
+        return None
+
+    def tag_names(self):
+        """Every tag name the expression mentions"""
+        return {name for clause in self.clauses for name, _ in clause}
+
+    def matches(self, record):
+        """Check a documents.DocumentRecord against the expression"""
+        tag_ids = record.tag_ids
+        for clause in self._ids:
+            for tag_id, negated in clause:
+                if (tag_id in tag_ids) != negated:
+                    break
+            else:
+                return False
+        return True
+
+    def __str__(self):
+        return self.text
+
+
+def parse_tag_filter(value):
+    """TagExpression for a --tag value (None/empty -> None; an expression passes through)"""
+    if value is None or isinstance(value, TagExpression):
+        return value
+    value = value.strip()
+    return TagExpression.parse(value) if value else None
+
+
+def _popcount(bitmap):
+    try:
+        return bitmap.bit_count()
+    except AttributeError:  # Python < 3.10
+        return bin(bitmap).count('1')
+
+
+class TagIndex:
+    """
+    Inverted index from tag id, category and location to document positions
+
+    Each added record gets the next position; postings are append-only sorted
+    arrays of positions, turned into integer bitmaps on demand so expressions
+    reduce to AND/OR/NOT on Python ints.
+    """
+
+    def __init__(self, tags=TAGS):
+        self.tags = tags
+        self.size = 0
+        self.postings = {}
+        self._bitmaps = {}
+
+    def add(self, record):
+        """Index one documents.DocumentRecord"""
+        position = self.size
+        keys = [('tag', tag_id) for tag_id in record.tag_ids]
+        keys.append(('category', record.category))
+        keys.append(('location', record.location))
+        for key in keys:
+            postings = self.postings.get(key)
+            if postings is None:
+                postings = self.postings[key] = array('I')
+            postings.append(position)
+        self.size += 1
+        self._bitmaps.clear()
+
+    def add_all(self, records):
+        """Index every record of an iterable; returns the index"""
+        for record in records:
+            self.add(record)
+        return self
+
+    @property
+    def all(self):
+        """Bitmap of every indexed position"""
+        return (1 << self.size) - 1
+
+    def bitmap(self, key):
+        """Bitmap of the positions posted under key (e.g. ('tag', id), ('category', 'video'))"""
+        bitmap = self._bitmaps.get(key)
+        if bitmap is None:
+            bits = bytearray((self.size + 7) // 8)
+            for position in self.postings.get(key, ()):
+                bits[position >> 3] |= 1 << (position & 7)
+            bitmap = self._bitmaps[key] = int.from_bytes(bits, 'little')
+        return bitmap
+
+    def tag_bitmap(self, name):
+        """Bitmap of documents carrying a tag"""
+        tag_id = self.tags.ids.get(name)
+        return self.bitmap(('tag', tag_id)) if tag_id is not None else 0
+
+    def expression_bitmap(self, expression):
+        """Bitmap of documents matching a TagExpression (or tag filter string)"""
+        expression = parse_tag_filter(expression)
+        everything = result = self.all
+        if expression is None:
+            return result
+        for clause in expression.clauses:
+            clause_bitmap = 0
+            for name, negated in clause:
+                bitmap = self.tag_bitmap(name)
+                clause_bitmap |= (everything & ~bitmap) if negated else bitmap
+            result &= clause_bitmap
+        return result
+
+    def count(self, bitmap):
+        """Number of documents in a bitmap"""
+        return _popcount(bitmap)
+
+    def count_expression(self, expression):
+        """Number of documents matching a TagExpression (or tag filter string)"""
+        return self.count(self.expression_bitmap(expression))
+
+    def tag_counts(self):
+        """Dict of tag name -> number of indexed documents carrying it"""
+        return {self.tags.name(key[1]): len(postings)
+                for key, postings in self.postings.items() if key[0] == 'tag'}